@@ -16,6 +16,7 @@ class Agent:
         self.current_task: Optional[DeliveryTask] = None
         self.vehicle = None
         self.exploration_radius = 5
+        self._last_scan = None  # 上一次探测的 (格子, 半径)，未换格子时跳过重复探测
         self.coord_system = coord_system_ref
 
     # --- 核心修改：移除线程相关方法，添加 update() ---
@@ -61,15 +62,7 @@ class Agent:
                 self.vehicle.current_waypoint_index += 1
 
         if self.vehicle.current_waypoint_index >= len(self.vehicle.path):
-            if self.state == "delivering":
-                print(f"[{self.agent_id}] 送货至 {self.position} 完成。")
-                # --- 核心修改：向协调器上报任务完成 ---
-                self.coord_system.report_task_completion(self.current_task)
-                self.decide_and_start_return_trip()
-            elif self.state == "returning":
-                print(f"[{self.agent_id}] 已返回待命点 {self.position}。进入空闲状态。")
-                if self.current_task: self.current_task.completed = True
-                self.state = "idle"; self.current_task = None; self.vehicle = None
+            self.finish_path()
             return
 
         next_waypoint = self.vehicle.path[self.vehicle.current_waypoint_index]
@@ -77,15 +70,64 @@ class Agent:
         self.position = self.vehicle.current_pos
         
         dist_to_waypoint = math.hypot(self.position[0] - next_waypoint[0], self.position[1] - next_waypoint[1])
-        if dist_to_waypoint < self.vehicle.speed:
+        # 与循环内一致，只有真正到达路点才切换；平滑后的路点相距很远，按速度提前切换会抄近路穿过障碍
+        if dist_to_waypoint < 0.5:
             self.vehicle.current_waypoint_index += 1
 
+    def distance_per_tick(self) -> float:
+        """
+        follow_path() 每帧实际移动的距离 (格)：以 0.5 格的步长凑满 speed * 0.1 后再前进一步
+        (不计路点处的吸附)，事件驱动模式据此换算速度，使两种引擎的行程时间一致。
+        """
+        steps = math.ceil(self.capabilities['speed'] * 0.1 / 0.5)
+        return (steps + 1) * 0.5
+
+    def finish_path(self):
+        """走完当前路径：送货完成则上报并决定返程，返程完成则进入空闲"""
+        if self.state == "delivering":
+            print(f"[{self.agent_id}] 送货至 {self.position} 完成。")
+            # --- 核心修改：向协调器上报任务完成 ---
+            self.coord_system.report_task_completion(self.current_task)
+            self.decide_and_start_return_trip()
+        elif self.state == "returning":
+            print(f"[{self.agent_id}] 已返回待命点 {self.position}。进入空闲状态。")
+            if self.current_task: self.current_task.completed = True
+            self.state = "idle"; self.current_task = None; self.vehicle = None
+
+    def distance_to_waypoint(self) -> float:
+        """到当前路点的直线距离，路径已走完时为 0"""
+        vehicle = self.vehicle
+        if vehicle is None or vehicle.current_waypoint_index >= len(vehicle.path):
+            return 0.0
+        next_waypoint = vehicle.path[vehicle.current_waypoint_index]
+        return math.hypot(next_waypoint[0] - self.position[0], next_waypoint[1] - self.position[1])
+
+    def travel(self, distance: float):
+        """事件驱动模式：沿当前路径连续前进 distance，途经的路点依次切换 (不做路径走完后的处理)"""
+        vehicle = self.vehicle
+        while vehicle.current_waypoint_index < len(vehicle.path):
+            wx, wy = vehicle.path[vehicle.current_waypoint_index]
+            x, y = self.position
+            gap = math.hypot(wx - x, wy - y)
+            # 到达时刻由 距离 / 速度 算出，浮点误差可能差一点点才到，容差内视为到达
+            if gap <= distance + 1e-6:
+                self.position = (float(wx), float(wy))
+                distance = max(distance - gap, 0.0)
+                vehicle.current_waypoint_index += 1
+                continue
+            if distance > 0:
+                self.position = (x + (wx - x) * distance / gap, y + (wy - y) * distance / gap)
+            break
+        vehicle.current_pos = self.position
+        vehicle.path_trace.append(self.position)
+
     def decide_and_start_return_trip(self):
         warehouse_pos = self.coord_system.warehouse_pos
         relay_pos = self.coord_system.relay_station_pos
         
-        path_to_warehouse, cost_to_warehouse = self.coord_system.plan_path_for_agent(self, self.position, warehouse_pos, return_cost=True)
-        path_to_relay, cost_to_relay = self.coord_system.plan_path_for_agent(self, self.position, relay_pos, return_cost=True)
+        # 返程必须立即得到结果，不受协调器每帧规划预算限制
+        path_to_warehouse, cost_to_warehouse = self.coord_system.plan_path_for_agent(self, self.position, warehouse_pos, return_cost=True, budgeted=False)
+        path_to_relay, cost_to_relay = self.coord_system.plan_path_for_agent(self, self.position, relay_pos, return_cost=True, budgeted=False)
 
         go_to_relay = False
         if self.capabilities['type'] == 'car':
@@ -97,7 +139,7 @@ class Agent:
         
         if return_path:
             self.state = "returning"
-            self.vehicle.path = return_path; self.vehicle.current_waypoint_index = 0
+            self.vehicle.path = self.coord_system.smooth_path_for_agent(self, return_path); self.vehicle.current_waypoint_index = 0
             self.vehicle.goal_pos = return_target
         else:
             self.state = "idle"; self.vehicle = None
@@ -108,22 +150,20 @@ class Agent:
             if self.capabilities['type'] == 'drone': self.vehicle = Drone(self.position, task.goal_pos, max_speed=self.capabilities['speed'])
             elif self.capabilities['type'] == 'car': self.vehicle = Car(self.position, task.goal_pos, max_speed=self.capabilities['speed'])
             else: self.vehicle = RobotDog(self.position, task.goal_pos, max_speed=self.capabilities['speed'])
-            self.vehicle.path = path; self.vehicle.current_waypoint_index = 0
+            self.vehicle.path = self.coord_system.smooth_path_for_agent(self, path); self.vehicle.current_waypoint_index = 0
             self.state = "delivering"
             return True
         return False
 
     def explore_surroundings(self):
-        map_fragment = {}
-        real_map = self.coord_system.real_map
-        center_x, center_y = int(self.position[0]), int(self.position[1])
-        for dx in range(-self.exploration_radius, self.exploration_radius + 1):
-            for dy in range(-self.exploration_radius, self.exploration_radius + 1):
-                if dx**2 + dy**2 <= self.exploration_radius**2:
-                    x, y = center_x + dx, center_y + dy
-                    if 0 <= x < real_map.width and 0 <= y < real_map.height:
-                        map_fragment[(x, y)] = real_map.terrain[x, y]
-        if map_fragment: self.coord_system.report_map_fragment(map_fragment)
+        center = (int(self.position[0]), int(self.position[1]))
+        # 知识地图只会把未知格子变为已知：同一格子同一半径扫描过一次后，
+        # 圆盘内已全部已知，再扫也不会揭示任何格子，因此无论地图版本如何变化都可以跳过
+        scan = (center, self.exploration_radius)
+        if scan == self._last_scan:
+            return
+        self.coord_system.report_disc_fragment(center, self.exploration_radius)
+        self._last_scan = scan
 
 # --- Agent 子类定义保持不变，但 __init__ 不再需要启动线程 ---
 class DroneAgent(Agent):
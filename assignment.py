@@ -0,0 +1,72 @@
+# assignment.py
+# -*- coding: utf-8 -*-
+"""
+最小代价指派模块
+批量调度时把 (任务 x 空闲智能体) 的代价矩阵交给 solve_assignment，一轮内求出总代价最小的一对一配对。
+算法为带势函数的最短增广路 Hungarian 算法 (O(n² m))，内层对列的松弛用 NumPy 向量化。
+"""
+import numpy as np
+
+INF = float('inf')
+
+
+def solve_assignment(cost) -> list:
+    """
+    求矩形代价矩阵的最小代价指派，cost[i][j] 为 inf 表示第 i 行不能指派给第 j 列。
+    每行、每列至多使用一次；在可行配对数最多的前提下总代价最小。
+    返回 [(行, 列)]，只包含可行配对，按行升序。
+    """
+    cost = np.asarray(cost, dtype=float)
+    if cost.ndim != 2 or cost.size == 0:
+        return []
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T  # 保证行数不超过列数
+    rows, cols = cost.shape
+    feasible = np.isfinite(cost)
+    if not feasible.any():
+        return []
+    # 不可行配对用一个大于任何可行指派总代价的有限值代替，求解后丢弃
+    big = (np.abs(cost[feasible]).max() + 1.0) * (rows + 1)
+    c = np.where(feasible, cost, big)
+
+    # 下标 0 为虚拟列；match[j] 为第 j 列 (1 起) 匹配的行 (1 起)，0 表示未匹配
+    u = np.zeros(rows + 1)
+    v = np.zeros(cols + 1)
+    match = np.zeros(cols + 1, dtype=int)
+    way = np.zeros(cols + 1, dtype=int)
+    for i in range(1, rows + 1):
+        match[0] = i
+        j0 = 0
+        min_slack = np.full(cols + 1, INF)
+        used = np.zeros(cols + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = match[j0]
+            free = ~used[1:]
+            slack = c[i0 - 1] - u[i0] - v[1:]
+            improve = free & (slack < min_slack[1:])
+            min_slack[1:][improve] = slack[improve]
+            way[1:][improve] = j0
+            candidates = np.where(free, min_slack[1:], INF)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+            used_columns = np.flatnonzero(used)
+            u[match[used_columns]] += delta
+            v[used_columns] -= delta
+            min_slack[1:][free] -= delta
+            j0 = j1
+            if match[j0] == 0:
+                break
+        # 沿增广路翻转匹配
+        while j0:
+            j1 = way[j0]
+            match[j0] = match[j1]
+            j0 = j1
+
+    pairs = []
+    for j in range(1, cols + 1):
+        i = match[j]
+        if i and feasible[i - 1, j - 1]:
+            pairs.append((j - 1, i - 1) if transposed else (i - 1, j - 1))
+    return sorted(pairs)
@@ -0,0 +1,231 @@
+# batch_planning.py
+# -*- coding: utf-8 -*-
+"""
+批量规划模块
+一次搜索回答 "从这 N 个起点到这 M 个终点的代价与路径"：
+起点较少时对每个起点做一次正向一对多搜索，终点较少时对每个终点做一次反向多对一搜索，
+每次搜索在所有端点都被确定后立即停止。协调器据此为同一能力配置的所有候选智能体/策略
+一次性打分，调度开销随能力配置数量增长，而不是随 智能体 × 策略 增长。
+"""
+import heapq
+import math
+import time
+from cost_grid import get_cost_grid, MIN_COST_PER_DISTANCE
+from path_planning import (PlanResult, plan_path, snap_to_road, merge_bounds, heuristic,
+                           PLAN_BUDGET_EXCEEDED, DEADLINE_CHECK_INTERVAL)
+
+INF = float('inf')
+# 目标数超过该值时逐个求最小距离的启发式比它节省的扩展更贵，直接使用 Dijkstra
+MAX_GUIDED_TARGETS = 4
+
+
+def plan_batch(agent_capabilities, knowledge_map, sources, targets, budget=None, max_expansions=None) -> dict:
+    """
+    返回 {(source, target): PlanResult}，键为调用方传入的原始坐标 (取整后)。
+    语义与 plan_path 一致：road_only 的端点先吸附到最近道路，终点不可达时
+    road_only 规划失败，其余配置返回通往离终点最近的可达格子的路径。
+    budget / max_expansions 的含义与 plan_path 相同，对每一次搜索分别生效。
+    """
+    rules = agent_capabilities["terrain_rules"]
+    grid = get_cost_grid(rules, knowledge_map)
+    sources = list(dict.fromkeys(tuple(map(int, s)) for s in sources))
+    targets = list(dict.fromkeys(tuple(map(int, t)) for t in targets))
+    snapped = {}
+    for node in sources + targets:
+        if node not in snapped:
+            snapped[node] = snap_to_road(rules, knowledge_map, node)
+
+    results = {}
+    if len(sources) <= len(targets):
+        for source in sources:
+            results.update(_one_to_many(agent_capabilities, knowledge_map, grid, rules, snapped, source, targets,
+                                        budget, max_expansions))
+    else:
+        for target in targets:
+            results.update(_many_to_one(agent_capabilities, knowledge_map, grid, rules, snapped, sources, target,
+                                        budget, max_expansions))
+    return results
+
+
+def _one_to_many(agent_capabilities, knowledge_map, grid, rules, snapped, source, targets, budget, max_expansions):
+    """从 source 出发的正向 Dijkstra，所有终点被确定 (或可达区域耗尽) 后停止"""
+    start_node, bounds = snapped[source]
+    if start_node is None or not grid.contains(start_node):
+        return {(source, target): PlanResult(None, INF, bounds) for target in targets}
+    pending = set()
+    for target in targets:
+        goal_node = snapped[target][0]
+        if goal_node is not None and grid.contains(goal_node):
+            pending.add(grid.index(goal_node))
+    start = grid.index(start_node)
+    dist, parent, settled, exceeded = _budgeted_search(grid, [start], pending, False, budget, max_expansions)
+    search_bounds = _settled_bounds(grid, settled)
+
+    results = {}
+    for target in targets:
+        goal_node, goal_bounds = snapped[target]
+        pair_bounds = merge_bounds(merge_bounds(bounds, goal_bounds), search_bounds)
+        if goal_node is None:
+            results[(source, target)] = PlanResult(None, INF, pair_bounds, len(settled))
+            continue
+        if not grid.contains(goal_node):
+            # 寻路目标在地图外：搜索没有等待它，交给 plan_path 单独处理
+            results[(source, target)] = plan_path(agent_capabilities, knowledge_map, source, target,
+                                                  budget, max_expansions)
+            continue
+        goal = grid.index(goal_node)
+        status = None
+        if goal not in settled:
+            if exceeded:
+                # 预算耗尽：与 plan_path 一致，返回通往目前离目标最近的已确定格子的部分路径
+                status = PLAN_BUDGET_EXCEEDED
+                if not settled:
+                    results[(source, target)] = PlanResult(None, INF, pair_bounds, 0, status)
+                    continue
+                goal = min(settled, key=lambda cell: heuristic(grid.node(cell), goal_node))
+            elif rules.get("road_only", False):
+                results[(source, target)] = PlanResult(None, INF, pair_bounds, len(settled))
+                continue
+            # 与 A* 一致：回退到离寻路目标最近的已确定格子
+            goal = min(settled, key=lambda cell: heuristic(grid.node(cell), goal_node))
+        path = []
+        node = goal
+        while node != -1:
+            path.append(grid.node(node))
+            node = parent[node]
+        path.reverse()
+        results[(source, target)] = PlanResult(path, heuristic(path[-1], target), pair_bounds, len(settled), status)
+    return results
+
+
+def _many_to_one(agent_capabilities, knowledge_map, grid, rules, snapped, sources, target, budget, max_expansions):
+    """以 target 为根的反向 Dijkstra，所有起点被确定后停止；不可达的起点按 plan_path 单独处理"""
+    goal_node, bounds = snapped[target]
+    if goal_node is None or not grid.contains(goal_node):
+        return {(source, target): PlanResult(None, INF, merge_bounds(bounds, snapped[source][1]))
+                for source in sources}
+    pending = set()
+    for source in sources:
+        start_node = snapped[source][0]
+        if start_node is not None and grid.contains(start_node):
+            pending.add(grid.index(start_node))
+    goal = grid.index(goal_node)
+    dist, next_hop, settled, exceeded = _budgeted_search(grid, [goal], pending, True, budget, max_expansions)
+    search_bounds = _settled_bounds(grid, settled)
+
+    results = {}
+    for source in sources:
+        start_node, start_bounds = snapped[source]
+        if start_node is None:
+            results[(source, target)] = PlanResult(None, INF, merge_bounds(bounds, start_bounds))
+            continue
+        start = grid.index(start_node) if grid.contains(start_node) else -1
+        if start not in settled:
+            if exceeded:
+                # 反向搜索无法给出起点一侧的部分路径
+                results[(source, target)] = PlanResult(
+                    None, INF, merge_bounds(merge_bounds(bounds, start_bounds), search_bounds),
+                    len(settled), PLAN_BUDGET_EXCEEDED)
+                continue
+            # 终点从该起点不可达时需要 "最近可达点" 回退，只能从起点正向搜索
+            results[(source, target)] = plan_path(agent_capabilities, knowledge_map, source, target,
+                                                  budget, max_expansions)
+            continue
+        path = []
+        node = start
+        while node != -1:
+            path.append(grid.node(node))
+            node = next_hop[node]
+        results[(source, target)] = PlanResult(
+            path, heuristic(path[-1], target),
+            merge_bounds(merge_bounds(bounds, start_bounds), search_bounds), len(settled))
+    return results
+
+
+def _budgeted_search(grid, roots, targets, reverse, budget, max_expansions):
+    """按预算给出本次搜索的额度，搜索结束后记账；返回值末尾附加是否因预算提前停止"""
+    limit, deadline = budget.allowance(max_expansions) if budget else (max_expansions, None)
+    dist, parent, settled, exceeded = _dijkstra(grid, roots, targets, reverse, limit, deadline)
+    if budget:
+        budget.charge(len(settled), PLAN_BUDGET_EXCEEDED if exceeded else None)
+    return dist, parent, settled, exceeded
+
+
+def _dijkstra(grid, roots, targets, reverse, max_expansions=None, deadline=None):
+    """
+    以 roots 为源、朝 targets 引导的 A* (启发式取到各目标距离的最小值，仍然可采纳且一致)，
+    targets 全部出堆后提前停止；targets 为空或过多时退化为普通 Dijkstra。
+    正向时边 u->v 的代价由 v 决定；反向时沿入边扩展 (代价由被扩展的格子本身决定)。
+    扩展数达到 max_expansions 或超过 deadline 时提前停止。
+    返回 (dist, parent, settled, exceeded)：parent 在正向时指向前驱，反向时指向通往根的下一跳。
+    """
+    penalty, scale, offsets = grid.penalty, grid.scale, grid.neighbor_offsets
+    stride = grid.stride
+    goals = [divmod(target, stride) for target in targets]
+    hypot = math.hypot
+    weight = MIN_COST_PER_DISTANCE
+
+    def estimate(cell):
+        x, y = divmod(cell, stride)
+        return weight * min([hypot(x - gx, y - gy) for gx, gy in goals])
+
+    if not goals or len(goals) > MAX_GUIDED_TARGETS:
+        estimate = lambda cell: 0.0
+    elif len(goals) == 1:
+        (gx, gy), = goals
+        def estimate(cell):
+            x, y = divmod(cell, stride)
+            return weight * hypot(x - gx, y - gy)
+
+    dist = {root: 0.0 for root in roots}
+    parent = {root: -1 for root in roots}
+    heap = [(estimate(root), root) for root in roots]
+    heapq.heapify(heap)
+    settled = set()
+    remaining = set(targets)
+    expansion_limit = max_expansions if max_expansions is not None else INF
+    exceeded = False
+    heappop, heappush = heapq.heappop, heapq.heappush
+    while heap and remaining:
+        _, current = heappop(heap)
+        if current in settled:
+            continue
+        expansions = len(settled)
+        if expansions >= expansion_limit or (
+                deadline is not None and expansions % DEADLINE_CHECK_INTERVAL == 0
+                and expansions and time.perf_counter() > deadline):
+            exceeded = True
+            break
+        settled.add(current)
+        remaining.discard(current)
+        d = dist[current]
+        if reverse:
+            enter_penalty = penalty[current]
+            if enter_penalty < 0:
+                continue  # 不可进入的格子只能作为起点，不能作为中转
+            enter_scale = scale[current]
+        for offset, move_cost in offsets:
+            neighbor = current + offset
+            if reverse:
+                # 填充边界格也会被赋值，但它不可进入、不会被继续扩展，也不会成为任何格子的下一跳
+                candidate = d + move_cost * enter_scale + enter_penalty
+            else:
+                neighbor_penalty = penalty[neighbor]
+                if neighbor_penalty < 0:
+                    continue
+                candidate = d + move_cost * scale[neighbor] + neighbor_penalty
+            if candidate < dist.get(neighbor, INF):
+                dist[neighbor] = candidate
+                parent[neighbor] = current
+                heappush(heap, (candidate + estimate(neighbor), neighbor))
+    return dist, parent, settled, exceeded
+
+
+def _settled_bounds(grid, settled):
+    """已确定格子及其邻居构成的包围盒 (地图坐标)"""
+    if not settled:
+        return None
+    stride = grid.stride
+    xs = [cell // stride for cell in settled]
+    ys = [cell % stride for cell in settled]
+    return (min(xs) - 2, min(ys) - 2, max(xs), max(ys))
@@ -13,7 +13,13 @@ MAP_CONFIG = {
     'min_buildings': 15,
     'max_buildings': 30,
     'min_obstacles': 20,
-    'max_obstacles': 40
+    'max_obstacles': 40,
+    'extra_city_nodes': 0,  # 除仓库/中转站/角落/桥之外随机放置的城市节点数，道路骨架连接所有节点
+    'seed': None,  # 地图生成种子，None 表示每次随机；固定后同一尺寸生成同一张地图
+    'cache_dir': 'map_cache',  # 固定种子时生成的地图缓存到该目录 (二进制 + 内存映射加载)，None 表示不缓存
+    'terrain_memmap_dir': None,  # 超大地图的地形数组改由该目录下的内存映射临时文件承载，None 表示放在内存中
+    'knowledge_delta_history': 1024,  # 知识地图变化流保留的最近变化条数，订阅者落后更多时整张重读
+    'snapshot_tile_size': 32  # 知识地图快照的瓦片边长 (格)，每次更新只复制被改动的瓦片
 }
 
 # 载具配置
@@ -48,6 +54,13 @@ WEATHER_EFFECTS = {
     'stormy': 2.0
 }
 
+# 地形 ID 表：真实地图与知识地图都以 uint8 (每格 1 字节) 存储
+#   0 normal   1 steep   2 narrow   3 hilly   4 water   5 road   6 building
+#   255 unknown (仅知识地图使用，表示尚未探索)
+# 新增地形时取 7..254 之间的值
+TERRAIN_DTYPE = 'uint8'
+UNKNOWN_TERRAIN_ID = 255
+
 TERRAIN_TYPES = {
     'normal': 0,
     'steep': 1,
@@ -98,4 +111,47 @@ TASK_ATTRIBUTES = {
     'cost_limit': 6,
     'scalability': 7,
     'cargo_type': 8
-}
\ No newline at end of file
+}
+
+# 路径规划配置
+PLANNING_CONFIG = {
+    'path_cache_size': 512,  # 路径缓存容量 (条目数)，按 get_planning_stats() 的命中/淘汰计数调整
+    'facility_distance_fields': True,  # 到仓库/中转站的规划直接查询反向 Dijkstra 代价场
+    'hierarchical_min_cells': 250000,  # 地图格子数达到该值时改用分层规划 (HPA*)
+    'hierarchical_cluster_size': 20,   # HPA* 簇边长 (格)
+    'road_network': True,              # road_only 智能体在压缩后的道路图 (路口为节点) 上规划
+    'incremental_replanning': True,    # 新揭示的地形波及剩余路径时用 D* Lite 增量修复
+    'replan_margin': 1,                # 变化格子与剩余路径的切比雪夫距离不超过该值即触发修复
+    'batch_planning': True,            # 调度打分时按能力配置合并查询，端点多时用一次一对多/多对一搜索回答
+    'batch_min_endpoints': 16,         # 同一能力配置的起点 (或终点) 达到该数量才使用批量搜索，否则逐对 A*
+    'call_max_expansions': 20000,      # 调度阶段单次搜索的最大扩展节点数，超出返回部分路径 (budget_exceeded)
+    'tick_max_expansions': None,       # 每帧调度阶段所有搜索共享的扩展节点预算，None 表示不限
+    'tick_time_budget': None,          # 每帧调度阶段的规划时间预算 (秒，如 0.015)，耗尽后剩余决策推迟到下一次调度
+    'max_planning_deferrals': 2,       # 同一决策连续推迟的次数上限，达到后下一次不受帧预算限制
+    'landmark_count': 0,               # 每个能力配置的 ALT 路标数量，0 表示只用欧氏距离启发式；建表为同步的全图 Dijkstra，不计入规划预算，只在小地图上开启
+    'landmark_refresh_cells': 2000,    # 自上次建表以来新揭示的格子达到该数量时重建路标距离表 (只为收紧下界，未重建时下界仍可采纳)
+    'planning_workers': 0,             # 规划进程池的进程数 (地图经共享内存零拷贝共享)，0 表示在协调线程内串行规划
+    'pool_min_pairs': 4,               # 同一能力配置待规划的 (起点, 终点) 对达到该数量才分发到进程池
+    'path_smoothing': True,            # 分配路径时做视线平滑，只保留拐点作为路点
+    'dispatch_mode': 'sequential',     # 'sequential' 每次调度只处理队首任务；'batch' 所有待分配任务与空闲智能体一轮最小代价指派
+    'assignment_max_tasks': 500        # 批量指派时每轮最多考虑的主线任务数 (按优先级)
+}
+
+# 仿真配置 (时间均为仿真时间，由 SimClock 按逻辑帧推进，与墙钟无关)
+SIMULATION_CONFIG = {
+    'tick_interval': 0.02,          # 每个逻辑帧代表的仿真时间 (秒)；可视化模式下也按此间隔以墙钟节拍运行
+    'dispatch_interval': 1.0,       # 任务分配的间隔 (仿真秒)
+    'relay_processing_time': 2.0,   # 中转站处理 (交接) 货物所需时间 (仿真秒)
+    'headless_max_time': 600.0,     # 无界面模式的仿真时长上限 (仿真秒)，任务全部结束或无法继续推进时提前停止
+    'engine': 'tick',               # 无界面模式的引擎：'tick' 逐帧推进所有智能体，'event' 离散事件驱动 (直接跳到下一个事件)
+    'event_sense_step': 1.0         # 事件驱动模式下沿路径每隔多少格取一个探测候选点，只有圆盘内仍有未知格子的候选点才产生 sense 事件
+}
+
+# 时间窗调度配置 (任务可在 tasks.yaml 中给出 time_window: [最早放行时刻, 最晚送达时刻]，单位仿真秒)
+SCHEDULING_CONFIG = {
+    'task_ordering': 'slack',       # 主线队列排序：'urgency' 只按紧急度；'edf' 截止时刻最早优先；'slack' 最晚出发时刻 (截止时刻 - 预计行程) 最早优先。无时间窗的任务排在有时间窗的任务之后，之间仍按紧急度
+    'infeasible_policy': 'reject',  # 预计无法在截止时刻前送达的任务：'reject' 提前拒绝 (不再占用智能体)；'escalate' 升级为最高优先级并照常配送
+    'eta_refresh_interval': 5.0,    # 按当前知识地图重新估计排队任务行程时间、检查可行性的间隔 (仿真秒)
+    'assignment_slack_weight': 1.0, # 批量指派时任务每秒时间窗余量 (edf: 距截止时刻；slack: 再扣除预计行程) 附加到该任务整行的代价，余量越小越先被分配；task_ordering 为 'urgency' 时不附加
+    'assignment_slack_horizon': 30.0   # 余量超过该值 (秒) 按该值计，无时间窗的任务也按该值计
+}
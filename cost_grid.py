@@ -0,0 +1,190 @@
+# cost_grid.py
+# -*- coding: utf-8 -*-
+"""
+代价网格模块
+将智能体的地形规则 (terrain_rules) 编译为 NumPy 可通行掩码与移动代价网格。
+编译结果按 (能力配置, 地图版本) 缓存，规划器在扁平整数索引上直接查表，
+不再逐格调用 get_terrain() / is_road()。
+地图提供变化流 (changes_since) 时，缓存的网格在缓存锁内原地修补变化的格子并推进版本号，
+每次揭示的代价与变化的格子数成正比，而不是整张复制；被改写格子的旧代价记入网格自身的有界历史，
+跨版本持有网格的读者 (代价场、HPA* 等) 用 CostGrid.changes_since() 取回自己所持版本的旧值。
+"""
+import math
+import threading
+import weakref
+from collections import deque
+import numpy as np
+from config import MAP_CONFIG
+
+# 与原 A* 规则保持一致的代价参数
+TERRAIN_PENALTIES = {'hilly': 2, 'steep': 5}
+UNKNOWN_PENALTY = 10
+ROAD_ONLY_UNKNOWN_PENALTY = 50
+ROAD_COST_FACTOR = 0.8
+
+# 8 邻域方向 (dx, dy, 基础移动代价)
+DIRECTIONS = [(1, 0, 1.0), (-1, 0, 1.0), (0, 1, 1.0), (0, -1, 1.0),
+              (1, 1, 1.4), (1, -1, 1.4), (-1, 1, 1.4), (-1, -1, 1.4)]
+
+IMPASSABLE = -1.0
+
+# 任意移动每单位欧氏距离的最小代价 (道路上斜向移动 1.4 * 0.8 / sqrt(2))，
+# 以它乘欧氏距离作为启发式是可采纳且一致的
+MIN_COST_PER_DISTANCE = ROAD_COST_FACTOR * 1.4 / math.sqrt(2)
+
+
+def profile_key(terrain_rules: dict) -> tuple:
+    """能力配置的可哈希键，地形规则相同的智能体共享编译结果"""
+    return tuple(sorted(terrain_rules.items()))
+
+
+class CostGrid:
+    """
+    某一能力配置在某一地图版本下的编译结果。
+    网格四周各填充一圈不可通行的边界格，扁平索引为 (x + 1) * stride + (y + 1)，
+    因此搜索时无需做越界检查。
+    - penalty: 进入该格的额外代价 (地形惩罚 + 未知惩罚)，IMPASSABLE 表示不可进入
+    - scale:   进入该格时基础移动代价的缩放系数 (道路为 0.8)
+    同一 (能力配置, 地图) 的网格对象跨版本复用，version 随原地修补推进。
+    """
+    def __init__(self, width, height, penalty: np.ndarray, scale: np.ndarray, version=None):
+        self.width = width
+        self.height = height
+        self.stride = height + 2
+        self.size = (width + 2) * self.stride
+        self.version = version
+        self.penalty_array = penalty  # (width + 2, height + 2)
+        self.scale_array = scale
+        # 搜索内循环使用 Python 列表查表，比逐元素访问 NumPy 数组快得多
+        self.penalty = penalty.ravel().tolist()
+        self.scale = scale.ravel().tolist()
+        self.neighbor_offsets = [(dx * self.stride + dy, cost) for dx, dy, cost in DIRECTIONS]
+        # (修补前版本, 修补后版本, 扁平索引, 旧 penalty, 旧 scale)，与知识地图变化流同样有界
+        self._history = deque(maxlen=MAP_CONFIG['knowledge_delta_history'])
+
+    def contains(self, node) -> bool:
+        return 0 <= node[0] < self.width and 0 <= node[1] < self.height
+
+    def index(self, node) -> int:
+        return (node[0] + 1) * self.stride + (node[1] + 1)
+
+    def node(self, index: int) -> tuple:
+        x, y = divmod(index, self.stride)
+        return (x - 1, y - 1)
+
+    def is_passable(self, node) -> bool:
+        return self.contains(node) and self.penalty[self.index(node)] >= 0
+
+    def apply_changes(self, terrain_rules: dict, terrain_types: dict, xs, ys, values, version):
+        """把格子 (xs, ys) 变为地形 values 之后的代价原地写入本网格并推进到 version (调用方持有缓存锁)"""
+        penalty, scale = _cell_costs(terrain_rules, terrain_types, np.asarray(values))
+        px, py = np.asarray(xs) + 1, np.asarray(ys) + 1
+        indices = px * self.stride + py
+        self._history.append((self.version, version, indices, self.penalty_array[px, py], self.scale_array[px, py]))
+        self.penalty_array[px, py] = penalty
+        self.scale_array[px, py] = scale
+        penalty_list, scale_list = self.penalty, self.scale
+        for index, p, s in zip(indices.tolist(), penalty.tolist(), scale.tolist()):
+            penalty_list[index] = p
+            scale_list[index] = s
+        self.version = version
+
+    def changes_since(self, version):
+        """
+        自 version 以来被改写过的格子：返回 (扁平索引, 这些格子在 version 时的 penalty, scale)，
+        索引不重复，代价未必真的变了；历史追溯不到 version 时返回 None，调用方应整张重建。
+        """
+        if version == self.version:
+            empty = np.empty(0)
+            return empty.astype(np.intp), empty, empty
+        history = list(self._history)
+        for position, entry in enumerate(history):
+            if entry[0] == version:
+                break
+        else:
+            return None
+        entries = history[position:]
+        indices = np.concatenate([entry[2] for entry in entries])
+        # 同一格子被多次改写时取最早一次记录的旧值，即 version 时的代价
+        indices, first = np.unique(indices, return_index=True)
+        old_penalty = np.concatenate([entry[3] for entry in entries])[first]
+        old_scale = np.concatenate([entry[4] for entry in entries])[first]
+        return indices, old_penalty, old_scale
+
+
+def _cell_costs(terrain_rules: dict, types: dict, terrain: np.ndarray):
+    """按地形规则计算任意形状地形数组每格的 (penalty, scale)"""
+    road_only = terrain_rules.get("road_only", False)
+    climb_height = terrain_rules.get("climb_height", 0)
+
+    is_road = terrain == types['road']
+    passable = np.ones(terrain.shape, dtype=bool)
+    penalty = np.zeros(terrain.shape, dtype=float)
+
+    if road_only:
+        passable &= is_road
+    if not terrain_rules.get("can_cross_water", False):
+        passable &= terrain != types['water']
+    for name, terrain_penalty in TERRAIN_PENALTIES.items():
+        mask = terrain == types[name]
+        penalty[mask] = terrain_penalty
+        if terrain_penalty > climb_height:
+            passable &= ~mask
+    if 'unknown' in types:
+        penalty[terrain == types['unknown']] = ROAD_ONLY_UNKNOWN_PENALTY if road_only else UNKNOWN_PENALTY
+
+    penalty[~passable] = IMPASSABLE
+    scale = np.where(is_road, ROAD_COST_FACTOR, 1.0)
+    return penalty, scale
+
+
+def compile_cost_grid(terrain_rules: dict, knowledge_map) -> CostGrid:
+    """把一组地形规则编译为 CostGrid (全图向量化计算)"""
+    terrain = np.asarray(knowledge_map.terrain)
+    penalty, scale = _cell_costs(terrain_rules, knowledge_map.terrain_types, terrain)
+
+    width, height = terrain.shape
+    padded_penalty = np.full((width + 2, height + 2), IMPASSABLE)
+    padded_penalty[1:-1, 1:-1] = penalty
+    padded_scale = np.ones((width + 2, height + 2))
+    padded_scale[1:-1, 1:-1] = scale
+    return CostGrid(width, height, padded_penalty, padded_scale, getattr(knowledge_map, 'version', None))
+
+
+# 地图对象 -> {profile_key: CostGrid}；地图被回收时缓存随之释放
+_grid_cache = weakref.WeakKeyDictionary()
+_grid_cache_lock = threading.Lock()
+
+
+def get_cost_grid(terrain_rules: dict, knowledge_map) -> CostGrid:
+    """
+    获取 (能力配置, 地图版本) 对应的 CostGrid，每个地图版本只编译一次。
+    地图能给出自缓存版本以来的变化 (changes_since) 时在缓存锁内原地修补变化的格子，否则整张重新编译。
+    没有 version 属性的地图对象无法判断是否变化，每次都重新编译。
+    提供 snapshot() 的地图在其不可变快照上编译，编译期间地图被其他线程更新也不会读到半新半旧的地形。
+    """
+    version = getattr(knowledge_map, 'version', None)
+    if version is None:
+        return compile_cost_grid(terrain_rules, knowledge_map)
+    source = knowledge_map.snapshot() if hasattr(knowledge_map, 'snapshot') else knowledge_map
+    version = source.version
+    key = profile_key(terrain_rules)
+    with _grid_cache_lock:
+        grids = _grid_cache.setdefault(knowledge_map, {})
+        grid = grids.get(key)
+        if grid is not None and grid.version == version:
+            return grid
+        deltas = None
+        if grid is not None and hasattr(knowledge_map, 'changes_since'):
+            deltas = knowledge_map.changes_since(grid.version)
+            # 只应用到快照版本为止，保证网格与快照一致
+            deltas = deltas and [d for d in deltas if d.version <= version]
+        if deltas:
+            grid.apply_changes(terrain_rules, knowledge_map.terrain_types,
+                               np.concatenate([d.xs for d in deltas]), np.concatenate([d.ys for d in deltas]),
+                               np.concatenate([d.values for d in deltas]), deltas[-1].version)
+            return grid
+    grid = compile_cost_grid(terrain_rules, source)
+    with _grid_cache_lock:
+        grids[key] = grid
+    return grid
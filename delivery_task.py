@@ -17,7 +17,10 @@ class DeliveryTask:
                  start_pos: Optional[Tuple[int, int]] = None, 
                  is_relay_leg: bool = False,
                  color: Optional[str] = None,
-                 original_task_id: Optional[str] = None): # <--- 核心修复：添加此参数
+                 original_task_id: Optional[str] = None, # <--- 核心修复：添加此参数
+                 time_window: Optional[Tuple[Optional[float], Optional[float]]] = None,
+                 cost_limit: Optional[float] = None,
+                 cargo_type: Optional[str] = None):
         
         self.task_id = task_id if task_id else f"task_{id(self)}"
         self.original_goal = goal_pos  # 原始目标点
@@ -25,6 +28,11 @@ class DeliveryTask:
         self.original_task_id = original_task_id if original_task_id else self.task_id
         self.weight = weight
         self.urgency = urgency
+        # 时间窗 (仿真秒)：(最早放行时刻, 最晚送达时刻)，任一端为 None 表示不限
+        self.time_window = tuple(time_window) if time_window else None
+        self.cost_limit = cost_limit
+        self.cargo_type = cargo_type
+        self.escalated = False  # 无法在时间窗内送达而被升级处理 (不再受截止时刻约束，优先配送)
         
         # 任务路径点
         self.start_pos = start_pos  # 对于接力任务，起点是中转站
@@ -42,6 +50,23 @@ class DeliveryTask:
         # 用于中转站处理延迟
         self.arrival_time = None # 记录任务到达中转站的时间
         
+    @property
+    def release_time(self) -> Optional[float]:
+        """最早放行时刻，此前任务不进入调度队列"""
+        return self.time_window[0] if self.time_window else None
+
+    @property
+    def deadline(self) -> Optional[float]:
+        """最晚送达时刻"""
+        return self.time_window[1] if self.time_window else None
+
+    @classmethod
+    def from_config(cls, item: dict) -> "DeliveryTask":
+        """由 tasks.yaml 中的一项构造任务"""
+        return cls(task_id=item['id'], goal_pos=tuple(item['goal_pos']), weight=item.get('weight', 1.0),
+                   urgency=item.get('urgency', 1), time_window=item.get('time_window'),
+                   cost_limit=item.get('cost_limit'), cargo_type=item.get('cargo_type'))
+
     def __repr__(self):
         """为任务提供一个清晰的字符串表示"""
         if self.is_relay_leg:
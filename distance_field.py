@@ -0,0 +1,174 @@
+# distance_field.py
+# -*- coding: utf-8 -*-
+"""
+代价场模块
+对某个能力配置，以固定目标点 (仓库/中转站) 为根做一次反向 Dijkstra，
+得到全图每个格子到根的最小代价与下一跳。之后任意 "从 X 到根" 的查询
+只需沿下一跳回溯，耗时与路径长度成正比，不再需要重新搜索。
+知识地图变化时只修复受影响的部分，而不是整张重算。
+"""
+import heapq
+import numpy as np
+from cost_grid import get_cost_grid
+
+INF = float('inf')
+# 填充边界格的距离标记：任何候选代价都不会小于它，因此边界格永远不会被松弛
+BORDER = -1.0
+
+
+class DistanceField:
+    def __init__(self, terrain_rules: dict, knowledge_map, root):
+        self.terrain_rules = terrain_rules
+        self.knowledge_map = knowledge_map
+        self.root = tuple(map(int, root))
+        self.grid = None
+        self.version = None
+        self.dist = None      # 扁平索引 -> 到根的最小代价
+        self.next_hop = None  # 扁平索引 -> 通往根的下一格，-1 表示无
+        self.full_rebuilds = 0
+        self.incremental_updates = 0
+
+    # ---------- 查询 ----------
+    def cost_from(self, start) -> float:
+        """从 start 到根的最小累计代价，不可达时为 inf"""
+        self.refresh()
+        start = tuple(map(int, start))
+        if not self.grid.contains(start):
+            return INF
+        return self.dist[self.grid.index(start)]
+
+    def path_from(self, start):
+        """沿下一跳回溯出从 start 到根的路径，不可达时返回 None"""
+        self.refresh()
+        start = tuple(map(int, start))
+        grid = self.grid
+        if not grid.contains(start):
+            return None
+        node = grid.index(start)
+        if self.dist[node] == INF:
+            return None
+        path = [start]
+        next_hop = self.next_hop
+        while next_hop[node] != -1:
+            node = next_hop[node]
+            path.append(grid.node(node))
+        return path
+
+    # ---------- 维护 ----------
+    def refresh(self):
+        """保证代价场与知识地图当前版本一致"""
+        grid = get_cost_grid(self.terrain_rules, self.knowledge_map)
+        if grid is self.grid and grid.version == self.version:
+            return
+        # 网格跨版本原地修补：同一网格对象能追溯到本代价场的版本时只做增量修复，否则 (重新编译过) 整张重建
+        changes = grid.changes_since(self.version) if grid is self.grid else None
+        if changes is None or not grid.contains(self.root):
+            self._full_build(grid)
+        else:
+            self._incremental_update(grid, changes)
+        self.grid, self.version = grid, grid.version
+
+    def _full_build(self, grid):
+        self.full_rebuilds += 1
+        dist = np.full((grid.width + 2, grid.height + 2), INF)
+        dist[0, :] = dist[-1, :] = dist[:, 0] = dist[:, -1] = BORDER
+        self.dist = dist.ravel().tolist()
+        self.next_hop = [-1] * grid.size
+        if not grid.contains(self.root):
+            return
+        root = grid.index(self.root)
+        self.dist[root] = 0.0
+        self._propagate(grid, [(0.0, root)])
+
+    def _incremental_update(self, new_grid, changes):
+        """
+        只修复代价发生变化的格子影响到的区域：
+        1. 进入代价变大 (含变为不可通行) 的格子，其下游子树 (下一跳链经过它的格子) 全部失效；
+        2. 失效格子与所有变化格子的邻居从周围有效的格子重新取值；
+        3. 从这些格子出发继续做 Dijkstra 传播，直到收敛。
+        """
+        indices, old_penalty, old_scale = changes
+        new_penalty, new_scale = new_grid.penalty, new_grid.scale
+        # changes 给出的是被改写过的格子 (含 version 时的旧代价)，只保留代价真正变化的
+        moved = (old_penalty != new_grid.penalty_array.ravel()[indices]) | (old_scale != new_grid.scale_array.ravel()[indices])
+        changed = indices[moved].tolist()
+        if not changed:
+            return
+        old_costs = dict(zip(changed, zip(old_penalty[moved].tolist(), old_scale[moved].tolist())))
+        self.incremental_updates += 1
+        dist, next_hop = self.dist, self.next_hop
+        offsets = new_grid.neighbor_offsets
+        root = new_grid.index(self.root)
+
+        # 1. 找出进入代价变大的格子，使其下游子树失效
+        increased = []
+        for cell in changed:
+            cell_old_penalty, cell_old_scale = old_costs[cell]
+            if new_penalty[cell] < 0:
+                if cell_old_penalty >= 0:
+                    increased.append(cell)
+            elif cell_old_penalty >= 0 and any(
+                    m * new_scale[cell] + new_penalty[cell] > m * cell_old_scale + cell_old_penalty
+                    for m in (1.0, 1.4)):
+                increased.append(cell)
+        invalid = []
+        stack = increased
+        while stack:
+            cell = stack.pop()
+            for offset, _ in offsets:
+                upstream = cell + offset
+                if next_hop[upstream] == cell:
+                    next_hop[upstream] = -1
+                    dist[upstream] = INF
+                    invalid.append(upstream)
+                    stack.append(upstream)
+
+        # 2. 失效格子与变化格子的邻居重新取值
+        frontier = set(invalid)
+        for cell in changed:
+            for offset, _ in offsets:
+                frontier.add(cell + offset)
+        frontier.discard(root)
+        heap = []
+        for cell in frontier:
+            best, best_hop = dist[cell], next_hop[cell]
+            if best == BORDER:
+                continue
+            for offset, move_cost in offsets:
+                neighbor = cell + offset
+                penalty = new_penalty[neighbor]
+                if penalty < 0 or dist[neighbor] == INF:
+                    continue  # 边界格的 penalty 恒为负，不会被选作下一跳
+                candidate = dist[neighbor] + move_cost * new_scale[neighbor] + penalty
+                if candidate < best:
+                    best, best_hop = candidate, neighbor
+            if best < INF:
+                dist[cell], next_hop[cell] = best, best_hop
+                heap.append((best, cell))
+        # 根格子本身变为可通行时，也需要从根重新向外传播
+        heap.append((0.0, root))
+        heapq.heapify(heap)
+
+        # 3. 传播
+        self._propagate(new_grid, heap)
+
+    def _propagate(self, grid, heap):
+        """反向 Dijkstra：边 u->v 的代价由被进入的格子 v 决定"""
+        dist, next_hop = self.dist, self.next_hop
+        penalty, scale, offsets = grid.penalty, grid.scale, grid.neighbor_offsets
+        heappop, heappush = heapq.heappop, heapq.heappush
+        while heap:
+            d, v = heappop(heap)
+            if d > dist[v]:
+                continue
+            enter_penalty = penalty[v]
+            if enter_penalty < 0:
+                continue  # 不可进入的格子只能作为起点，不能作为中转
+            enter_scale = scale[v]
+            for offset, move_cost in offsets:
+                u = v + offset
+                candidate = d + move_cost * enter_scale + enter_penalty
+                if candidate < dist[u]:
+                    dist[u] = candidate
+                    next_hop[u] = v
+                    heappush(heap, (candidate, u))
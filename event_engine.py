@@ -0,0 +1,245 @@
+# event_engine.py
+# -*- coding: utf-8 -*-
+"""
+离散事件仿真引擎
+用未来事件堆取代固定 20ms 轮询：仿真时钟直接跳到下一个事件的时刻，空闲的智能体不产生任何开销。
+事件类型：
+    move          智能体到达下一个路点 (到达时刻由速度解析计算)，探测周围后排定下一段的 move 与 sense；
+                  路径被增量修复或重新分配时作废已排定的事件，从当前位置按新路径重新排定
+    sense         智能体在本段途中探测周围；只在探测圆盘会覆盖未知格子的位置 (每 event_sense_step 格取一个候选点) 排定，
+                  圆盘内已全部已知的路段不产生任何事件
+    dispatch      任务分配；由任务到达、任务到达放行时刻、智能体转为空闲、中转站处理完成和规划推迟触发，
+                  对齐到 dispatch_interval 的整数倍
+    replan        修复剩余路径受新地形影响的智能体 (coord.pending_replans)，在揭示发生的时刻处理；
+                  规划预算用尽时隔一帧 (tick_interval) 重试，与逐帧模式一致
+    task_arrival  任务在指定仿真时刻进入主队列
+仿真开销与事件数成正比，而不是 帧数 × 智能体数。
+"""
+import heapq
+import itertools
+import math
+from config import SIMULATION_CONFIG
+
+MOVING_STATES = ("delivering", "returning")
+
+
+class EventEngine:
+    def __init__(self, coordination_system):
+        self.coord = coordination_system
+        self.clock = coordination_system.clock
+        self.sense_step = SIMULATION_CONFIG['event_sense_step']
+        self._events = []                  # (时刻, 序号, 类型, 数据)
+        self._sequence = itertools.count()
+        self._move_tokens = {}             # agent_id -> 当前有效的 move/sense 事件编号 (即有待处理的 move 事件)
+        self._advanced_at = {}             # agent_id -> 上次推进位置的时刻
+        self._move_paths = {}              # agent_id -> 排定事件时的路径对象，路径被替换后据此重新排定
+        self._tokens = itertools.count()
+        self._dispatch_at = None           # 已排定的最早一次分配时刻
+        self._replan_at = None
+        self._dispatch_version = None      # 上一次分配时的知识地图版本，用于判断剩余任务是否已无法推进
+        self.events_processed = 0
+
+    def schedule(self, time: float, kind: str, data=None):
+        heapq.heappush(self._events, (time, next(self._sequence), kind, data))
+
+    def add_task(self, task, time: float = None):
+        """任务在仿真时刻 time (默认当前) 到达主队列"""
+        self.schedule(self.clock.now() if time is None else time, 'task_arrival', task)
+
+    def run(self, max_time: float = None) -> dict:
+        """处理事件直到事件堆为空 (所有任务结束或剩余任务无法推进) 或仿真时间超过 max_time，返回运行摘要 (含 stop_reason，取值同 run_headless)"""
+        coord = self.coord
+        max_time = SIMULATION_CONFIG['headless_max_time'] if max_time is None else max_time
+        coord.is_running = True
+        self._schedule_dispatch(self._grid_time(self.clock.now(), SIMULATION_CONFIG['dispatch_interval']))
+        self._start_moving_agents(self.clock.now())
+        stop_reason = None
+        while self._events and coord.is_running:
+            time, _, kind, data = heapq.heappop(self._events)
+            if time > max_time:
+                stop_reason = 'max_time'
+                break
+            self.clock.advance_to(time)
+            self.events_processed += 1
+            if kind == 'move':
+                if self._move_tokens.get(data[0]) == data[1]:  # 路径改变后作废的事件直接丢弃
+                    self._on_move(time, data[0])
+            elif kind == 'sense':
+                if self._move_tokens.get(data[0]) == data[1]:
+                    self._on_sense(time, data[0])
+            elif kind == 'dispatch':
+                if time == self._dispatch_at:  # 被更早的分配取代的事件直接丢弃
+                    self._on_dispatch(time)
+            elif kind == 'task_arrival':
+                coord.add_task(data)
+                self._schedule_dispatch(self._grid_time(time, SIMULATION_CONFIG['dispatch_interval']))
+            elif kind == 'replan':
+                if time == self._replan_at:
+                    self._on_replan(time)
+        if stop_reason is None:
+            if not coord.is_running:
+                stop_reason = 'stopped'
+            else:
+                # 事件堆耗尽：队列与暂存区都空了就是正常结束，否则剩余任务已无法推进
+                stop_reason = 'completed' if coord.main_task_queue.empty() and not coord.held_tasks else 'stalled'
+        coord.is_running = False
+        return {"sim_time": self.clock.now(), "steps": self.events_processed,
+                "completed_tasks": coord.completed_task_count, "pending_tasks": len(coord.main_task_queue),
+                "stop_reason": stop_reason}
+
+    # ---------- 事件处理 ----------
+    def _on_move(self, time, agent_id):
+        agent = self.coord.agents[agent_id]
+        if agent.state not in MOVING_STATES or agent.vehicle is None:
+            self._stop_agent(agent_id)
+            return
+        self._advance(agent, time)
+        self._stop_agent(agent_id)
+        self._sense(agent, time)
+        if agent.vehicle.current_waypoint_index >= len(agent.vehicle.path):
+            agent.finish_path()
+            if agent.state == "idle":
+                self._schedule_dispatch(self._grid_time(time, SIMULATION_CONFIG['dispatch_interval']))
+        if agent.state in MOVING_STATES:
+            self._schedule_move(agent, time)
+
+    def _on_sense(self, time, agent_id):
+        agent = self.coord.agents[agent_id]
+        if agent.state not in MOVING_STATES or agent.vehicle is None:
+            self._stop_agent(agent_id)
+            return
+        self._advance(agent, time)
+        self._sense(agent, time)
+        self._schedule_sense(agent, time, self._move_tokens[agent_id])
+
+    def _on_dispatch(self, time):
+        coord = self.coord
+        self._dispatch_at = None
+        deferrals = coord.planning_deferrals
+        coord.planning_budget.reset()
+        self._advance_pending(time)
+        coord.dispatch()
+        self._reschedule_changed_paths(time)
+        self._start_moving_agents(time)
+        # 中转站处理完成时再分配一次
+        for task in coord.relay_task_pool:
+            if task.arrival_time is not None and task.arrival_time + coord.RELAY_PROCESSING_TIME > time:
+                self._schedule_dispatch(task.arrival_time + coord.RELAY_PROCESSING_TIME)
+        if coord.pending_replans:
+            self._schedule_replan(time + self.clock.tick_interval)
+        # 暂存的任务到放行时刻时再分配一次
+        if coord.held_tasks:
+            self._schedule_dispatch(self._grid_time(coord.held_tasks[0][0], SIMULATION_CONFIG['dispatch_interval']))
+        # 仍有待分配任务且有空闲智能体：规划被推迟、有智能体在移动 (可能揭示新地形) 或地图刚变化过时下一周期重试
+        pending = not coord.main_task_queue.empty() or coord.relay_task_pool
+        if pending and any(agent.state == "idle" for agent in coord.agents.values()):
+            version = coord.knowledge_map.version
+            if coord.planning_deferrals != deferrals or self._move_tokens or version != self._dispatch_version:
+                self._schedule_dispatch(self._grid_time(time, SIMULATION_CONFIG['dispatch_interval'], strict=True))
+            self._dispatch_version = version
+
+    def _on_replan(self, time):
+        coord = self.coord
+        self._replan_at = None
+        coord.planning_budget.reset()
+        self._advance_pending(time)
+        coord._process_pending_replans()
+        self._reschedule_changed_paths(time)
+        if coord.pending_replans:  # 预算用尽，下一帧继续
+            self._schedule_replan(time + self.clock.tick_interval)
+
+    # ---------- 排程 ----------
+    def _speed(self, agent) -> float:
+        """每仿真秒移动的格数，与逐帧模式一致"""
+        return agent.distance_per_tick() / self.clock.tick_interval
+
+    def _advance(self, agent, time):
+        """把智能体沿当前路径推进到 time (距离为 0 时也会越过正好位于当前位置的路点)"""
+        agent.travel(self._speed(agent) * max(time - self._advanced_at[agent.agent_id], 0.0))
+        self._advanced_at[agent.agent_id] = time
+
+    def _sense(self, agent, time):
+        """探测周围；揭示出新地形且有路径受影响时，在同一时刻修复"""
+        agent.explore_surroundings()
+        if self.coord.pending_replans:
+            self._schedule_replan(time)
+
+    def _advance_pending(self, time):
+        """修复路径前先把待修复的智能体推进到当前时刻，D* Lite 从它们此刻所在的格子出发"""
+        for agent_id in self.coord.pending_replans:
+            if agent_id in self._move_tokens:
+                self._advance(self.coord.agents[agent_id], time)
+
+    def _reschedule_changed_paths(self, time):
+        """路径对象已被替换 (增量修复、重新规划) 的移动中智能体：作废旧事件，按新路径重新排定"""
+        for agent_id, path in list(self._move_paths.items()):
+            agent = self.coord.agents[agent_id]
+            if agent.vehicle is not None and agent.vehicle.path is path:
+                continue
+            self._stop_agent(agent_id)
+            if agent.state in MOVING_STATES and agent.vehicle is not None:
+                self._schedule_move(agent, time)
+
+    def _stop_agent(self, agent_id):
+        self._move_tokens.pop(agent_id, None)
+        self._advanced_at.pop(agent_id, None)
+        self._move_paths.pop(agent_id, None)
+
+    def _schedule_move(self, agent, time):
+        """排定到达下一个路点的 move 事件，以及本段途中第一次能揭示新地形的 sense 事件"""
+        agent_id = agent.agent_id
+        token = next(self._tokens)
+        self._move_tokens[agent_id] = token
+        self._advanced_at[agent_id] = time
+        self._move_paths[agent_id] = agent.vehicle.path
+        self.schedule(time + agent.distance_to_waypoint() / self._speed(agent), 'move', (agent_id, token))
+        self._schedule_sense(agent, time, token)
+
+    def _schedule_sense(self, agent, time, token):
+        """
+        沿当前位置到下一个路点的线段，每 sense_step 格取一个候选点，找出第一个探测圆盘内仍有未知格子的点。
+        已知格子不会变回未知，因此此刻圆盘内已全部已知的候选点之后也不会揭示任何格子，可以直接跳过；
+        到达路点时由 move 事件探测，这里不包含线段终点。
+        """
+        segment = agent.distance_to_waypoint()
+        if segment <= self.sense_step:
+            return
+        x, y = agent.position
+        wx, wy = agent.vehicle.path[agent.vehicle.current_waypoint_index]
+        knowledge_map = self.coord.knowledge_map
+        last_center = (int(x), int(y))
+        steps = math.ceil(segment / self.sense_step) - 1
+        for k in range(1, steps + 1):
+            distance = k * self.sense_step
+            ratio = distance / segment
+            center = (int(x + (wx - x) * ratio), int(y + (wy - y) * ratio))
+            if center == last_center:
+                continue
+            last_center = center
+            if knowledge_map.disc_has_unknown(center, agent.exploration_radius):
+                self.schedule(time + distance / self._speed(agent), 'sense', (agent.agent_id, token))
+                return
+
+    def _start_moving_agents(self, time):
+        """为刚被分配任务、尚无 move 事件的智能体排定移动"""
+        for agent in self.coord.agents.values():
+            if agent.state in MOVING_STATES and agent.agent_id not in self._move_tokens:
+                self._schedule_move(agent, time)
+
+    def _schedule_dispatch(self, time):
+        if self._dispatch_at is not None and self._dispatch_at <= time:
+            return
+        self._dispatch_at = time
+        self.schedule(time, 'dispatch')
+
+    def _schedule_replan(self, time):
+        if self._replan_at is not None and self._replan_at <= time:
+            return
+        self._replan_at = time
+        self.schedule(time, 'replan')
+
+    @staticmethod
+    def _grid_time(time, interval, strict=False):
+        """不早于 (strict 时晚于) time 的 interval 整数倍时刻"""
+        slots = math.floor(time / interval) + 1 if strict else math.ceil(time / interval)
+        return slots * interval
@@ -0,0 +1,373 @@
+# hierarchical_planner.py
+# -*- coding: utf-8 -*-
+"""
+分层路径规划模块 (HPA*)
+把知识地图划分为固定大小的簇，在相邻簇的边界上找出入口，
+先在 "入口图" 上做抽象 A*，再只对路径经过的簇做簇内细化。
+入口与簇内边均按需计算并缓存，知识地图变化时只重建被触及的簇。
+适用于大地图；小地图上直接用网格 A* 更快。
+"""
+import heapq
+import math
+import time
+from cost_grid import get_cost_grid
+from path_planning import (PlanResult, snap_endpoints, heuristic, merge_bounds, PLAN_FOUND, PLAN_UNREACHABLE,
+                           PLAN_BUDGET_EXCEEDED, DEADLINE_CHECK_INTERVAL)
+
+# 边界上连续可通行段长度达到该值时，在两端及每隔 ENTRANCE_SPACING 格各放一个入口，否则只在中点放一个
+LONG_ENTRANCE_LENGTH = 6
+ENTRANCE_SPACING = 4
+
+
+class HierarchicalPlanner:
+    def __init__(self, terrain_rules: dict, knowledge_map, cluster_size: int = 20):
+        self.terrain_rules = terrain_rules
+        self.knowledge_map = knowledge_map
+        self.cluster_size = cluster_size
+        self.grid = None
+        self.version = None
+        self._borders = {}   # 边界键 -> [(a, b)]，a/b 为边界两侧成对的入口格 (扁平索引)
+        self._clusters = {}  # 簇坐标 -> (簇内入口列表, {入口: [(邻接节点, 代价)]})
+        self._cells = {}     # 簇坐标 -> 簇内所有格子的扁平索引集合
+        self.clusters_rebuilt = 0
+
+    # ---------- 维护 ----------
+    def refresh(self):
+        """与知识地图当前版本同步：按变化流 (changes_since) 找出变化的簇，只丢弃它们及相邻簇的缓存"""
+        grid = get_cost_grid(self.terrain_rules, self.knowledge_map)
+        if grid is self.grid and grid.version == self.version:
+            return
+        deltas = None
+        if self.grid is not None and grid.size == self.grid.size:
+            deltas = self.knowledge_map.changes_since(self.version)
+        if deltas is None:
+            # 首次使用、地图尺寸变化或变化历史已被挤出：全部重建
+            self._borders.clear(); self._clusters.clear(); self._cells.clear()
+        else:
+            c = self.cluster_size
+            dirty = set()
+            for delta in deltas:
+                if delta.version <= grid.version:
+                    dirty.update(zip((delta.xs // c).tolist(), (delta.ys // c).tolist()))
+            for i, j in dirty:
+                for key in (('x', i - 1, j), ('x', i, j), ('y', i, j - 1), ('y', i, j)):
+                    self._borders.pop(key, None)
+                for cluster in ((i, j), (i - 1, j), (i + 1, j), (i, j - 1), (i, j + 1)):
+                    self._clusters.pop(cluster, None)
+        self.grid, self.version = grid, grid.version
+
+    def _cluster_of(self, index):
+        x, y = divmod(index, self.grid.stride)
+        return ((x - 1) // self.cluster_size, (y - 1) // self.cluster_size)
+
+    def _cluster_bounds(self, cluster):
+        """簇及其相邻簇覆盖的区域 (含两端)：它们的变化都会影响该簇的入口图"""
+        x0, y0, x1, y1 = self._cluster_rect(cluster)
+        c = self.cluster_size
+        return (x0 - c, y0 - c, x1 + c - 1, y1 + c - 1)
+
+    def _cluster_cells(self, *clusters):
+        cells = set()
+        for cluster in clusters:
+            members = self._cells.get(cluster)
+            if members is None:
+                x0, y0, x1, y1 = self._cluster_rect(cluster)
+                stride = self.grid.stride
+                members = self._cells[cluster] = frozenset(
+                    (x + 1) * stride + y + 1 for x in range(x0, x1) for y in range(y0, y1))
+            if len(clusters) == 1:
+                return members
+            cells |= members
+        return cells
+
+    def _cluster_rect(self, cluster):
+        """簇覆盖的地图坐标范围 (x0, y0, x1, y1)，右/上边界不含"""
+        c = self.cluster_size
+        i, j = cluster
+        return (i * c, j * c, min((i + 1) * c, self.grid.width), min((j + 1) * c, self.grid.height))
+
+    def _border_transitions(self, key):
+        """计算簇 (i, j) 与其右侧 ('x') 或上方 ('y') 相邻簇之间的入口对"""
+        transitions = self._borders.get(key)
+        if transitions is not None:
+            return transitions
+        axis, i, j = key
+        grid, c = self.grid, self.cluster_size
+        if axis == 'x':
+            edge = (i + 1) * c  # 右侧簇的第一列
+            lo, hi = j * c, min((j + 1) * c, grid.height)
+            pairs = [((edge - 1, y), (edge, y)) for y in range(lo, hi)]
+        else:
+            edge = (j + 1) * c
+            lo, hi = i * c, min((i + 1) * c, grid.width)
+            pairs = [((x, edge - 1), (x, edge)) for x in range(lo, hi)]
+        transitions = []
+        if 0 < edge < (grid.width if axis == 'x' else grid.height) and lo < hi:
+            run = []
+            for a, b in pairs + [(None, None)]:
+                if a is not None and grid.is_passable(a) and grid.is_passable(b):
+                    run.append((grid.index(a), grid.index(b)))
+                    continue
+                if run:
+                    if len(run) >= LONG_ENTRANCE_LENGTH:
+                        transitions.extend(run[:-1:ENTRANCE_SPACING])
+                        transitions.append(run[-1])
+                    else:
+                        transitions.append(run[len(run) // 2])
+                    run = []
+        self._borders[key] = transitions
+        return transitions
+
+    def _cluster_graph(self, cluster):
+        """返回簇内入口及其邻接表 (簇内边 + 跨边界边)，首次访问时计算"""
+        data = self._clusters.get(cluster)
+        if data is not None:
+            return data
+        self.clusters_rebuilt += 1
+        i, j = cluster
+        grid = self.grid
+        inter = {}
+        # (边界键, 本簇入口位于入口对中的哪一侧)
+        for key, side in ((('x', i - 1, j), 1), (('x', i, j), 0), (('y', i, j - 1), 1), (('y', i, j), 0)):
+            for pair in self._border_transitions(key):
+                node, other = pair[side], pair[1 - side]
+                inter.setdefault(node, []).append((other, 1.0 * grid.scale[other] + grid.penalty[other]))
+        nodes = list(inter)
+        adjacency = {node: list(edges) for node, edges in inter.items()}
+        if len(nodes) > 1:
+            # 簇内所有入口两两之间的代价：先建簇内局部邻接表，再从每个入口做一次 Dijkstra
+            cells = sorted(self._cluster_cells(cluster))
+            local = {cell: k for k, cell in enumerate(cells)}
+            penalty, scale = grid.penalty, grid.scale
+            local_adjacency = []
+            for cell in cells:
+                edges = []
+                for offset, move_cost in grid.neighbor_offsets:
+                    neighbor = cell + offset
+                    k = local.get(neighbor)
+                    if k is not None and penalty[neighbor] >= 0:
+                        edges.append((k, move_cost * scale[neighbor] + penalty[neighbor]))
+                local_adjacency.append(edges)
+            node_locals = [local[node] for node in nodes]
+            for node, source in zip(nodes, node_locals):
+                dist = _local_dijkstra(local_adjacency, source, node_locals)
+                adjacency[node].extend((other, dist[k]) for other, k in zip(nodes, node_locals)
+                                       if other != node and dist[k] < math.inf)
+        data = self._clusters[cluster] = (nodes, adjacency)
+        return data
+
+    # ---------- 查询 ----------
+    def plan(self, start_node, goal_node, max_expansions=None, deadline=None):
+        """
+        返回 (path, bounds, expansions, status)；抽象图上无路可走时 path 为 None，status 为 PLAN_UNREACHABLE。
+        bounds 覆盖所有被扩展入口所在的簇及其相邻簇。
+        expansions 计入簇内 Dijkstra 确定的格子与抽象图上扩展的入口；达到 max_expansions
+        或 time.perf_counter() 超过 deadline 时停止，path 为 None，status 为 PLAN_BUDGET_EXCEEDED。
+        """
+        self.refresh()
+        grid = self.grid
+        if not grid.contains(start_node) or not grid.contains(goal_node):
+            return None, None, 0, PLAN_UNREACHABLE
+        start, goal = grid.index(start_node), grid.index(goal_node)
+        if start == goal:
+            return [start_node], (start_node[0], start_node[1], start_node[0], start_node[1]), 0, PLAN_FOUND
+        start_cluster, goal_cluster = self._cluster_of(start), self._cluster_of(goal)
+
+        # 起终点位于同一簇或相邻簇时，直接在这两簇的范围内搜索，避免绕行入口
+        if abs(start_cluster[0] - goal_cluster[0]) <= 1 and abs(start_cluster[1] - goal_cluster[1]) <= 1:
+            a, b = self._cluster_rect(start_cluster), self._cluster_rect(goal_cluster)
+            rect = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+            block = [(i, j) for i in range(min(start_cluster[0], goal_cluster[0]), max(start_cluster[0], goal_cluster[0]) + 1)
+                     for j in range(min(start_cluster[1], goal_cluster[1]), max(start_cluster[1], goal_cluster[1]) + 1)]
+            _, parent = bounded_dijkstra(grid, start, self._cluster_cells(*block), targets=[goal])
+            if goal in parent:
+                path = []
+                node = goal
+                while node != -1:
+                    path.append(grid.node(node))
+                    node = parent[node]
+                path.reverse()
+                return path, (rect[0] - 1, rect[1] - 1, rect[2], rect[3]), len(parent), PLAN_FOUND
+
+        # 临时把起点/终点接入抽象图
+        start_nodes, _ = self._cluster_graph(start_cluster)
+        start_targets = start_nodes + [goal] if start_cluster == goal_cluster else start_nodes
+        dist, _ = bounded_dijkstra(grid, start, self._cluster_cells(start_cluster), targets=start_targets)
+        start_edges = [(node, dist[node]) for node in start_targets if node in dist]
+        expansions = len(dist)
+        goal_nodes, _ = self._cluster_graph(goal_cluster)
+        dist, _ = bounded_dijkstra(grid, goal, self._cluster_cells(goal_cluster), targets=goal_nodes, reverse=True)
+        goal_dist = {node: dist[node] for node in goal_nodes if node in dist}
+        expansions += len(dist)
+        if not start_edges or not goal_dist:
+            # 起点或终点在簇内无法连到任何入口：抽象图上必然不可达，不必展开整张入口图
+            bounds = merge_bounds(self._cluster_bounds(start_cluster), self._cluster_bounds(goal_cluster))
+            return None, bounds, expansions, PLAN_UNREACHABLE
+
+        stride = grid.stride
+        gx, gy = divmod(goal, stride)
+        g_score = {start: 0.0}
+        parent = {start: -1}
+        open_heap = [(0.0, start)]
+        closed = set()
+        touched = set()
+        found = exceeded = False
+        expansion_limit = max_expansions if max_expansions is not None else math.inf
+        while open_heap:
+            _, current = heapq.heappop(open_heap)
+            if current in closed:
+                continue
+            if expansions >= expansion_limit or (
+                    deadline is not None and expansions % DEADLINE_CHECK_INTERVAL == 0
+                    and time.perf_counter() > deadline):
+                exceeded = True
+                break
+            closed.add(current)
+            expansions += 1
+            if current == goal:
+                found = True
+                break
+            cluster = self._cluster_of(current)
+            touched.add(cluster)
+            edges = list(self._cluster_graph(cluster)[1].get(current, ()))
+            if current == start:
+                edges.extend(start_edges)
+            if current in goal_dist:
+                edges.append((goal, goal_dist[current]))
+            for neighbor, cost in edges:
+                if neighbor == current or neighbor in closed:
+                    continue
+                tentative = g_score[current] + cost
+                if tentative < g_score.get(neighbor, math.inf):
+                    g_score[neighbor] = tentative
+                    parent[neighbor] = current
+                    nx, ny = divmod(neighbor, stride)
+                    heapq.heappush(open_heap, (tentative + math.hypot(nx - gx, ny - gy), neighbor))
+
+        touched.add(goal_cluster)
+        bounds = None
+        for cluster in touched:
+            bounds = merge_bounds(bounds, self._cluster_bounds(cluster))
+        if not found:
+            return None, bounds, expansions, PLAN_BUDGET_EXCEEDED if exceeded else PLAN_UNREACHABLE
+
+        abstract_path = []
+        node = goal
+        while node != -1:
+            abstract_path.append(node)
+            node = parent[node]
+        abstract_path.reverse()
+        return self._refine(abstract_path), bounds, expansions, PLAN_FOUND
+
+    def _refine(self, abstract_path):
+        """逐段细化：跨边界的相邻入口直接相连，簇内段在该簇范围内重新搜索"""
+        grid = self.grid
+        path = [grid.node(abstract_path[0])]
+        for u, v in zip(abstract_path, abstract_path[1:]):
+            cluster = self._cluster_of(u)
+            if cluster != self._cluster_of(v):
+                path.append(grid.node(v))
+                continue
+            _, parent = bounded_dijkstra(grid, u, self._cluster_cells(cluster), targets=[v])
+            segment = []
+            node = v
+            while node != u:
+                segment.append(grid.node(node))
+                node = parent[node]
+            segment.reverse()
+            path.extend(segment)
+        return path
+
+
+def _local_dijkstra(adjacency, source, targets):
+    """在簇内局部邻接表上的 Dijkstra，所有 targets 确定后提前结束"""
+    dist = [math.inf] * len(adjacency)
+    dist[source] = 0.0
+    remaining = set(targets)
+    remaining.discard(source)
+    heap = [(0.0, source)]
+    heappop, heappush = heapq.heappop, heapq.heappush
+    while heap and remaining:
+        d, current = heappop(heap)
+        if d > dist[current]:
+            continue
+        remaining.discard(current)
+        for neighbor, cost in adjacency[current]:
+            candidate = d + cost
+            if candidate < dist[neighbor]:
+                dist[neighbor] = candidate
+                heappush(heap, (candidate, neighbor))
+    return dist
+
+
+def bounded_dijkstra(grid, source, cells, targets=None, reverse=False):
+    """
+    只在 cells (扁平索引集合) 范围内的 Dijkstra。
+    reverse=True 时计算各格子到 source 的代价 (边代价仍由被进入的格子决定)。
+    所有 targets 都确定后提前结束。返回 (dist, parent) 两个字典。
+    """
+    penalty, scale, offsets = grid.penalty, grid.scale, grid.neighbor_offsets
+    remaining = set(targets) if targets is not None else None
+    if remaining is not None:
+        remaining.discard(source)
+        if not remaining:
+            return {source: 0.0}, {source: -1}
+    dist = {source: 0.0}
+    parent = {source: -1}
+    heap = [(0.0, source)]
+    done = set()
+    heappop, heappush = heapq.heappop, heapq.heappush
+    while heap:
+        d, current = heappop(heap)
+        if current in done:
+            continue
+        done.add(current)
+        if remaining is not None and current in remaining:
+            remaining.discard(current)
+            if not remaining:
+                break
+        if reverse:
+            # 反向：从 current 出发回溯可以一步进入 current 的格子
+            enter_penalty = penalty[current]
+            if enter_penalty < 0:
+                continue
+            enter_scale = scale[current]
+        for offset, move_cost in offsets:
+            neighbor = current + offset
+            if neighbor not in cells:
+                continue
+            if reverse:
+                candidate = d + move_cost * enter_scale + enter_penalty
+            else:
+                neighbor_penalty = penalty[neighbor]
+                if neighbor_penalty < 0:
+                    continue
+                candidate = d + move_cost * scale[neighbor] + neighbor_penalty
+            if candidate < dist.get(neighbor, math.inf):
+                dist[neighbor] = candidate
+                parent[neighbor] = current
+                heappush(heap, (candidate, neighbor))
+    return dist, parent
+
+
+def plan_path_hierarchical(agent_capabilities, knowledge_map, planner: HierarchicalPlanner, start_pos, goal_pos,
+                           budget=None, max_expansions=None) -> PlanResult:
+    """
+    与 path_planning.plan_path 返回相同结构；抽象图不可达时 path 为 None，由调用方回退。
+    budget (PlanningBudget) 与 max_expansions 的用法同 plan_path：扩展数计入预算，
+    超出时 status 为 PLAN_BUDGET_EXCEEDED (分层规划没有可用的部分路径，path 为 None)。
+    """
+    rules = agent_capabilities["terrain_rules"]
+    start_node = tuple(map(int, start_pos))
+    original_goal_node = tuple(map(int, goal_pos))
+    start_node, goal_node, bounds = snap_endpoints(rules, knowledge_map, start_node, original_goal_node)
+    if start_node is None:
+        return PlanResult(None, float('inf'), bounds)
+    limit, deadline = budget.allowance(max_expansions) if budget else (max_expansions, None)
+    path, search_bounds, expansions, status = planner.plan(start_node, goal_node, limit, deadline)
+    if budget:
+        budget.charge(expansions, status)
+    bounds = merge_bounds(bounds, search_bounds)
+    if not path:
+        return PlanResult(None, float('inf'), bounds, expansions, status)
+    return PlanResult(path, heuristic(path[-1], original_goal_node), bounds, expansions, status)
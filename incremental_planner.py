@@ -0,0 +1,192 @@
+# incremental_planner.py
+# -*- coding: utf-8 -*-
+"""
+增量重规划模块 (D* Lite)
+从终点向起点做反向搜索并保留搜索状态 (g / rhs / 开放表)。
+知识地图揭示新地形后，只重新计算代价发生变化的格子及其受影响的邻域，
+智能体沿路径前进时起点随之移动，不需要每次都从头运行一遍 A*。
+搜索可以按扩展数/截止时间中途停下，搜索状态保持一致，下一次 plan() 从停下的地方继续。
+"""
+import heapq
+import math
+import time
+from cost_grid import get_cost_grid, MIN_COST_PER_DISTANCE
+from path_planning import PLAN_FOUND, PLAN_UNREACHABLE, PLAN_BUDGET_EXCEEDED, DEADLINE_CHECK_INTERVAL
+
+INF = float('inf')
+
+
+class IncrementalPlanner:
+    def __init__(self, terrain_rules: dict, knowledge_map, goal):
+        self.terrain_rules = terrain_rules
+        self.knowledge_map = knowledge_map
+        self.goal_node = tuple(map(int, goal))
+        self.grid = get_cost_grid(terrain_rules, knowledge_map)
+        self.goal = self.grid.index(self.goal_node)
+        self.g = {}
+        self.rhs = {self.goal: 0.0}
+        self.open_heap = []
+        self.open_keys = {}   # 格子 -> 当前有效的键，堆中键不一致的条目视为已删除
+        self.km = 0.0
+        self.start = None
+        self._pending = set()  # 尚未处理的变化格子 (扁平索引)
+        self.expansions = 0
+        self.repairs = 0
+        self._push(self.goal, self._key(self.goal))
+
+    # ---------- 外部接口 ----------
+    def notify(self, xs, ys):
+        """记录知识地图中发生变化的格子，下一次 plan() 时统一修复"""
+        stride = self.grid.stride
+        self._pending.update((x + 1) * stride + (y + 1) for x, y in zip(xs, ys))
+
+    def plan(self, start, max_expansions=None, deadline=None):
+        """
+        返回 (从 start 到终点的最短路径 (格子列表), 状态)，不可达时路径为 None、状态为 PLAN_UNREACHABLE。
+        本次扩展数达到 max_expansions 或 time.perf_counter() 超过 deadline 时停下，
+        返回 (None, PLAN_BUDGET_EXCEEDED)；已扩展的节点计入 self.expansions。
+        """
+        start_node = tuple(map(int, start))
+        if not self.grid.contains(start_node):
+            return None, PLAN_UNREACHABLE
+        start = self.grid.index(start_node)
+        if self.start is not None and start != self.start:
+            # 起点移动：累加 km，而不是重排整个开放表
+            self.km += self._heuristic(self.start, start)
+        self.start = start
+        self._apply_changes()
+        if not self._compute_shortest_path(max_expansions, deadline):
+            return None, PLAN_BUDGET_EXCEEDED
+        path = self._extract_path()
+        return path, PLAN_FOUND if path else PLAN_UNREACHABLE
+
+    # ---------- D* Lite ----------
+    def _heuristic(self, a, b):
+        ax, ay = divmod(a, self.grid.stride)
+        bx, by = divmod(b, self.grid.stride)
+        return MIN_COST_PER_DISTANCE * math.hypot(ax - bx, ay - by)
+
+    def _key(self, cell):
+        best = min(self.g.get(cell, INF), self.rhs.get(cell, INF))
+        start = self.start if self.start is not None else cell
+        return (best + self._heuristic(start, cell) + self.km, best)
+
+    def _push(self, cell, key):
+        self.open_keys[cell] = key
+        heapq.heappush(self.open_heap, (key, cell))
+
+    def _top(self):
+        heap = self.open_heap
+        while heap and self.open_keys.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def _update_vertex(self, cell):
+        grid = self.grid
+        if cell != self.goal:
+            # rhs(u) = min_s c(u, s) + g(s)，边的代价由被进入的格子 s 决定
+            best = INF
+            penalty, scale, g = grid.penalty, grid.scale, self.g
+            for offset, move_cost in grid.neighbor_offsets:
+                s = cell + offset
+                enter_penalty = penalty[s]
+                if enter_penalty < 0:
+                    continue
+                candidate = g.get(s, INF) + move_cost * scale[s] + enter_penalty
+                if candidate < best:
+                    best = candidate
+            if best == INF:
+                self.rhs.pop(cell, None)
+            else:
+                self.rhs[cell] = best
+        self.open_keys.pop(cell, None)
+        if self.g.get(cell, INF) != self.rhs.get(cell, INF):
+            self._push(cell, self._key(cell))
+
+    def _compute_shortest_path(self, max_expansions=None, deadline=None):
+        """扩展到起点一致为止，返回 True；预算用尽时提前返回 False"""
+        grid = self.grid
+        start = self.start
+        g, rhs = self.g, self.rhs
+        penalty, scale, offsets = grid.penalty, grid.scale, grid.neighbor_offsets
+        expansion_limit = max_expansions if max_expansions is not None else math.inf
+        expanded = 0
+        while True:
+            top = self._top()
+            if top is None:
+                break
+            start_key = self._key(start)
+            if top[0] >= start_key and rhs.get(start, INF) == g.get(start, INF):
+                break
+            if expanded >= expansion_limit or (
+                    deadline is not None and expanded % DEADLINE_CHECK_INTERVAL == 0
+                    and expanded and time.perf_counter() > deadline):
+                return False
+            expanded += 1
+            old_key, cell = heapq.heappop(self.open_heap)
+            del self.open_keys[cell]
+            self.expansions += 1
+            new_key = self._key(cell)
+            if old_key < new_key:
+                self._push(cell, new_key)
+                continue
+            g_cell, rhs_cell = g.get(cell, INF), rhs.get(cell, INF)
+            if g_cell > rhs_cell:
+                g[cell] = rhs_cell
+            else:
+                g.pop(cell, None)
+                self._update_vertex(cell)
+            if penalty[cell] < 0:
+                continue  # 不可进入的格子不能作为前驱的下一跳
+            for offset, _ in offsets:
+                u = cell + offset
+                if penalty[u] == -1.0 and not self._inside(u):
+                    continue
+                self._update_vertex(u)
+        return True
+
+    def _inside(self, cell):
+        x, y = divmod(cell, self.grid.stride)
+        return 1 <= x <= self.grid.width and 1 <= y <= self.grid.height
+
+    def _apply_changes(self):
+        """切换到最新的代价网格，对变化格子及其邻居重新计算 rhs"""
+        grid = get_cost_grid(self.terrain_rules, self.knowledge_map)
+        if grid is self.grid and not self._pending:
+            return
+        self.grid = grid
+        if not self._pending:
+            return
+        self.repairs += 1
+        touched = set()
+        for cell in self._pending:
+            touched.add(cell)
+            for offset, _ in grid.neighbor_offsets:
+                touched.add(cell + offset)
+        self._pending.clear()
+        for cell in touched:
+            if self._inside(cell):
+                self._update_vertex(cell)
+
+    def _extract_path(self):
+        grid = self.grid
+        cell = self.start
+        if self.g.get(cell, INF) == INF:
+            return None
+        path = [grid.node(cell)]
+        g = self.g
+        penalty, scale, offsets = grid.penalty, grid.scale, grid.neighbor_offsets
+        while cell != self.goal:
+            best, best_cell = INF, None
+            for offset, move_cost in offsets:
+                s = cell + offset
+                if penalty[s] < 0:
+                    continue
+                candidate = g.get(s, INF) + move_cost * scale[s] + penalty[s]
+                if candidate < best:
+                    best, best_cell = candidate, s
+            if best_cell is None or len(path) > grid.size:
+                return None
+            cell = best_cell
+            path.append(grid.node(cell))
+        return path
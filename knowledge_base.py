@@ -3,22 +3,57 @@
 """
 定义共享知识地图模块
 """
+import threading
+from collections import deque, namedtuple
+from functools import lru_cache
+from multiprocessing import shared_memory
 import numpy as np
-from config import TERRAIN_TYPES, TERRAIN_COLORS
+from config import TERRAIN_TYPES, TERRAIN_COLORS, UNKNOWN_TERRAIN_ID, MAP_CONFIG
+from terrain_storage import allocate_terrain
+from map_snapshot import KnowledgeSnapshot
+
+@lru_cache(maxsize=None)
+def disc_mask(radius: int) -> np.ndarray:
+    """(2r+1) x (2r+1) 的圆盘掩码，中心为 (r, r)，满足 dx² + dy² <= r² 的格子为 True (只读，勿修改)"""
+    offsets = np.arange(-radius, radius + 1)
+    mask = offsets[:, None] ** 2 + offsets[None, :] ** 2 <= radius ** 2
+    mask.setflags(write=False)
+    return mask
+
+# 一次真正的地图变化：version 为提交后的地图版本，xs/ys/values 为变化格子的坐标与新地形 ID (NumPy 数组)
+KnowledgeDelta = namedtuple('KnowledgeDelta', ['version', 'xs', 'ys', 'values'])
 
 class SharedKnowledgeMap:
     """
     一个所有智能体共享的、动态更新的地图知识库。
     """
     # --- 使用这个新的 __init__ 方法 ---
-    def __init__(self, width, height):
+    def __init__(self, width, height, terrain=None):
         self.width = width
         self.height = height
         
-        # -1 代表未知地形
+        # UNKNOWN_TERRAIN_ID (255) 代表未知地形，地形以 uint8 存储
         self.terrain_types = TERRAIN_TYPES.copy()
-        self.terrain_types['unknown'] = -1
-        self.terrain = np.full((width, height), self.terrain_types['unknown'], dtype=int)
+        self.terrain_types['unknown'] = UNKNOWN_TERRAIN_ID
+        # terrain 可由调用方提供 (如挂接共享内存)，否则新建一张全未知的地图
+        if terrain is None:
+            terrain = allocate_terrain(width, height, self.terrain_types['unknown'], MAP_CONFIG['terrain_memmap_dir'])
+        self.terrain = terrain
+        # 地图版本号：每次有格子真正发生变化时递增，规划器与缓存据此判断是否需要重算
+        self.version = 0
+        # 已知 (非 unknown) 格子数，随每次变化增量维护
+        self.known_cells = int(np.count_nonzero(np.asarray(self.terrain) != self.terrain_types['unknown']))
+        # 变化流：最近的 KnowledgeDelta，容量有限；订阅者记住自己处理到的版本，用 changes_since() 只取增量
+        self._deltas = deque(maxlen=MAP_CONFIG['knowledge_delta_history'])
+        # 当前版本的只读快照 (瓦片级写时复制)，供其他线程无锁读取一致的地图
+        self._snapshot = KnowledgeSnapshot.from_terrain(self.version, self.terrain, self.terrain_types,
+                                                        MAP_CONFIG['snapshot_tile_size'])
+        # 保护 version / known_cells / 变化流 / 快照 四者同步更新
+        self._delta_lock = threading.Lock()
+        # 变化监听器：callback(xs, ys)，传入本次真正发生变化的格子坐标
+        self._change_listeners = []
+        # share_terrain() 之后 terrain 位于这块共享内存中，供规划进程零拷贝读取
+        self._shared_memory = None
         
         # --- 核心修复：将颜色值归一化到 0-1 范围 ---
         self.color_map = {}
@@ -37,11 +72,138 @@ class SharedKnowledgeMap:
         # --- 修改结束 ---
 
     def bulk_update(self, map_fragment: dict):
-        """用一个地图碎片批量更新知识库"""
-        for (x, y), terrain_id in map_fragment.items():
-            if 0 <= x < self.width and 0 <= y < self.height:
-                if self.terrain[x, y] == self.terrain_types['unknown']:
-                    self.terrain[x, y] = terrain_id
+        """用一个地图碎片 {(x, y): terrain_id} 批量更新知识库，返回 (新揭示格子数, 变化区域)"""
+        if not map_fragment:
+            return 0, None
+        xs, ys = np.array(list(map_fragment.keys())).T
+        values = np.fromiter(map_fragment.values(), dtype=self.terrain.dtype, count=len(map_fragment))
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        xs, ys, values = xs[inside], ys[inside], values[inside]
+        unknown = self.terrain[xs, ys] == self.terrain_types['unknown']
+        xs, ys = xs[unknown], ys[unknown]
+        self.terrain[xs, ys] = values[unknown]
+        return self._commit_changes(xs, ys)
+
+    def apply_fragment(self, origin, values: np.ndarray, mask: np.ndarray = None):
+        """
+        把以 origin=(x0, y0) 为左上角的矩形地形块 values 写入知识库，只更新 mask 为 True 且仍未知的格子。
+        整块用一次带掩码的 NumPy 赋值完成；超出地图的部分被裁掉。
+        返回 (新揭示格子数, 变化区域 (x_min, y_min, x_max, y_max) 或 None)。
+        """
+        x0, y0 = origin
+        w, h = values.shape
+        # 裁剪到地图范围内
+        cx0, cy0 = max(x0, 0), max(y0, 0)
+        cx1, cy1 = min(x0 + w, self.width), min(y0 + h, self.height)
+        if cx0 >= cx1 or cy0 >= cy1:
+            return 0, None
+        local = (slice(cx0 - x0, cx1 - x0), slice(cy0 - y0, cy1 - y0))
+        window = self.terrain[cx0:cx1, cy0:cy1]
+        new = window == self.terrain_types['unknown']
+        if mask is not None:
+            new &= mask[local]
+        window[new] = values[local][new]
+        xs, ys = np.nonzero(new)
+        return self._commit_changes(xs + cx0, ys + cy0)
+
+    def reveal_disc(self, source_terrain: np.ndarray, center, radius: int):
+        """从真实地形 source_terrain 揭示以 center 为圆心、radius 为半径的圆盘，返回值同 apply_fragment"""
+        cx, cy = int(center[0]), int(center[1])
+        x0, y0 = max(cx - radius, 0), max(cy - radius, 0)
+        x1, y1 = min(cx + radius + 1, self.width), min(cy + radius + 1, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return 0, None
+        mask = disc_mask(radius)[x0 - (cx - radius):x1 - (cx - radius), y0 - (cy - radius):y1 - (cy - radius)]
+        return self.apply_fragment((x0, y0), source_terrain[x0:x1, y0:y1], mask)
+
+    def disc_has_unknown(self, center, radius: int) -> bool:
+        """以 center 为圆心、radius 为半径的圆盘内是否还有未知格子 (即 reveal_disc 是否可能揭示新地形)"""
+        cx, cy = int(center[0]), int(center[1])
+        x0, y0 = max(cx - radius, 0), max(cy - radius, 0)
+        x1, y1 = min(cx + radius + 1, self.width), min(cy + radius + 1, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return False
+        mask = disc_mask(radius)[x0 - (cx - radius):x1 - (cx - radius), y0 - (cy - radius):y1 - (cy - radius)]
+        return bool(np.any(mask & (self.terrain[x0:x1, y0:y1] == self.terrain_types['unknown'])))
+
+    def _commit_changes(self, xs, ys):
+        """真正有格子变化时递增版本号并通知监听器，返回 (变化格子数, 变化区域)"""
+        if len(xs) == 0:
+            return 0, None
+        values = self.terrain[xs, ys]
+        # 只有写入方修改 terrain，因此可以在锁外复制被改动的瓦片
+        snapshot = self._snapshot.with_changes(self.version + 1, self.terrain, xs, ys)
+        with self._delta_lock:
+            self.version += 1
+            self.known_cells += len(xs)
+            self._deltas.append(KnowledgeDelta(self.version, xs, ys, values))
+            self._snapshot = snapshot
+        bounds = (int(xs.min()), int(ys.min()), int(xs.max()), int(ys.max()))
+        changed_xs, changed_ys = xs.tolist(), ys.tolist()
+        for listener in self._change_listeners:
+            listener(changed_xs, changed_ys, bounds)
+        return len(changed_xs), bounds
+
+    def snapshot(self) -> KnowledgeSnapshot:
+        """当前版本的不可变快照；读取方持有快照期间，写入方的后续更新不会影响它"""
+        snapshot = self._snapshot
+        if snapshot.version == self.version:
+            return snapshot
+        with self._delta_lock:
+            if self._snapshot.version != self.version:
+                # 版本号被外部直接改写 (规划进程随协调器同步版本、地形经共享内存更新)，整张重建
+                self._snapshot = KnowledgeSnapshot.from_terrain(self.version, self.terrain, self.terrain_types,
+                                                                MAP_CONFIG['snapshot_tile_size'])
+            return self._snapshot
+
+    def changes_since(self, version):
+        """
+        返回版本号大于 version 的所有 KnowledgeDelta (按版本升序)，version 已是最新时返回空列表。
+        所需的变化已被挤出有限的历史 (或 version 不属于本地图) 时返回 None，调用方应整张重读 terrain。
+        """
+        with self._delta_lock:
+            if version == self.version:
+                return []
+            if version is None or version > self.version or not self._deltas or self._deltas[0].version > version + 1:
+                return None
+            return [delta for delta in self._deltas if delta.version > version]
+
+    def share_terrain(self) -> str:
+        """把 terrain 移入 multiprocessing 共享内存并返回其名称；之后的更新直接写入共享内存"""
+        if self._shared_memory is None:
+            shm = shared_memory.SharedMemory(create=True, size=max(self.terrain.nbytes, 1))
+            shared = np.ndarray(self.terrain.shape, dtype=self.terrain.dtype, buffer=shm.buf)
+            shared[:] = self.terrain
+            self.terrain = shared
+            self._shared_memory = shm
+        return self._shared_memory.name
+
+    def release_shared_terrain(self):
+        """把 terrain 复制回普通数组并释放共享内存"""
+        if self._shared_memory is None:
+            return
+        self.terrain = self.terrain.copy()
+        self._shared_memory.close()
+        self._shared_memory.unlink()
+        self._shared_memory = None
+
+    @classmethod
+    def attach_shared(cls, name: str, width, height, dtype):
+        """
+        在规划进程中挂接 share_terrain() 创建的共享地形，返回 (知识地图, 共享内存对象)。
+        调用方需持有共享内存对象；规划进程只读不写，由创建方 (协调器) 负责释放。
+        """
+        shm = shared_memory.SharedMemory(name=name)
+        knowledge_map = cls(width, height, terrain=np.ndarray((width, height), dtype=dtype, buffer=shm.buf))
+        return knowledge_map, shm
+
+    def add_change_listener(self, callback):
+        """注册变化监听器，每次真正改变格子后以 (xs, ys, 变化区域 (x_min, y_min, x_max, y_max)) 调用"""
+        self._change_listeners.append(callback)
+
+    def remove_change_listener(self, callback):
+        if callback in self._change_listeners:
+            self._change_listeners.remove(callback)
 
     def get_terrain(self, x, y):
         """从知识库中获取地形名称"""
@@ -0,0 +1,173 @@
+# landmarks.py
+# -*- coding: utf-8 -*-
+"""
+路标 (ALT) 启发式模块
+对每个能力配置在知识地图上选取 K 个路标，预先计算所有格子到/从每个路标的最短代价，
+A* 搜索时用三角不等式 d(v, t) >= d(L, t) - d(L, v) 与 d(v, t) >= d(v, L) - d(t, L)
+得到比欧氏距离紧得多的下界：绕行已知河流、山地的代价与已知地形的惩罚都会计入启发式，
+A* 不再先把整片已知的廉价区域扩展一遍。
+
+距离表建立在建表时知识地图的 "乐观" 代价网格上：已知格子按真实代价，未知格子按任何地形可能的最低代价 (道路)。
+知识地图只会把未知格揭示为某种地形，揭示后的代价不会低于这个最低代价，已知格子也不再改变，
+因此真实代价处处不低于建表代价。在代价更低的图上 d'(L, t) - d'(L, v) <= d'(v, t) <= d(v, t)，
+两项三角不等式下界始终可采纳且一致，A* 仍返回最优路径；揭示只会让下界变松 (扩展更多节点)。
+变化的格子 (按知识地图的变化流累计) 达到 refresh_cells 个时重建距离表以重新收紧下界；
+若变化流中出现建表时已知的格子 (已知地形被改写，真实代价可能变低)，立即重建。
+
+建表是 2K 次全图 Dijkstra，在首次查询时同步执行、不计入每帧规划预算，耗时随地图面积增长
+(100x100 上每个能力配置约 0.3~0.5 秒，规划进程池的每个工作进程各建一份)；
+因此 PLANNING_CONFIG['landmark_count'] 默认为 0，只在地图较小、查询很多的场景中开启。
+"""
+import heapq
+from collections import OrderedDict
+import numpy as np
+from cost_grid import CostGrid, compile_cost_grid, ROAD_COST_FACTOR
+
+INF = float('inf')
+# 每个能力配置缓存的终点启发式表数量
+HEURISTIC_TABLE_CACHE_SIZE = 16
+
+
+class Landmarks:
+    def __init__(self, terrain_rules: dict, knowledge_map, count: int, refresh_cells: int):
+        self.terrain_rules = terrain_rules
+        self.knowledge_map = knowledge_map
+        self.count = count
+        self.refresh_cells = refresh_cells
+        self.landmarks = []       # 路标的扁平索引
+        self.forward = None       # (K, size)：从路标出发到各格子的代价 d(L, v)
+        self.backward = None      # (K, size)：各格子到路标的代价 d(v, L)
+        self._built_snapshot = None   # 建表所用的知识地图快照
+        self._seen_version = None     # 已统计过变化的知识地图版本
+        self._changed_cells = 0       # 建表以来变化的格子数
+        self._tables = OrderedDict()
+        self.rebuilds = 0
+
+    # ---------- 查询 ----------
+    def heuristic_table(self, grid, goal_node):
+        """返回以 goal_node 为终点的启发式列表 (按 grid 的扁平索引)，终点不在地图内时返回 None"""
+        if not grid.contains(goal_node):
+            return None
+        self.refresh()
+        goal = grid.index(goal_node)
+        table = self._tables.get(goal)
+        if table is not None:
+            self._tables.move_to_end(goal)
+            return table
+        forward, backward = self.forward, self.backward
+        with np.errstate(invalid='ignore'):
+            # d(v, t) >= d(L, t) - d(L, v)：L 到不了 t 或到不了 v 时该项不提供信息
+            from_goal = forward[:, goal][:, None]
+            lower_a = np.where(np.isfinite(from_goal) & np.isfinite(forward), from_goal - forward, -INF)
+            # d(v, t) >= d(v, L) - d(t, L)：v 到不了 L 而 t 能到时，建表时 v 也到不了 t，下界为 inf (最后才扩展)
+            to_goal = backward[:, goal][:, None]
+            lower_b = np.where(np.isfinite(to_goal), backward - to_goal, -INF)
+        h = np.maximum(np.maximum(lower_a.max(axis=0), lower_b.max(axis=0)), 0.0)
+        table = h.tolist()
+        self._tables[goal] = table
+        while len(self._tables) > HEURISTIC_TABLE_CACHE_SIZE:
+            self._tables.popitem(last=False)
+        return table
+
+    # ---------- 维护 ----------
+    def refresh(self):
+        """
+        首次使用、已知格子被改写，或自上次建表以来变化的格子达到 refresh_cells 个时重建距离表；
+        知识地图版本未变时直接返回
+        """
+        version = self.knowledge_map.version
+        if self._built_snapshot is not None:
+            if version == self._seen_version:
+                return
+            built = self._built_snapshot.terrain
+            unknown = self._built_snapshot.terrain_types['unknown']
+            deltas = self.knowledge_map.changes_since(self._seen_version)
+            if deltas is not None:
+                changed = sum(len(delta.xs) for delta in deltas)
+                rewritten = any(np.any(built[delta.xs, delta.ys] != unknown) for delta in deltas)
+            else:
+                # 没有变化历史 (历史被挤出，或规划进程中版本号由协调器同步)：整张比较，每个版本只做一次
+                terrain = self.knowledge_map.snapshot().terrain
+                if terrain.shape == built.shape:
+                    differs = terrain != built
+                    changed = np.count_nonzero(differs) - self._changed_cells
+                    rewritten = np.any(differs & (built != unknown))
+                else:
+                    changed, rewritten = INF, True
+            self._changed_cells += changed
+            self._seen_version = version
+            if not rewritten and self._changed_cells < self.refresh_cells:
+                return
+        self._build(self.knowledge_map.snapshot())
+
+    def _build(self, snapshot):
+        grid = _optimistic_grid(self.terrain_rules, snapshot)
+        passable = np.flatnonzero(np.asarray(grid.penalty) >= 0)
+        self.landmarks, forward, backward = [], [], []
+        if passable.size:
+            # 最远点选取：第一个路标取离地图中心最远的可通行格子，之后每次取离已选路标最远的格子
+            xs, ys = np.divmod(passable, grid.stride)
+            first = int(passable[np.argmax((xs - grid.width / 2) ** 2 + (ys - grid.height / 2) ** 2)])
+            nearest = np.full(grid.size, INF)
+            candidate = first
+            for _ in range(min(self.count, passable.size)):
+                self.landmarks.append(candidate)
+                forward.append(_dijkstra(grid, candidate, reverse=False))
+                backward.append(_dijkstra(grid, candidate, reverse=True))
+                nearest = np.minimum(nearest, forward[-1])
+                reachable = np.where(np.isfinite(nearest[passable]), nearest[passable], -1.0)
+                candidate = int(passable[np.argmax(reachable)])
+                if reachable.max() <= 0:
+                    break
+        self.forward = np.array(forward) if forward else np.full((1, grid.size), INF)
+        self.backward = np.array(backward) if backward else np.full((1, grid.size), INF)
+        self._built_snapshot = snapshot
+        self._seen_version = snapshot.version
+        self._changed_cells = 0
+        self._tables.clear()
+        self.rebuilds += 1
+
+
+def _optimistic_grid(terrain_rules, snapshot) -> CostGrid:
+    """在不可变快照上编译 (建表期间知识地图被并发更新也不受影响)，再把未知格改为最低的可能代价 (道路)"""
+    grid = compile_cost_grid(terrain_rules, snapshot)
+    unknown = np.zeros(grid.penalty_array.shape, dtype=bool)
+    unknown[1:-1, 1:-1] = np.asarray(snapshot.terrain) == snapshot.terrain_types['unknown']
+    penalty = np.where(unknown, 0.0, grid.penalty_array)
+    scale = np.where(unknown, ROAD_COST_FACTOR, grid.scale_array)
+    return CostGrid(grid.width, grid.height, penalty, scale, grid.version)
+
+
+def _dijkstra(grid, root, reverse):
+    """全图 Dijkstra，返回长度为 grid.size 的代价数组；reverse=True 时为各格子到 root 的代价"""
+    penalty, scale, offsets = grid.penalty, grid.scale, grid.neighbor_offsets
+    dist = [INF] * grid.size
+    dist[root] = 0.0
+    heap = [(0.0, root)]
+    heappop, heappush = heapq.heappop, heapq.heappush
+    while heap:
+        d, current = heappop(heap)
+        if d > dist[current]:
+            continue
+        if reverse:
+            enter_penalty = penalty[current]
+            if enter_penalty < 0:
+                continue  # 不可进入的格子只能作为起点
+            enter_cost = scale[current]
+            for offset, move_cost in offsets:
+                neighbor = current + offset
+                candidate = d + move_cost * enter_cost + enter_penalty
+                if candidate < dist[neighbor]:
+                    dist[neighbor] = candidate
+                    heappush(heap, (candidate, neighbor))
+        else:
+            for offset, move_cost in offsets:
+                neighbor = current + offset
+                neighbor_penalty = penalty[neighbor]
+                if neighbor_penalty < 0:
+                    continue
+                candidate = d + move_cost * scale[neighbor] + neighbor_penalty
+                if candidate < dist[neighbor]:
+                    dist[neighbor] = candidate
+                    heappush(heap, (candidate, neighbor))
+    return np.array(dist)
@@ -1,14 +1,15 @@
 # log_entry.py
 # -*- coding: utf-8 -*-
 
-import time
 from typing import List, Tuple, Optional
 
 class LogEntry:
     """
     用于记录单个任务或任务分段配送信息的结构化日志条目。
+    时间戳取自协调器的仿真时钟 (SimClock)，单位为仿真秒。
     """
-    def __init__(self, task, agent_id: str, strategy: str):
+    def __init__(self, task, agent_id: str, strategy: str, clock):
+        self.clock = clock
         self.task_id: str = task.task_id
         self.original_task_id: str = getattr(task, 'original_task_id', task.task_id)
         self.agent_id: str = agent_id
@@ -18,8 +19,9 @@ class LogEntry:
         self.goal_pos: Tuple[int, int] = task.goal_pos
         self.weight: float = task.weight
         self.urgency: int = task.urgency
+        self.deadline: Optional[float] = getattr(task, 'deadline', None)
         
-        self.assigned_time: float = time.time()
+        self.assigned_time: float = clock.now()
         self.completion_time: Optional[float] = None
         self.duration: Optional[float] = None
         
@@ -33,12 +35,12 @@ class LogEntry:
 
     def mark_as_completed(self):
         self.status = "completed"
-        self.completion_time = time.time()
+        self.completion_time = self.clock.now()
         self.duration = self.completion_time - self.assigned_time
 
     def mark_as_failed(self, reason: str = "Unknown"):
         self.status = "failed"
-        self.completion_time = time.time()
+        self.completion_time = self.clock.now()
         self.duration = self.completion_time - self.assigned_time
         # 添加一个失败原因的字段
         self.failure_reason = reason
@@ -58,6 +60,8 @@ class LogEntry:
             "goalPosition": self.goal_pos,
             "taskWeight": self.weight,
             "taskUrgency": self.urgency,
+            "deadline": self.deadline,
+            "onTime": None if self.deadline is None or self.completion_time is None else self.completion_time <= self.deadline,
             "pathLength": self.path_length,
             "failureReason": getattr(self, 'failure_reason', None)
         }
\ No newline at end of file
@@ -1,6 +1,7 @@
 # main.py
 # -*- coding: utf-8 -*-
 
+import argparse
 import yaml
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
@@ -14,12 +15,18 @@ def load_tasks_from_yaml(filepath: str) -> list[DeliveryTask]:
         with open(filepath, 'r', encoding='utf-8') as file:
             tasks_data = yaml.safe_load(file)
             if not tasks_data: return []
-            return [ DeliveryTask( task_id=item['id'], goal_pos=tuple(item['goal_pos']), weight=item.get('weight', 1.0), urgency=item.get('urgency', 1) ) for item in tasks_data ]
+            return [ DeliveryTask.from_config(item) for item in tasks_data ]
     except Exception as e:
         print(f"加载或解析YAML文件时出错: {e}")
         return []
 
 def main():
+    parser = argparse.ArgumentParser(description="多智能体协作配送仿真")
+    parser.add_argument('--headless', action='store_true', help="无界面快进模式：按仿真时钟以最快速度运行，结束后保存日志")
+    parser.add_argument('--max-time', type=float, default=None, help="无界面模式的仿真时长上限 (仿真秒)，默认取 SIMULATION_CONFIG")
+    parser.add_argument('--engine', choices=['tick', 'event'], default=None, help="无界面模式的引擎：逐帧或离散事件，默认取 SIMULATION_CONFIG")
+    args = parser.parse_args()
+
     print("正在初始化仿真环境...")
     real_map = Map()
     print("真实地图创建完成。")
@@ -31,6 +38,14 @@ def main():
         print(f"成功加载 {len(tasks)} 个任务到队列。")
         for task in tasks:
             coord_system.add_task(task)
+
+    if args.headless:
+        print("无界面模式运行中...")
+        summary = coord_system.run_headless(args.max_time, args.engine)
+        print(f"仿真结束: 仿真时间 {summary['sim_time']:.1f}s，共 {summary['steps']} 步，"
+              f"完成 {summary['completed_tasks']} 个任务，剩余 {summary['pending_tasks']} 个未分配 (停止原因: {summary['stop_reason']})。")
+        coord_system.stop()
+        return
     
     # 启动后台世界引擎
     coord_system.start()
@@ -22,7 +22,7 @@ def load_tasks_from_yaml(filepath: str) -> list[DeliveryTask]:
         with open(filepath, 'r', encoding='utf-8') as file:
             tasks_data = yaml.safe_load(file)
             if not tasks_data: return []
-            return [ DeliveryTask( task_id=item['id'], goal_pos=tuple(item['goal_pos']), weight=item.get('weight', 1.0), urgency=item.get('urgency', 1) ) for item in tasks_data ]
+            return [ DeliveryTask.from_config(item) for item in tasks_data ]
     except Exception as e:
         print(f"加载或解析YAML文件时出错: {e}")
         return []
@@ -0,0 +1,69 @@
+# map_cache.py
+# -*- coding: utf-8 -*-
+"""
+地图磁盘缓存模块
+把生成好的真实地图保存为紧凑的二进制文件，按 (尺寸, 种子, MAP_CONFIG, 生成器版本) 命名。
+文件布局：
+    b'MAPC' | uint32 格式版本 | uint32 头部长度 | UTF-8 JSON 头部 | 填充到 64 字节对齐 | uint8 地形 (按 [x, y] 行主序)
+JSON 头部记录尺寸、种子、生成器版本、建筑、障碍物与仓库/中转站等元数据。
+加载时地形以写时复制 (mode='c') 的 np.memmap 映射：未修改的页在多个进程间共享同一份物理页，
+对地形的写入只落在本进程的私有副本上，不会改动缓存文件。
+"""
+import hashlib
+import json
+import os
+import struct
+import numpy as np
+
+MAGIC = b'MAPC'
+FORMAT_VERSION = 1
+DATA_ALIGNMENT = 64
+_PREFIX = struct.Struct('<4sII')
+
+
+def cache_path(cache_dir: str, width, height, seed, map_config: dict, generator_version) -> str:
+    """缓存文件路径；任何影响生成结果的参数变化都会得到不同的文件名"""
+    key = json.dumps({"width": width, "height": height, "seed": seed, "generator": generator_version,
+                      "config": {k: v for k, v in sorted(map_config.items()) if k not in ('seed', 'cache_dir')}},
+                     sort_keys=True)
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, f"map_{width}x{height}_{seed}_{digest}.bin")
+
+
+def save_map(path: str, terrain: np.ndarray, metadata: dict):
+    """写入缓存文件 (先写临时文件再原子替换，并发生成同一张地图时不会读到半个文件)"""
+    if terrain.min() < 0 or terrain.max() > 255:
+        raise ValueError("地形 ID 超出 uint8 范围，无法写入地图缓存")
+    width, height = terrain.shape
+    header = json.dumps(dict(metadata, width=width, height=height), ensure_ascii=False).encode('utf-8')
+    offset = _data_offset(len(header))
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(header)))
+        f.write(header)
+        f.write(b'\0' * (offset - _PREFIX.size - len(header)))
+        f.write(np.ascontiguousarray(terrain, dtype=np.uint8).tobytes())
+    os.replace(tmp_path, path)
+
+
+def load_map(path: str):
+    """读取缓存文件，返回 (写时复制的 memmap 地形, 元数据)；文件不存在、被截断或格式不符时返回 None"""
+    try:
+        with open(path, 'rb') as f:
+            magic, version, header_len = _PREFIX.unpack(f.read(_PREFIX.size))
+            if magic != MAGIC or version != FORMAT_VERSION:
+                return None
+            metadata = json.loads(f.read(header_len).decode('utf-8'))
+        shape = (metadata['width'], metadata['height'])
+        terrain = np.memmap(path, dtype=np.uint8, mode='c', offset=_data_offset(header_len), shape=shape)
+    except (OSError, ValueError, KeyError, TypeError, struct.error):
+        return None
+    return terrain, metadata
+
+
+def _data_offset(header_len):
+    size = _PREFIX.size + header_len
+    return (size + DATA_ALIGNMENT - 1) // DATA_ALIGNMENT * DATA_ALIGNMENT
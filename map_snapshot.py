@@ -0,0 +1,77 @@
+# map_snapshot.py
+# -*- coding: utf-8 -*-
+"""
+知识地图快照模块
+快照是某一地图版本下不可变的地形视图，按 tile_size x tile_size 的瓦片存储 (所有瓦片均为只读数组)。
+写入方每次提交变化后，只复制被改动的瓦片生成新快照，其余瓦片与上一快照共享 (瓦片级写时复制)；
+读取方 (可视化线程、规划器) 拿到快照后无需加锁，看到的始终是同一版本的完整地图。
+"""
+import numpy as np
+
+
+class KnowledgeSnapshot:
+    """
+    不可变的地图视图，提供与 SharedKnowledgeMap 相同的只读接口 (terrain / terrain_types / version / get_terrain / is_road)，
+    可直接传给 compile_cost_grid、plan_path 等按地图对象工作的函数。
+    """
+    def __init__(self, version, width, height, terrain_types: dict, tile_size: int, tiles: list):
+        self.version = version
+        self.width = width
+        self.height = height
+        self.terrain_types = terrain_types
+        self.tile_size = tile_size
+        self.tiles = tiles  # tiles[tx][ty] 覆盖 x ∈ [tx*s, (tx+1)*s)、y ∈ [ty*s, (ty+1)*s)
+        self._terrain = None
+
+    @classmethod
+    def from_terrain(cls, version, terrain: np.ndarray, terrain_types: dict, tile_size: int):
+        """整张复制 terrain 建立快照"""
+        width, height = terrain.shape
+        tiles = [[_frozen(terrain[x:x + tile_size, y:y + tile_size]) for y in range(0, height, tile_size)]
+                 for x in range(0, width, tile_size)]
+        return cls(version, width, height, terrain_types, tile_size, tiles)
+
+    def with_changes(self, version, terrain: np.ndarray, xs, ys):
+        """格子 (xs, ys) 在 terrain 中被改写后的新快照：只复制这些格子所在的瓦片"""
+        size = self.tile_size
+        tiles = [list(column) for column in self.tiles]
+        touched = np.unique(np.stack([np.asarray(xs) // size, np.asarray(ys) // size]), axis=1)
+        for tx, ty in touched.T.tolist():
+            tiles[tx][ty] = _frozen(terrain[tx * size:(tx + 1) * size, ty * size:(ty + 1) * size])
+        return KnowledgeSnapshot(version, self.width, self.height, self.terrain_types, size, tiles)
+
+    @property
+    def terrain(self) -> np.ndarray:
+        """拼接后的 (width, height) 只读地形数组，首次访问时生成"""
+        if self._terrain is None:
+            size = self.tile_size
+            terrain = np.empty((self.width, self.height), dtype=self.tiles[0][0].dtype)
+            for tx, column in enumerate(self.tiles):
+                for ty, tile in enumerate(column):
+                    terrain[tx * size:tx * size + tile.shape[0], ty * size:ty * size + tile.shape[1]] = tile
+            terrain.setflags(write=False)
+            self._terrain = terrain
+        return self._terrain
+
+    def terrain_id(self, x, y):
+        """(x, y) 处的地形 ID，越界返回 None"""
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.tiles[x // self.tile_size][y // self.tile_size][x % self.tile_size, y % self.tile_size]
+        return None
+
+    def get_terrain(self, x, y):
+        terrain_type_id = self.terrain_id(int(round(x)), int(round(y)))
+        if terrain_type_id is not None:
+            for name, tid in self.terrain_types.items():
+                if tid == terrain_type_id:
+                    return name
+        return 'unknown'
+
+    def is_road(self, x, y):
+        return self.terrain_id(int(round(x)), int(round(y))) == self.terrain_types['road']
+
+
+def _frozen(block: np.ndarray) -> np.ndarray:
+    tile = np.array(block)
+    tile.setflags(write=False)
+    return tile
@@ -7,24 +7,80 @@
 
 import numpy as np
 import random
-import noise
-from path_planning import a_star_planning
+from terrain_noise import permutation, perlin1, fbm2
+from cost_grid import compile_cost_grid
+from road_builder import build_road_skeleton
+from map_cache import cache_path, save_map, load_map
+from terrain_storage import allocate_terrain
 from config import TERRAIN_TYPES, MAP_CONFIG
 
+# 生成器版本：同一种子生成的地图有任何变化时都要递增，旧的地图缓存随之失效
+#   4: 建筑集群中心按 argwhere 的 (x, y) 读取 (此前当作 (y, x)，大部分集群落空)，同一种子的建筑明显增多；
+#      道路骨架改为共享代价场 + 最小生成树
+GENERATOR_VERSION = 4
+
 class Map:
-    def __init__(self, width=MAP_CONFIG['width'], height=MAP_CONFIG['height']):
+    def __init__(self, width=MAP_CONFIG['width'], height=MAP_CONFIG['height'], seed=MAP_CONFIG['seed'],
+                 cache_dir=MAP_CONFIG['cache_dir']):
         self.width = width
         self.height = height
         self.obstacles = []
         self.buildings = []
         self.warehouse = None
         self.relay_station = None
-        self.terrain = np.full((width, height), TERRAIN_TYPES['normal'], dtype=int)
+        self.terrain = allocate_terrain(width, height, TERRAIN_TYPES['normal'], MAP_CONFIG['terrain_memmap_dir'])
         self.terrain_types = TERRAIN_TYPES
+        self.version = 0 # 地形每次被修改后递增，规划器据此复用编译好的代价网格
+        # 唯一的随机源：同一个种子生成同一张地图 (噪声排列表也由它派生)
+        self.seed = seed if seed is not None else random.randrange(2 ** 31)
+        self.rng = random.Random(self.seed)
+        # 宏观地貌按 100x100 设计，大地图上按比例放大
+        self.scale_x = width / 100.0
+        self.scale_y = height / 100.0
+
+        # 指定了种子时优先从磁盘缓存加载 (地形以写时复制的内存映射打开，可直接修改)，未命中则生成后写入缓存
+        path = None
+        if seed is not None and cache_dir:
+            path = cache_path(cache_dir, width, height, seed, MAP_CONFIG, GENERATOR_VERSION)
+            if self._load_from_cache(path):
+                print(f"已从缓存加载地图: {path}")
+                return
         
-        print("正在生成最终演示版地图...")
+        print(f"正在生成最终演示版地图 (种子 {self.seed})...")
         self._generate_final_demo_map()
         print("最终演示版地图生成完毕。")
+        if path:
+            self._save_to_cache(path)
+
+    def _save_to_cache(self, path):
+        metadata = {"seed": self.seed, "generator_version": GENERATOR_VERSION, "version": self.version,
+                    "buildings": self.buildings, "obstacles": self.obstacles,
+                    "warehouse": self.warehouse, "relay_station": self.relay_station}
+        try:
+            save_map(path, self.terrain, metadata)
+        except (OSError, ValueError) as e:
+            print(f"写入地图缓存时出错: {e}")
+
+    def _load_from_cache(self, path) -> bool:
+        loaded = load_map(path)
+        if loaded is None:
+            return False
+        terrain, metadata = loaded
+        if (metadata.get('generator_version') != GENERATOR_VERSION or metadata.get('seed') != self.seed
+                or terrain.shape != (self.width, self.height)):
+            return False
+        self.terrain = terrain
+        self.version = metadata['version']
+        self.buildings = [tuple(b) for b in metadata['buildings']]
+        self.obstacles = [tuple(o) for o in metadata['obstacles']]
+        self.warehouse = self._facility_from_json(metadata['warehouse'])
+        self.relay_station = self._facility_from_json(metadata['relay_station'])
+        return True
+
+    @staticmethod
+    def _facility_from_json(facility):
+        # JSON 把元组存成了列表，还原为生成时的结构
+        return dict(facility, rect=tuple(facility['rect']), center=tuple(facility['center']))
 
     def _generate_final_demo_map(self):
         """混合生成策略，确保关键地貌存在"""
@@ -35,7 +91,7 @@ class Map:
         self._generate_warehouse()
         self._generate_relay_station()
         
-        # 3. 使用A*规划并建造智能主干道
+        # 3. 在共享代价场上求城市节点的最小生成树，建造主干道
         self._generate_smart_roads()
         
         # 4. 在道路附近生成城市建筑集群
@@ -44,48 +100,51 @@ class Map:
         # 5. 生成随机障碍物
         self._generate_obstacles()
 
+    def _scaled_rect(self, x, y, w, h):
+        """把按 100x100 设计的矩形换算到当前地图尺寸"""
+        sx, sy = self.scale_x, self.scale_y
+        return (int(x * sx), int(y * sy), max(1, int(w * sx)), max(1, int(h * sy)))
+
     def _carve_macro_features(self):
         """手动定义并用噪声填充宏观地貌"""
         print("雕刻宏观地貌：大山、大河、大湖...")
-        seed = random.randint(0, 100)
+        feature_scale = (self.scale_x + self.scale_y) / 2
         
         # --- 1. 创建右上角的雄伟山脉 ---
-        mountain_rect = (60, 60, 40, 40) # x, y, w, h
+        mountain_rect = self._scaled_rect(60, 60, 40, 40) # x, y, w, h
         self._fill_area_with_noisy_terrain(mountain_rect, 
                                            [self.terrain_types['hilly'], self.terrain_types['steep']],
-                                           scale=30.0, seed=seed)
+                                           scale=30.0 * feature_scale, perm=permutation(self.rng.randrange(2 ** 32)))
 
         # --- 2. 创建左上角的大湖 ---
-        lake_rect = (10, 60, 40, 30)
+        lake_rect = self._scaled_rect(10, 60, 40, 30)
         self._fill_area_with_noisy_terrain(lake_rect, 
                                            [self.terrain_types['water'], self.terrain_types['normal']], # 用平原做湖岸
-                                           scale=20.0, seed=seed+1)
+                                           scale=20.0 * feature_scale, perm=permutation(self.rng.randrange(2 ** 32)))
 
         # --- 3. 开凿一条贯穿南北的大河 ---
-        river_x = 62
-        for y in range(self.height):
-            # 用噪声给河道增加一点随机宽度
-            wobble = int(noise.pnoise1(y / 15.0, base=seed+2) * 3)
-            river_width = random.randint(2, 4) + wobble
-            for i in range(river_width):
-                if 0 <= river_x + i < self.width:
-                    self.terrain[river_x + i, y] = self.terrain_types['water']
-
-    def _fill_area_with_noisy_terrain(self, rect, terrain_ids, scale, seed):
-        """一个辅助函数，用噪声在指定矩形区域内填充地形"""
+        # 每一行的河宽 = 随机基础宽度 + 噪声摆动，整条河一次性写入
+        river_x = int(62 * self.scale_x)
+        ys = np.arange(self.height)
+        wobble = (perlin1(ys / (15.0 * self.scale_y), permutation(self.rng.randrange(2 ** 32))) * 3).astype(int)
+        base_width = np.random.default_rng(self.rng.randrange(2 ** 32)).integers(2, 5, size=self.height)
+        river_width = (base_width + wobble) * max(1, int(round(self.scale_x)))
+        xs = np.arange(self.width)[:, None]
+        self.terrain[(xs >= river_x) & (xs < river_x + river_width[None, :])] = self.terrain_types['water']
+
+    def _fill_area_with_noisy_terrain(self, rect, terrain_ids, scale, perm):
+        """一个辅助函数，用噪声在指定矩形区域内填充地形 (整块矩形一次性计算)"""
         x_start, y_start, w, h = rect
-        octaves = 4; persistence = 0.5; lacunarity = 2.0
-        
-        for x in range(x_start, x_start + w):
-            for y in range(y_start, y_start + h):
-                if 0 <= x < self.width and 0 <= y < self.height:
-                    noise_value = noise.pnoise2(x / scale, y / scale, octaves=octaves,
-                                                persistence=persistence, lacunarity=lacunarity, base=seed)
-                    # 根据噪声值选择地形
-                    # 将 -1 到 1 的噪声映射到 terrain_ids 的索引
-                    t_index = int((noise_value + 1) / 2 * len(terrain_ids))
-                    t_index = min(t_index, len(terrain_ids) - 1) # 确保索引不越界
-                    self.terrain[x, y] = terrain_ids[t_index]
+        x0, x1 = max(x_start, 0), min(x_start + w, self.width)
+        y0, y1 = max(y_start, 0), min(y_start + h, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        xs = np.arange(x0, x1)[:, None] / scale
+        ys = np.arange(y0, y1)[None, :] / scale
+        noise_value = fbm2(xs, ys, perm, octaves=4, persistence=0.5, lacunarity=2.0)
+        # 根据噪声值选择地形：将 -1 到 1 的噪声映射到 terrain_ids 的索引
+        t_index = np.clip(((noise_value + 1) / 2 * len(terrain_ids)).astype(int), 0, len(terrain_ids) - 1)
+        self.terrain[x0:x1, y0:y1] = np.asarray(terrain_ids)[t_index]
 
     def _generate_warehouse(self):
         w, h, x, y = 10, 10, 5, 5
@@ -96,55 +155,74 @@ class Map:
         self.relay_station = { "rect": (x, y, w, h), "center": (x + w / 2, y + h / 2), "color": "#00FFFF" }
 
     def _generate_smart_roads(self):
-        print("使用A*规划智能道路骨架...")
-        road_planner_caps = {"terrain_rules": {"road_only": False, "can_cross_water": False, "can_climb": True, "climb_height": 10}}
+        print("用共享代价场与最小生成树规划道路骨架...")
+        road_planner_rules = {"road_only": False, "can_cross_water": False, "can_climb": True, "climb_height": 10}
         city_nodes = [tuple(map(int, self.warehouse["center"])), tuple(map(int, self.relay_station["center"])),
                       (self.width - 15, self.height - 15), (self.width - 15, 15), (15, self.height - 15)]
         
         # 强制在河流上建造一座桥
-        bridge_y = 45
-        for x in range(60, 70): self.terrain[x, bridge_y] = self.terrain_types['road']
-        city_nodes.append((65, bridge_y)) # 将桥的中心也作为一个关键节点
-
-        for i in range(len(city_nodes)):
-            for j in range(i + 1, len(city_nodes)):
-                path, _ = a_star_planning(road_planner_caps, self, city_nodes[i], city_nodes[j])
-                if path:
-                    for x, y in path:
-                        if self.terrain[x, y] != self.terrain_types['water']:
-                            self.terrain[x, y] = self.terrain_types['road']
+        bridge_y = int(45 * self.scale_y)
+        bridge_x0, bridge_x1 = int(60 * self.scale_x), int(70 * self.scale_x)
+        self.terrain[bridge_x0:bridge_x1, bridge_y] = self.terrain_types['road']
+        city_nodes.append(((bridge_x0 + bridge_x1) // 2, bridge_y)) # 将桥的中心也作为一个关键节点
+        city_nodes.extend(self._random_city_nodes(MAP_CONFIG['extra_city_nodes']))
+        self.version += 1
+
+        # 一次多源搜索连接所有节点，开销与节点数量基本无关
+        grid = compile_cost_grid(road_planner_rules, self)
+        for path in build_road_skeleton(grid, city_nodes):
+            xs, ys = np.array(path).T
+            on_land = self.terrain[xs, ys] != self.terrain_types['water']
+            self.terrain[xs[on_land], ys[on_land]] = self.terrain_types['road']
+        self.version += 1
         
         for facility in [self.warehouse, self.relay_station]:
-            rect = facility['rect']
-            for i in range(rect[0], rect[0] + rect[2]):
-                for j in range(rect[1], rect[1] + rect[3]):
-                    self.terrain[i,j] = self.terrain_types['road']
+            x, y, w, h = facility['rect']
+            self.terrain[x:x + w, y:y + h] = self.terrain_types['road']
+        self.version += 1
+
+    def _random_city_nodes(self, count):
+        """在非水域格子中随机选取额外的城市节点"""
+        if count <= 0:
+            return []
+        land = np.argwhere(self.terrain != self.terrain_types['water'])
+        picks = self.rng.sample(range(len(land)), min(count, len(land)))
+        return [tuple(map(int, land[i])) for i in picks]
 
     def _generate_building_clusters(self):
         print("生成建筑集群...")
-        num_clusters = 30
+        # 集群数量随地图面积增长，集群半径随边长增长
+        num_clusters = int(round(30 * self.scale_x * self.scale_y))
+        cluster_radius = int(round(15 * (self.scale_x + self.scale_y) / 2))
         road_coords = np.argwhere(self.terrain == self.terrain_types['road'])
         if len(road_coords) == 0: return
         self.buildings = []
+        # 占用栅格：已放置建筑覆盖的格子，重叠检测只看候选矩形本身，与已有建筑数量无关
+        occupied = np.zeros((self.width, self.height), dtype=bool)
+        is_road = self.terrain == self.terrain_types['road']
+        rng = self.rng
         for _ in range(num_clusters):
-            center_y, center_x = random.choice(road_coords)
-            if self.terrain[center_x, center_y] != self.terrain_types['road']: continue
-            num_buildings = random.randint(5, 15); cluster_radius = 15
+            # terrain 按 [x, y] 索引，argwhere 的每一行就是 (x, y)
+            center_x, center_y = road_coords[rng.randrange(len(road_coords))]
+            num_buildings = rng.randint(5, 15)
             for _ in range(num_buildings):
-                dx, dy = random.randint(-cluster_radius, cluster_radius), random.randint(-cluster_radius, cluster_radius)
-                bx, by = center_x + dx, center_y + dy; w, h = random.randint(2, 4), random.randint(2, 4)
+                dx, dy = rng.randint(-cluster_radius, cluster_radius), rng.randint(-cluster_radius, cluster_radius)
+                bx, by = center_x + dx, center_y + dy; w, h = rng.randint(2, 4), rng.randint(2, 4)
                 if 0 <= bx < self.width - w and 0 <= by < self.height - h:
-                    is_overlapping = any(bx < obx + obw and bx + w > obx and by < oby + obh and by + h > oby for obx, oby, obw, obh in self.buildings)
-                    is_on_road = np.any(self.terrain[bx:bx+w, by:by+h] == self.terrain_types['road'])
-                    if not is_overlapping and not is_on_road:
-                        self.buildings.append((bx, by, w, h))
-                        self.terrain[bx:bx+w, by:by+h] = self.terrain_types['building']
+                    if not occupied[bx:bx+w, by:by+h].any() and not is_road[bx:bx+w, by:by+h].any():
+                        self.buildings.append((int(bx), int(by), w, h))
+                        occupied[bx:bx+w, by:by+h] = True
+        self.terrain[occupied] = self.terrain_types['building']
+        self.version += 1
     
     def _generate_obstacles(self):
-        for _ in range(random.randint(MAP_CONFIG['min_obstacles'], MAP_CONFIG['max_obstacles'])):
-            x, y = random.randint(0, self.width - 1), random.randint(0, self.height - 1)
-            if self.terrain[x, y] == self.terrain_types['normal']:
-                self.obstacles.append((x, y, random.uniform(0.5, 2.0)))
+        rng = np.random.default_rng(self.rng.randrange(2 ** 32))
+        count = int(round(self.rng.randint(MAP_CONFIG['min_obstacles'], MAP_CONFIG['max_obstacles']) * self.scale_x * self.scale_y))
+        xs = rng.integers(0, self.width, size=count)
+        ys = rng.integers(0, self.height, size=count)
+        radii = rng.uniform(0.5, 2.0, size=count)
+        keep = self.terrain[xs, ys] == self.terrain_types['normal']
+        self.obstacles = [(int(x), int(y), float(r)) for x, y, r in zip(xs[keep], ys[keep], radii[keep])]
     
     # --- 查询方法保持不变 ---
     def is_road(self, x, y):
@@ -1,17 +1,32 @@
 # multi_agent_coordination.py
 # -*- coding: utf-8 -*-
 
+import heapq
 import threading
 import time
-import queue
 import math
 import numpy as np
 from typing import Optional
 from delivery_task import DeliveryTask
-from config import VEHICLE_CONFIG
+from config import VEHICLE_CONFIG, PLANNING_CONFIG, SIMULATION_CONFIG, SCHEDULING_CONFIG
 from knowledge_base import SharedKnowledgeMap
-from path_planning import a_star_planning
+from path_planning import (plan_path, heuristic, find_nearest_road, merge_bounds, PlanningBudget, PLAN_BUDGET_EXCEEDED,
+                           PLAN_UNREACHABLE)
+from path_cache import PathCache
+from cost_grid import profile_key, get_cost_grid
+from distance_field import DistanceField
+from hierarchical_planner import HierarchicalPlanner, plan_path_hierarchical
+from road_network import RoadNetwork, plan_path_on_roads
+from incremental_planner import IncrementalPlanner
+from batch_planning import plan_batch
+from landmarks import Landmarks
+from planning_pool import PlanningPool
+from path_smoothing import smooth_path, trace_cells
 from log_entry import LogEntry
+from sim_clock import SimClock
+from event_engine import EventEngine
+from assignment import solve_assignment
+from task_queue import IndexedTaskQueue
 import json
 
 class MultiAgentCoordinationSystem:
@@ -19,18 +34,58 @@ class MultiAgentCoordinationSystem:
         self.real_map = real_map_system
         self.knowledge_map = SharedKnowledgeMap(real_map_system.width, real_map_system.height)
         self.agents = {}
-        self.main_task_queue = queue.PriorityQueue() # 更换为优先队列
+        self.main_task_queue = IndexedTaskQueue()  # 带索引的优先队列，支持取消与修改优先级
         self.relay_task_pool = []
         self.warehouse_pos = tuple(map(int, self.real_map.warehouse["center"]))
         self.relay_station_pos = tuple(map(int, self.real_map.relay_station["center"]))
-        self.RELAY_PROCESSING_TIME = 2.0
+        # 仿真时钟：所有时间戳与时长 (中转处理、分配间隔、日志) 都以仿真时间计
+        self.clock = SimClock(SIMULATION_CONFIG['tick_interval'])
+        self.RELAY_PROCESSING_TIME = SIMULATION_CONFIG['relay_processing_time']
         self.RELAY_WAIT_PENALTY = -3.5  # 中转站等待时间惩罚
         self.is_running = False
+        self.coordination_thread = None
         self.completed_task_count = 0
-        self.task_counter = 0
         # --- 3. 初始化日志系统 ---
         self.delivery_log: List[LogEntry] = []
         self.log_lock = threading.Lock() # 保证日志写入的线程安全
+        # --- 路径缓存：知识地图变化时只失效受影响的条目 ---
+        self.path_cache = PathCache(PLANNING_CONFIG['path_cache_size'])
+        self.knowledge_map.add_change_listener(self.path_cache.invalidate_cells)
+        # --- 代价场：每个能力配置各一张，分别以仓库和中转站为根，按需创建 ---
+        self.distance_fields = {}
+        # --- 大地图使用分层规划 (HPA*)，每个能力配置一个实例 ---
+        self.use_hierarchical_planning = self.knowledge_map.width * self.knowledge_map.height >= PLANNING_CONFIG['hierarchical_min_cells']
+        self.hierarchical_planners = {}
+        # --- road_only 智能体在压缩后的道路图上规划，每个能力配置一个实例 ---
+        self.road_networks = {}
+        # --- 增量重规划 (D* Lite)：地图变化波及智能体剩余路径时只修复受影响的部分 ---
+        self.incremental_planners = {}  # agent_id -> IncrementalPlanner
+        self.path_repairs = 0
+        self._path_watch = {}           # agent_id -> (路径对象, 包围盒, 包围盒内各格子所属最后一段路的终点路点下标)
+        self.pending_replans = {}       # agent_id -> 登记时的路径对象；剩余路径受新地形影响，由调度阶段在预算内修复
+        self.replan_deferrals = 0
+        self.knowledge_map.add_change_listener(self._on_knowledge_change)
+        # --- 每帧规划预算：调度阶段的所有规划调用共享，耗尽后推迟到下一次调度 ---
+        self.planning_budget = PlanningBudget(PLANNING_CONFIG['tick_max_expansions'], PLANNING_CONFIG['tick_time_budget'])
+        self.planning_deferrals = 0
+        self.main_queue_deferrals = 0   # 队首任务连续被推迟的次数
+        self.relay_deferrals = 0        # 中继分配连续被推迟的次数
+        # --- 路标 (ALT) 启发式：每个能力配置一组路标距离表，按需创建 ---
+        self.landmarks = {}
+        self.search_count = 0
+        self.search_expansions = 0
+        # --- 规划进程池 (可选)：调度打分时把逐对规划分发到多个进程，地图经共享内存零拷贝共享 ---
+        self.planning_pool = None
+        if PLANNING_CONFIG['planning_workers'] > 0:
+            self.planning_pool = PlanningPool(self.knowledge_map, PLANNING_CONFIG['planning_workers'],
+                                              PLANNING_CONFIG['landmark_count'], PLANNING_CONFIG['landmark_refresh_cells'])
+        
+        # --- 时间窗调度：未到放行时刻的任务暂存，行程时间估计按知识地图版本缓存 ---
+        self.held_tasks = []            # (放行时刻, task_id, 任务) 小顶堆
+        self.eta_cache = {}             # (能力配置, 速度, 目标) -> (知识地图版本, 行程时间)
+        self._eta_refreshed_at = None
+        self.schedule_stats = {"on_time": 0, "late": 0, "rejected": 0, "escalated": 0}
+        self.rejected_tasks = []        # (task_id, 原因, 仿真时刻)
         
         print("预加载已知地图信息...")
         self._preload_known_map_info()
@@ -46,21 +101,19 @@ class MultiAgentCoordinationSystem:
                 self.agents[agent_id] = agent
 
     def _preload_known_map_info(self):
-        map_fragment = {}
-        road_id = self.real_map.terrain_types['road']
-        road_indices = np.argwhere(self.real_map.terrain == road_id)
-        for y, x in road_indices: map_fragment[(x, y)] = road_id
-        areas_to_scan = [self.warehouse_pos, self.relay_station_pos]; scan_radius = 15
-        for center_x, center_y in areas_to_scan:
-            for dx in range(-scan_radius, scan_radius + 1):
-                for dy in range(-scan_radius, scan_radius + 1):
-                    if dx**2 + dy**2 <= scan_radius**2:
-                        x, y = center_x + dx, center_y + dy
-                        if 0 <= x < self.real_map.width and 0 <= y < self.real_map.height:
-                             map_fragment[(x, y)] = self.real_map.terrain[x, y]
-        self.knowledge_map.bulk_update(map_fragment)
-
-    def report_map_fragment(self, map_fragment: dict): self.knowledge_map.bulk_update(map_fragment)
+        # 所有道路一次性写入 (terrain 按 [x, y] 索引，掩码与地图同形状，无需转置)
+        real_terrain = self.real_map.terrain
+        road_mask = real_terrain == self.real_map.terrain_types['road']
+        self.knowledge_map.apply_fragment((0, 0), real_terrain, road_mask)
+        scan_radius = 15
+        for center in [self.warehouse_pos, self.relay_station_pos]:
+            self.knowledge_map.reveal_disc(real_terrain, center, scan_radius)
+
+    def report_map_fragment(self, map_fragment: dict): return self.knowledge_map.bulk_update(map_fragment)
+    def report_disc_fragment(self, center, radius: int):
+        """智能体上报以 center 为圆心的探测圆盘，返回 (新揭示格子数, 变化区域)"""
+        return self.knowledge_map.reveal_disc(self.real_map.terrain, center, radius)
+
     def start(self):
         """启动协调器的后台世界引擎线程"""
         self.is_running = True
@@ -73,10 +126,27 @@ class MultiAgentCoordinationSystem:
         self.is_running = False
         if self.coordination_thread and self.coordination_thread.is_alive():
             self.coordination_thread.join()
+        if self.planning_pool is not None:
+            self.planning_pool.close()
+            self.planning_pool = None
         
         print("正在保存配送日志...")
         self.save_log_to_json()
         print("日志已保存到 delivery_log.json。")
+        stats = self.get_planning_stats()
+        print(f"路径缓存统计: {stats['path_cache']}")
+        print(f"A* 搜索统计: {stats['search']}")
+
+    def get_planning_stats(self) -> dict:
+        """规划相关的统计信息 (路径缓存命中/未命中/淘汰、增量修复次数、A* 扩展节点数等)"""
+        searches = self.search_count
+        search = {"searches": searches, "expansions": self.search_expansions,
+                  "mean_expansions": self.search_expansions / searches if searches else 0.0,
+                  "landmark_rebuilds": sum(l.rebuilds for l in self.landmarks.values())}
+        stats = {"path_cache": self.path_cache.stats(), "path_repairs": self.path_repairs,
+                 "planning_deferrals": self.planning_deferrals, "search": search}
+        stats["schedule"] = dict(self.schedule_stats, held=len(self.held_tasks))
+        return stats
 
     def save_log_to_json(self, filename="delivery_log.json"):
         """将所有日志条目写入一个JSON文件。"""
@@ -88,27 +158,89 @@ class MultiAgentCoordinationSystem:
             print(f"保存日志文件时出错: {e}")
 
     def _coordination_loop(self):
-        """世界引擎主循环，以固定的高频率更新所有对象状态"""
-        LOGIC_UPDATE_INTERVAL = 0.02  # 每 20ms 更新一次逻辑 (50 FPS)
-        last_task_dispatch_time = 0
-        TASK_DISPATCH_INTERVAL = 1.0
-
+        """世界引擎主循环 (可视化模式)：按墙钟节拍推进逻辑帧，每帧 tick_interval 秒"""
         while self.is_running:
             frame_start_time = time.time()
-            # 更新所有智能体
-            for agent in self.agents.values():
-                agent.update()
-            # 分配任务 (低频)
-            current_time = time.time()
-            if current_time - last_task_dispatch_time > TASK_DISPATCH_INTERVAL:
-                self._dispatch_relay_tasks()
-                self._process_main_queue()
-                last_task_dispatch_time = current_time
+            self.step()
             # 稳定帧率
             elapsed_time = time.time() - frame_start_time
-            sleep_time = LOGIC_UPDATE_INTERVAL - elapsed_time
+            sleep_time = self.clock.tick_interval - elapsed_time
             if sleep_time > 0:
                 time.sleep(sleep_time)
+
+    def step(self):
+        """推进一个逻辑帧：更新所有智能体，修复受新地形影响的路径，按仿真时间低频分配任务，最后推进仿真时钟"""
+        self.planning_budget.reset()
+        # 更新所有智能体
+        for agent in self.agents.values():
+            agent.update()
+        # 分配任务 (低频)；按帧数计周期，避免浮点时间累积误差
+        if self.clock.ticks % self._ticks_per(SIMULATION_CONFIG['dispatch_interval']) == 0:
+            self.dispatch()
+        elif self.pending_replans:
+            # 剩余路径受新地形影响的智能体每帧都在预算内修复，不等到下一次任务分配
+            self._process_pending_replans()
+        self.clock.advance()
+
+    def dispatch(self):
+        """
+        一次任务分配：先修复剩余路径受新地形影响的智能体、放行到时的任务、按间隔复查时间窗可行性，
+        再按 PLANNING_CONFIG['dispatch_mode'] 逐个处理队首任务，或对所有待分配任务做一轮批量指派
+        """
+        self._process_pending_replans()
+        self._release_held_tasks()
+        self._refresh_deadlines()
+        if PLANNING_CONFIG['dispatch_mode'] == 'batch':
+            self._dispatch_batch()
+        else:
+            self._dispatch_relay_tasks()
+            self._process_main_queue()
+
+    def _ticks_per(self, interval: float) -> int:
+        return max(1, round(interval / self.clock.tick_interval))
+
+    def run_headless(self, max_time: float = None, engine: str = None) -> dict:
+        """
+        无界面快进运行：不看墙钟，以 CPU 允许的最快速度推进仿真，
+        直到所有任务结束、剩余任务已无法推进 (智能体全部空闲且地图不再变化)，或仿真时间达到 max_time。
+        engine 为 'tick' (逐帧) 或 'event' (离散事件，见 EventEngine)，默认取 SIMULATION_CONFIG。
+        返回运行摘要，其中 stop_reason 为 'completed' (任务全部结束)、'stalled' (剩余任务无法推进)、
+        'max_time' (达到仿真时长上限) 或 'stopped' (被 stop() 中断)。
+        """
+        engine = SIMULATION_CONFIG['engine'] if engine is None else engine
+        if engine == 'event':
+            return EventEngine(self).run(max_time)
+        max_time = SIMULATION_CONFIG['headless_max_time'] if max_time is None else max_time
+        dispatch_ticks = self._ticks_per(SIMULATION_CONFIG['dispatch_interval'])
+        self.is_running = True
+        stalled_version = None
+        stop_reason = 'max_time'
+        while self.is_running and self.clock.now() < max_time:
+            dispatched = self.clock.ticks % dispatch_ticks == 0
+            deferrals = self.planning_deferrals
+            self.step()
+            if not dispatched or self.relay_task_pool:
+                continue  # 只在刚做完一次分配后检查
+            # 规划因预算被推迟或被截断也算有进展：之后的分配会解除预算限制完成规划，与事件引擎一致
+            attempted = self.planning_deferrals != deferrals or self.planning_budget.exceeded
+            if attempted or self.held_tasks or any(agent.state != "idle" for agent in self.agents.values()):
+                stalled_version = None
+                continue
+            if self.main_task_queue.empty():
+                stop_reason = 'completed'
+                break
+            # 所有智能体空闲而队列仍有任务：地图连续两次分配间都没有变化，说明剩余任务无法分配
+            if stalled_version == self.knowledge_map.version:
+                stop_reason = 'stalled'
+                break
+            stalled_version = self.knowledge_map.version
+        else:
+            if not self.is_running:
+                stop_reason = 'stopped'
+        self.is_running = False
+        return {"sim_time": self.clock.now(), "steps": self.clock.ticks,
+                "completed_tasks": self.completed_task_count, "pending_tasks": len(self.main_task_queue),
+                "stop_reason": stop_reason}
     
     # def update_world(self):
     #     if not self.is_running: return
@@ -117,12 +249,143 @@ class MultiAgentCoordinationSystem:
     #     self._process_main_queue()
 
     def add_task(self, task: DeliveryTask):
-    # 优先级数字越小越优先，所以用负的紧急度
-    # 我们还加入 time.time() 作为第二排序标准，确保相同紧急度的任务按先来后到排序
-        priority = -task.urgency
-        self.task_counter += 1
-        entry = (priority, self.task_counter, task) 
-        self.main_task_queue.put(entry)
+        # 未到放行时刻的任务先暂存，到时再进入队列；预计赶不上截止时刻的任务在入队前就拒绝或升级
+        release_time = task.release_time
+        if release_time is not None and release_time > self.clock.now():
+            heapq.heappush(self.held_tasks, (release_time, task.task_id, task))
+            return
+        if self._check_deadline(task):
+            self.main_task_queue.push(task, self._task_priority(task))
+
+    def _task_priority(self, task: DeliveryTask):
+        """
+        队列优先级 (越小越优先)：(是否已升级, 时间窗键, 负紧急度)。
+        时间窗键按 SCHEDULING_CONFIG['task_ordering'] 取截止时刻 (edf) 或最晚出发时刻 = 截止时刻 - 预计行程 (slack)；
+        最晚出发时刻不随仿真时间变化，只在行程估计更新时调整。无时间窗的任务为 inf，之间仍按紧急度、先来后到排序。
+        """
+        ordering = SCHEDULING_CONFIG['task_ordering']
+        deadline = task.deadline
+        if ordering == 'urgency' or task.escalated:
+            window_key = 0.0
+        elif deadline is None:
+            window_key = float('inf')
+        elif ordering == 'edf':
+            window_key = deadline
+        else:
+            window_key = deadline - self._estimate_eta(task)
+        return (0 if task.escalated else 1, window_key, -task.urgency)
+
+    def _release_held_tasks(self):
+        now = self.clock.now()
+        while self.held_tasks and self.held_tasks[0][0] <= now:
+            _, _, task = heapq.heappop(self.held_tasks)
+            self.add_task(task)
+
+    def _refresh_deadlines(self):
+        """按 eta_refresh_interval 复查队列中有时间窗的任务：重新估计行程、调整优先级，提前处理已不可行的任务"""
+        now = self.clock.now()
+        if self._eta_refreshed_at is not None and now - self._eta_refreshed_at < SCHEDULING_CONFIG['eta_refresh_interval']:
+            return
+        self._eta_refreshed_at = now
+        for task in self.main_task_queue.snapshot().tasks:
+            if task.deadline is None or task.escalated:
+                continue
+            if self._check_deadline(task):
+                self.main_task_queue.update(task.task_id, self._task_priority(task))
+            else:
+                self.main_task_queue.remove(task.task_id)
+
+    def _check_deadline(self, task: DeliveryTask) -> bool:
+        """
+        时间窗可行性快速检查：按乐观的行程估计也无法在截止时刻前送达时，
+        按 SCHEDULING_CONFIG['infeasible_policy'] 拒绝或升级。返回任务是否仍需调度。
+        """
+        if task.deadline is None or task.escalated:
+            return True
+        if self.clock.now() + self._estimate_eta(task) <= task.deadline:
+            return True
+        if SCHEDULING_CONFIG['infeasible_policy'] == 'escalate':
+            task.escalated = True
+            self.schedule_stats["escalated"] += 1
+            print(f"[调度] 任务 {task.task_id} 预计无法在 {task.deadline:.1f}s 前送达，升级为最高优先级")
+            return True
+        self.schedule_stats["rejected"] += 1
+        self.rejected_tasks.append((task.task_id, "deadline_infeasible", self.clock.now()))
+        print(f"[调度] 任务 {task.task_id} 预计无法在 {task.deadline:.1f}s 前送达，已拒绝")
+        return False
+
+    def _time_left(self, task: DeliveryTask) -> float:
+        """距截止时刻的剩余仿真时间；无时间窗或已升级的任务为 inf"""
+        if task.deadline is None or task.escalated:
+            return float('inf')
+        return task.deadline - self.clock.now()
+
+    def _estimate_eta(self, task: DeliveryTask) -> float:
+        """
+        从仓库把 task 直接送达的行程时间估计 (仿真秒)，取能承重的各类智能体中最快者，不含取货与中转；不可达时为 inf。
+        沿以仓库为根的代价场回溯路径 (无需搜索)，按 (能力配置, 速度, 目标) 缓存到知识地图变化为止。
+        未知区域按可通行估计，因此偏乐观，只用于排序和提前排除明显不可行的任务。
+        """
+        version = self.knowledge_map.version
+        goal = tuple(map(int, task.original_goal))
+        best = float('inf')
+        for agent in self.agents.values():
+            if task.weight > agent.capabilities["weight_limit"]:
+                continue
+            key = (profile_key(agent.capabilities["terrain_rules"]), agent.capabilities['speed'], goal)
+            cached = self.eta_cache.get(key)
+            if cached is None or cached[0] != version:
+                cached = self.eta_cache[key] = (version, self._warehouse_travel_time(agent, goal))
+            best = min(best, cached[1])
+        return best
+
+    def _warehouse_travel_time(self, agent, goal) -> float:
+        rules = agent.capabilities["terrain_rules"]
+        start = goal
+        if rules.get("road_only", False) and not self.knowledge_map.is_road(*goal):
+            if PLANNING_CONFIG['road_network']:
+                network = self._road_network(rules)
+                network.refresh()
+                start = network.snap(goal)  # 查最近道路索引，不做逐个搜索
+            else:
+                start = find_nearest_road(self.knowledge_map, goal)
+            if not start:
+                return float('inf')
+        # 代价场给出的是 目标 -> 仓库 的路径，反向即可通行，长度相同
+        path = self._facility_field(rules, self.warehouse_pos).path_from(start)
+        return self._travel_time(agent, path) if path else float('inf')
+
+    def _travel_time(self, agent, path) -> float:
+        """agent 沿 path 行驶所需的仿真时间，按逐帧模式下的实际移动距离计"""
+        if not path or len(path) < 2:
+            return 0.0
+        steps = np.diff(np.asarray(path, dtype=float), axis=0)
+        return float(np.hypot(steps[:, 0], steps[:, 1]).sum()) * self.clock.tick_interval / agent.distance_per_tick()
+
+    def _min_leg_time(self, agents, goal, planned: dict) -> float:
+        """planned 为 _plan_for_agents 的结果，返回其中到 goal 的最短行驶时间，没有可行路径时为 inf"""
+        times = [self._travel_time(agent, path) for agent in agents
+                 for path, _ in [planned[(agent.agent_id, goal)]] if path]
+        return min(times, default=float('inf'))
+
+    def cancel_task(self, task_id) -> bool:
+        """取消尚未分配的主线任务 (含未到放行时刻的)；已分配或不存在时返回 False"""
+        held = [entry for entry in self.held_tasks if entry[1] == task_id]
+        if held:
+            self.held_tasks.remove(held[0])
+            heapq.heapify(self.held_tasks)
+        elif self.main_task_queue.remove(task_id) is None:
+            return False
+        print(f"[任务] 任务 {task_id} 已取消")
+        return True
+
+    def update_task_urgency(self, task_id, urgency: int) -> bool:
+        """修改尚未分配的主线任务的紧急度并调整其在队列中的位置"""
+        task = self.main_task_queue.get(task_id)
+        if task is None:
+            return False
+        task.urgency = urgency
+        return self.main_task_queue.update(task_id, self._task_priority(task))
     def get_completed_task_count(self): return self.completed_task_count
     
     def report_task_completion(self, task: DeliveryTask):
@@ -139,14 +402,26 @@ class MultiAgentCoordinationSystem:
     
         print(f"[协调器] 收到 {task.task_id} 的完成报告。")
         self.completed_task_count += 1
+        if task.deadline is not None:
+            self.schedule_stats["on_time" if self.clock.now() <= task.deadline else "late"] += 1
 
-    def plan_path_for_agent(self, agent, start, end, return_cost=False):
+    def plan_path_for_agent(self, agent, start, end, return_cost=False, budgeted=True):
         """
         规划路径并返回路径、与目标的最终距离和成本。
+        budgeted=False 时不受每帧规划预算限制 (返程等必须立即得到结果的规划)。
         """
+        budget = self.planning_budget if budgeted else None
         # --- 核心修改 3: 处理新的返回值 ---
-        path, final_distance = a_star_planning(agent.capabilities, self.knowledge_map, start, end)
+        path, final_distance = self._plan_to_facility(agent.capabilities, start, end)
+        if path is None:
+            if PLANNING_CONFIG['road_network'] and agent.capabilities["terrain_rules"].get("road_only", False):
+                path, final_distance = self._plan_on_roads(agent.capabilities, start, end)
+            else:
+                path, final_distance = self._plan_cached(agent.capabilities, start, end, budget)
+        return self._score_path(agent, path, final_distance, return_cost)
 
+    def _score_path(self, agent, path, final_distance, return_cost):
+        """按送达距离阈值过滤规划结果，并计算智能体沿该路径的成本"""
         # 增加一个送达距离阈值，超过这个距离认为任务不可达
         DELIVERY_RADIUS_THRESHOLD = 5.0
 
@@ -164,54 +439,353 @@ class MultiAgentCoordinationSystem:
         return None, float('inf')
         # --- 修改结束 ---
 
+    def _plan_for_agents(self, agents, starts: dict, targets: list) -> dict:
+        """
+        批量规划：starts 为 {agent_id: 起点}，返回 {(agent_id, 终点): (path, cost)}，
+        含义与 plan_path_for_agent(..., return_cost=True) 相同。
+        同一能力配置的智能体共享查询：先查代价场与路径缓存，剩余的 (起点, 终点) 对
+        由一次批量 Dijkstra 回答并写回缓存。
+        """
+        results = {}
+        if not PLANNING_CONFIG['batch_planning']:
+            for agent in agents:
+                for target in targets:
+                    results[(agent.agent_id, target)] = self.plan_path_for_agent(
+                        agent, starts[agent.agent_id], target, return_cost=True)
+            return results
+
+        groups = {}
+        for agent in agents:
+            groups.setdefault(profile_key(agent.capabilities["terrain_rules"]), []).append(agent)
+        for key, group in groups.items():
+            capabilities = group[0].capabilities
+            road_only = capabilities["terrain_rules"].get("road_only", False)
+            planned, missing = {}, set()
+            for start in {tuple(map(int, starts[agent.agent_id])) for agent in group}:
+                for target in targets:
+                    path, final_distance = self._plan_to_facility(capabilities, start, target)
+                    if path is None and not (road_only and PLANNING_CONFIG['road_network']):
+                        cached = self.path_cache.get(PathCache.make_key(key, start, target))
+                        if cached is not None:
+                            path, final_distance = cached
+                        else:
+                            missing.add((start, target))
+                            continue
+                    elif path is None:
+                        path, final_distance = self._plan_on_roads(capabilities, start, target)
+                    planned[(start, target)] = (path, final_distance)
+            if missing:
+                sources = {start for start, _ in missing}
+                goals = {target for _, target in missing}
+                if (self.planning_pool is not None and not self.use_hierarchical_planning
+                        and len(missing) >= PLANNING_CONFIG['pool_min_pairs']):
+                    # 逐对 A* 分发到规划进程池并行执行
+                    pairs = [(start, tuple(map(int, target))) for start, target in missing]
+                    batch = self.planning_pool.plan_many(capabilities, pairs, self.planning_budget,
+                                                         PLANNING_CONFIG['call_max_expansions'])
+                    self.search_count += len(batch)
+                    self.search_expansions += sum(result.expansions for result in batch.values())
+                elif self.use_hierarchical_planning or max(len(sources), len(goals)) < PLANNING_CONFIG['batch_min_endpoints']:
+                    # 端点较少时逐对 A* 更快；大地图上全图搜索代价过高，逐对走分层规划。每个能力配置仍只算一次
+                    batch = {(start, tuple(map(int, target))): self._plan_uncached(capabilities, start, target,
+                                                                                   self.planning_budget)
+                             for start, target in missing}
+                else:
+                    batch = plan_batch(capabilities, self.knowledge_map, sources, goals,
+                                       self.planning_budget, PLANNING_CONFIG['call_max_expansions'])
+                for start, target in missing:
+                    result = batch[(start, tuple(map(int, target)))]
+                    if result.status != PLAN_BUDGET_EXCEEDED:  # 部分结果不缓存
+                        self.path_cache.put(PathCache.make_key(key, start, target),
+                                            result.path, result.final_distance, result.bounds)
+                    planned[(start, target)] = (result.path, result.final_distance)
+            for agent in group:
+                start = tuple(map(int, starts[agent.agent_id]))
+                for target in targets:
+                    path, final_distance = planned[(start, target)]
+                    results[(agent.agent_id, target)] = self._score_path(
+                        agent, list(path) if path else path, final_distance, return_cost=True)
+        return results
+
+    def _plan_to_facility(self, capabilities, start, end):
+        """
+        终点是仓库或中转站时，直接沿代价场回溯出路径 (O(路径长度))。
+        代价场中不可达时返回 (None, inf)，由调用方回退到常规规划 (保留最近点回退逻辑)。
+        """
+        goal_node = tuple(map(int, end))
+        if not PLANNING_CONFIG['facility_distance_fields'] or goal_node not in (self.warehouse_pos, self.relay_station_pos):
+            return None, float('inf')
+        rules = capabilities["terrain_rules"]
+        start_node = tuple(map(int, start))
+        if rules.get("road_only", False):
+            # 与 A* 一致：road_only 的起终点先吸附到最近的道路格
+            if not self.knowledge_map.is_road(*goal_node):
+                return None, float('inf')
+            if not self.knowledge_map.is_road(*start_node):
+                start_node = find_nearest_road(self.knowledge_map, start_node)
+                if not start_node:
+                    return None, float('inf')
+        path = self._facility_field(rules, goal_node).path_from(start_node)
+        if not path:
+            return None, float('inf')
+        return path, heuristic(path[-1], goal_node)
+
+    def _facility_field(self, rules, root) -> DistanceField:
+        key = (profile_key(rules), root)
+        field = self.distance_fields.get(key)
+        if field is None:
+            field = self.distance_fields[key] = DistanceField(rules, self.knowledge_map, root)
+        return field
+
+    def _on_knowledge_change(self, xs, ys, bounds):
+        """
+        知识地图变化回调：变化格子落在某个智能体剩余路径上或紧邻路径时，把该智能体登记到 pending_replans。
+        回调运行在揭示地形的智能体的 explore_surroundings() 里，这里只做检测，修复留给调度阶段在规划预算内完成。
+        """
+        if not PLANNING_CONFIG['incremental_replanning']:
+            return
+        change_x0, change_y0, change_x1, change_y1 = bounds
+        change_xs, change_ys = None, None
+        for agent in list(self.agents.values()):
+            vehicle = agent.vehicle
+            planner = self.incremental_planners.get(agent.agent_id)
+            if agent.state not in ("delivering", "returning") or vehicle is None or not vehicle.path:
+                if planner is not None:
+                    del self.incremental_planners[agent.agent_id]
+                self._path_watch.pop(agent.agent_id, None)
+                continue
+            if agent.capabilities["terrain_rules"].get("road_only", False):
+                continue  # 只走已知道路，新揭示的格子不会让路径变差
+            if planner is not None:
+                planner.notify(xs, ys)
+            path, (x0, y0, x1, y1), segment_end = self._watch_path(agent)
+            # 先用包围盒排除，再对落在包围盒内的变化格子查表
+            if x1 < change_x0 or x0 > change_x1 or y1 < change_y0 or y0 > change_y1:
+                continue
+            if change_xs is None:
+                change_xs, change_ys = np.asarray(xs), np.asarray(ys)
+            inside = (change_xs >= x0) & (change_xs <= x1) & (change_ys >= y0) & (change_ys <= y1)
+            index = min(vehicle.current_waypoint_index, len(path) - 1)
+            if np.any(segment_end[change_xs[inside] - x0, change_ys[inside] - y0] >= index):
+                self.pending_replans[agent.agent_id] = vehicle.path
+
+    def _watch_path(self, agent):
+        """
+        智能体当前路径的监视表，每条路径只建一次：折线经过的格子按 replan_margin 膨胀，
+        记录每个格子所属的最后一段路的终点路点下标；该下标不小于当前路点下标即仍在剩余路径上。
+        """
+        path = agent.vehicle.path
+        watch = self._path_watch.get(agent.agent_id)
+        if watch is not None and watch[0] is path:
+            return watch
+        margin = PLANNING_CONFIG['replan_margin']
+        xs, ys, ends = [], [], []
+        for end in range(len(path)):
+            # 第 end 段为 path[end-1] -> path[end]
+            for x, y in trace_cells(path[max(end - 1, 0):end + 1]):
+                xs.append(x); ys.append(y); ends.append(end)
+        xs, ys, ends = np.array(xs), np.array(ys), np.array(ends, dtype=np.int32)
+        x0, y0 = int(xs.min()) - margin, int(ys.min()) - margin
+        x1, y1 = int(xs.max()) + margin, int(ys.max()) + margin
+        segment_end = np.full((x1 - x0 + 1, y1 - y0 + 1), -1, dtype=np.int32)
+        for dx in range(-margin, margin + 1):
+            for dy in range(-margin, margin + 1):
+                np.maximum.at(segment_end, (xs + dx - x0, ys + dy - y0), ends)
+        watch = self._path_watch[agent.agent_id] = (path, (x0, y0, x1, y1), segment_end)
+        return watch
+
+    def _repair_agent_path(self, agent, index) -> str:
+        """
+        从智能体当前所在格子起用 D* Lite 修复到原路径终点的剩余路径，搜索受本帧规划预算限制。
+        返回规划状态：预算用尽时 D* Lite 保留搜索状态，下一次从停下的地方继续。
+        """
+        vehicle = agent.vehicle
+        goal = tuple(map(int, vehicle.path[-1]))
+        # 平滑路径的下一个路点可能很远，途中的格子也可能刚被揭示，因此从当前格子出发
+        current = (int(round(agent.position[0])), int(round(agent.position[1])))
+        planner = self.incremental_planners.get(agent.agent_id)
+        if planner is None or planner.goal_node != goal:
+            planner = self.incremental_planners[agent.agent_id] = IncrementalPlanner(
+                agent.capabilities["terrain_rules"], self.knowledge_map, goal)
+        limit, deadline = self.planning_budget.allowance(PLANNING_CONFIG['call_max_expansions'])
+        expansions = planner.expansions
+        repaired, status = planner.plan(current, limit, deadline)
+        self.planning_budget.charge(planner.expansions - expansions, status)
+        if repaired is not None:
+            vehicle.path = list(vehicle.path[:index]) + self.smooth_path_for_agent(agent, repaired)
+            self.path_repairs += 1
+        return status
+
+    def _process_pending_replans(self):
+        """
+        修复 pending_replans 中智能体的剩余路径：先用 D* Lite 增量修复，原终点不可达时重新规划到目标。
+        两者都受每帧规划预算限制，预算用尽时推迟到下一次，连续推迟达到上限后解除帧预算。
+        """
+        for agent_id, requested_path in list(self.pending_replans.items()):
+            agent = self.agents[agent_id]
+            vehicle = agent.vehicle
+            if agent.state not in ("delivering", "returning") or vehicle is None or vehicle.path is not requested_path:
+                del self.pending_replans[agent_id]  # 已完成、已换了任务或路径已被修复
+                continue
+            forced = self.replan_deferrals >= PLANNING_CONFIG['max_planning_deferrals']
+            if forced:
+                self.planning_budget.lift()
+            index = min(vehicle.current_waypoint_index, len(vehicle.path) - 1)
+            status = self._repair_agent_path(agent, index)
+            path = None
+            if status == PLAN_UNREACHABLE:
+                # 原终点已不可达：重新规划到目标，仍然无法到达时保持原路径
+                current = (int(round(agent.position[0])), int(round(agent.position[1])))
+                path = self.plan_path_for_agent(agent, current, vehicle.goal_pos)
+            if status == PLAN_BUDGET_EXCEEDED or (self.planning_budget.exceeded and not forced):
+                self.replan_deferrals += 1
+                self.planning_deferrals += 1
+                return
+            self.replan_deferrals = 0
+            del self.pending_replans[agent_id]
+            if path:
+                index = min(vehicle.current_waypoint_index, len(vehicle.path))
+                vehicle.path = list(vehicle.path[:index]) + self.smooth_path_for_agent(agent, path)
+                self.path_repairs += 1
+
+    def smooth_path_for_agent(self, agent, path):
+        """按智能体的能力配置对逐格路径做视线平滑，得到交给载具执行的路点列表"""
+        if not path or not PLANNING_CONFIG['path_smoothing']:
+            return path
+        return smooth_path(get_cost_grid(agent.capabilities["terrain_rules"], self.knowledge_map), path)
+
+    def _plan_on_roads(self, capabilities, start, end):
+        """road_only 智能体直接在道路图上搜索；道路图很小，不经过路径缓存"""
+        result = plan_path_on_roads(capabilities, self._road_network(capabilities["terrain_rules"]), start, end)
+        return result.path, result.final_distance
+
+    def _road_network(self, rules) -> RoadNetwork:
+        key = profile_key(rules)
+        network = self.road_networks.get(key)
+        if network is None:
+            network = self.road_networks[key] = RoadNetwork(rules, self.knowledge_map)
+        return network
+
+    def _plan_cached(self, capabilities, start, end, budget=None):
+        """带缓存的底层规划，返回 (path, final_distance)；预算耗尽的部分结果不缓存"""
+        key = PathCache.make_key(profile_key(capabilities["terrain_rules"]), start, end)
+        cached = self.path_cache.get(key)
+        if cached is not None:
+            return cached
+        result = self._plan_uncached(capabilities, start, end, budget)
+        if result.status != PLAN_BUDGET_EXCEEDED:
+            self.path_cache.put(key, result.path, result.final_distance, result.bounds)
+        return result.path, result.final_distance
+
+    def _plan_uncached(self, capabilities, start, end, budget=None):
+        """按地图规模选择规划后端；分层规划失败时回退到网格 A* (保留最近点回退逻辑)"""
+        max_expansions = PLANNING_CONFIG['call_max_expansions'] if budget else None
+        if not self.use_hierarchical_planning:
+            return self._plan_grid(capabilities, start, end, budget, max_expansions)
+        rules = capabilities["terrain_rules"]
+        key = profile_key(rules)
+        planner = self.hierarchical_planners.get(key)
+        if planner is None:
+            planner = self.hierarchical_planners[key] = HierarchicalPlanner(
+                rules, self.knowledge_map, PLANNING_CONFIG['hierarchical_cluster_size'])
+        result = plan_path_hierarchical(capabilities, self.knowledge_map, planner, start, end, budget, max_expansions)
+        if result.path or result.status == PLAN_BUDGET_EXCEEDED:
+            return result  # 预算耗尽时不再回退到网格 A*，由调用方按推迟处理
+        fallback = self._plan_grid(capabilities, start, end, budget, max_expansions)
+        fallback.bounds = merge_bounds(fallback.bounds, result.bounds)
+        return fallback
+
+    def _plan_grid(self, capabilities, start, end, budget, max_expansions):
+        """网格 A*，启用路标时使用该能力配置的 ALT 下界；累计扩展节点数供 get_planning_stats() 报告"""
+        landmarks = None
+        if PLANNING_CONFIG['landmark_count'] > 0:
+            key = profile_key(capabilities["terrain_rules"])
+            landmarks = self.landmarks.get(key)
+            if landmarks is None:
+                landmarks = self.landmarks[key] = Landmarks(
+                    capabilities["terrain_rules"], self.knowledge_map,
+                    PLANNING_CONFIG['landmark_count'], PLANNING_CONFIG['landmark_refresh_cells'])
+        result = plan_path(capabilities, self.knowledge_map, start, end, budget, max_expansions, landmarks)
+        self.search_count += 1
+        self.search_expansions += result.expansions
+        return result
+
     def _dispatch_relay_tasks(self):
         if not self.relay_task_pool: return
         idle_agents = [agent for agent in self.agents.values() if agent.state == "idle"]
         if not idle_agents: return
-        current_time = time.time()
+        current_time = self.clock.now()
         
-        for task in self.relay_task_pool[:]:
+        # 截止时刻早的先分配；无时间窗的保持到达顺序
+        for task in sorted(self.relay_task_pool, key=lambda task: float('inf') if task.deadline is None else task.deadline):
             if task.arrival_time is None:
                 task.arrival_time = current_time
                 continue
             if current_time - task.arrival_time < self.RELAY_PROCESSING_TIME:
                 continue
 
+            forced = self.relay_deferrals >= PLANNING_CONFIG['max_planning_deferrals']
+            if forced:
+                self.planning_budget.lift()
             best_agent, best_full_path, _ = self._find_best_option_for_relay(idle_agents, task)
+            if self.planning_budget.exceeded and not forced:
+                # 本帧规划预算已耗尽，结果可能不完整；已完成的查询在缓存中，下次调度继续
+                self.relay_deferrals += 1
+                self.planning_deferrals += 1
+                break
+            self.relay_deferrals = 0
             
             if best_agent and best_full_path:
-                if best_agent.assign_task(task, best_full_path):
-                    log_entry = LogEntry(task, best_agent.agent_id, "relay_leg2")
-                    log_entry.set_path(best_full_path)
-                    with self.log_lock:
-                        self.delivery_log.append(log_entry)
-                    # --- 修改结束 ---
-                    print(f"[中继分配] {best_agent.agent_id} 从当前位置出发，接取已处理好的任务 {task.task_id}")
-                    self.relay_task_pool.remove(task)
+                if self._assign_relay_leg(task, best_agent, best_full_path):
                     idle_agents.remove(best_agent)
 
+    def _assign_relay_leg(self, task, agent, path) -> bool:
+        """把已在中转站处理好的第二程任务交给 agent，成功后移出中转站任务池"""
+        if not agent.assign_task(task, path):
+            return False
+        log_entry = LogEntry(task, agent.agent_id, "relay_leg2", self.clock)
+        log_entry.set_path(path)
+        with self.log_lock:
+            self.delivery_log.append(log_entry)
+        print(f"[中继分配] {agent.agent_id} 从当前位置出发，接取已处理好的任务 {task.task_id}")
+        self.relay_task_pool.remove(task)
+        return True
+
     def _find_best_option_for_relay(self, idle_agents, task):
         best_agent, best_full_path, min_full_cost = None, None, float('inf')
-        for agent in idle_agents:
-            if task.weight <= agent.capabilities["weight_limit"]:
-                # --- 调用已修改的 plan_path_for_agent ---
-                # 它现在内部处理了送达距离检查
-                path1, cost1 = self.plan_path_for_agent(agent, agent.position, self.relay_station_pos, return_cost=True)
-                if not path1: continue
-                path2, cost2 = self.plan_path_for_agent(agent, self.relay_station_pos, task.goal_pos, return_cost=True)
-                if not path2: continue
-                total_cost = cost1 + cost2
-                if total_cost < min_full_cost:
-                    min_full_cost, best_agent, best_full_path = total_cost, agent, path1 + path2[1:]
+        candidates = [agent for agent in idle_agents if task.weight <= agent.capabilities["weight_limit"]]
+        # 一次批量规划得到所有候选智能体的两段路径 (送达距离检查已在内部处理)
+        to_relay = self._plan_for_agents(candidates, {agent.agent_id: agent.position for agent in candidates},
+                                         [self.relay_station_pos])
+        from_relay = self._plan_for_agents(candidates, {agent.agent_id: self.relay_station_pos for agent in candidates},
+                                           [task.goal_pos])
+        for agent in candidates:
+            path1, cost1 = to_relay[(agent.agent_id, self.relay_station_pos)]
+            if not path1: continue
+            path2, cost2 = from_relay[(agent.agent_id, task.goal_pos)]
+            if not path2: continue
+            total_cost = cost1 + cost2
+            if total_cost < min_full_cost:
+                min_full_cost, best_agent, best_full_path = total_cost, agent, path1 + path2[1:]
         return best_agent, best_full_path, min_full_cost
 
     def _process_main_queue(self):
         if self.main_task_queue.empty(): return
         
         # 从优先队列中查看最高优先级的任务，但不取出
-        _, _, task = self.main_task_queue.queue[0] 
+        task = self.main_task_queue.peek()
 
+        # 连续推迟达到上限后本次不再受帧预算限制 (单次上限仍然有效)，保证任务不会一直饿死
+        forced = self.main_queue_deferrals >= PLANNING_CONFIG['max_planning_deferrals']
+        if forced:
+            self.planning_budget.lift()
         decision = self._decide_delivery_strategy(task)
+        if self.planning_budget.exceeded and not forced:
+            # 本帧规划预算已耗尽，决策可能基于不完整的结果；推迟到下一次调度
+            self.main_queue_deferrals += 1
+            self.planning_deferrals += 1
+            return
+        self.main_queue_deferrals = 0
         if not decision:
             # 如果暂时无法处理，我们不把它放回队尾了
             # 因为优先队列的机制会让它下次依然被优先考虑
@@ -220,15 +794,17 @@ class MultiAgentCoordinationSystem:
             return
 
         # 决策成功，正式取出任务
-        _, _, task = self.main_task_queue.get()
-        
-        # (后续逻辑保持不变)
+        self.main_task_queue.remove(task.task_id)
+        self._execute_decision(task, decision)
+
+    def _execute_decision(self, task, decision: dict):
+        """执行一个配送决策：直接配送，或派出第一程并把第二程放入中转站任务池"""
         strategy, agent, path = decision['strategy'], decision['agent'], decision['path']
 
         if strategy == "direct":
             task.start_pos = self.warehouse_pos
             if agent.assign_task(task, path):
-                log_entry = LogEntry(task, agent.agent_id, "direct")
+                log_entry = LogEntry(task, agent.agent_id, "direct", self.clock)
                 log_entry.set_path(path)
                 with self.log_lock:
                     self.delivery_log.append(log_entry)
@@ -243,7 +819,7 @@ class MultiAgentCoordinationSystem:
                 original_task_id=task.task_id # 传递原始ID
             )
             if agent.assign_task(leg1_task, path):
-                log_entry = LogEntry(leg1_task, agent.agent_id, "relay_leg1")
+                log_entry = LogEntry(leg1_task, agent.agent_id, "relay_leg1", self.clock)
                 log_entry.set_path(path)
                 with self.log_lock:
                     self.delivery_log.append(log_entry)
@@ -253,11 +829,141 @@ class MultiAgentCoordinationSystem:
                 task_id=f"{task.task_id}_leg2", start_pos=self.relay_station_pos, 
                 is_relay_leg=True, color=task.color,
                 urgency=task.urgency, # 传递紧急度
-                original_task_id=task.task_id # 传递原始ID
+                original_task_id=task.task_id, # 传递原始ID
+                time_window=task.time_window # 按原任务的时间窗统计是否准时
             )
+            leg2_task.escalated = task.escalated
             self.relay_task_pool.append(leg2_task)
             print(f"[中继任务] {leg2_task.task_id} 已在中转站等待接力。")
 
+    def _dispatch_batch(self):
+        """
+        批量指派：所有待分配的主线任务 (按优先级至多 assignment_max_tasks 个) 与已处理好的中转任务
+        一起与全部空闲智能体构成代价矩阵，一轮最小代价指派同时分配，队首任务无法分配时不会阻塞其后的任务。
+        主线任务先经 _check_deadline 复查时间窗 (不可行的按策略拒绝或升级)；每行再附加该任务的时间窗余量代价
+        (见 _assignment_slack)，空闲智能体不够时余量小的任务先被分配，与逐个调度的 edf/slack 排序一致。
+        """
+        idle_agents = [agent for agent in self.agents.values() if agent.state == "idle"]
+        if not idle_agents: return
+        current_time = self.clock.now()
+        relay_tasks = []
+        for task in self.relay_task_pool:
+            if task.arrival_time is None:
+                task.arrival_time = current_time
+            elif current_time - task.arrival_time >= self.RELAY_PROCESSING_TIME:
+                relay_tasks.append(task)
+        main_tasks = []
+        for task in self.main_task_queue.smallest(PLANNING_CONFIG['assignment_max_tasks']):
+            escalated = task.escalated
+            if not self._check_deadline(task):
+                self.main_task_queue.remove(task.task_id)
+                continue
+            if task.escalated != escalated:
+                self.main_task_queue.update(task.task_id, self._task_priority(task))
+            main_tasks.append(task)
+        if not main_tasks and not relay_tasks: return
+
+        forced = self.main_queue_deferrals >= PLANNING_CONFIG['max_planning_deferrals']
+        if forced:
+            self.planning_budget.lift()
+        options = self._assignment_options(idle_agents, main_tasks, relay_tasks)
+        if self.planning_budget.exceeded and not forced:
+            # 本帧规划预算已耗尽，代价矩阵可能不完整；推迟到下一次调度
+            self.main_queue_deferrals += 1
+            self.planning_deferrals += 1
+            return
+        self.main_queue_deferrals = 0
+
+        tasks = main_tasks + relay_tasks
+        cost = np.full((len(tasks), len(idle_agents)), float('inf'))
+        for (row, col), (option_cost, _) in options.items():
+            cost[row, col] = option_cost
+        if SCHEDULING_CONFIG['task_ordering'] != 'urgency':
+            for row, task in enumerate(tasks):
+                cost[row] += SCHEDULING_CONFIG['assignment_slack_weight'] * self._assignment_slack(task)
+        for row, col in solve_assignment(cost):
+            task, (_, decision) = tasks[row], options[(row, col)]
+            if row < len(main_tasks):
+                self.main_task_queue.remove(task.task_id)
+                self._execute_decision(task, decision)
+            else:
+                self._assign_relay_leg(task, decision['agent'], decision['path'])
+
+    def _assignment_slack(self, task: DeliveryTask) -> float:
+        """
+        批量指派时任务的时间窗余量 (秒)，封顶 assignment_slack_horizon：edf 为距截止时刻的时间，
+        slack 再扣除从仓库出发的预计行程 (中转第二程已离开仓库，仍按距截止时刻计)；已升级的任务为 0，无时间窗的任务按封顶值计。
+        """
+        horizon = SCHEDULING_CONFIG['assignment_slack_horizon']
+        if task.escalated:
+            return 0.0
+        if task.deadline is None:
+            return horizon
+        slack = task.deadline - self.clock.now()
+        if SCHEDULING_CONFIG['task_ordering'] == 'slack' and not task.is_relay_leg:
+            slack -= self._estimate_eta(task)
+        return min(max(slack, 0.0), horizon)
+
+    def _assignment_options(self, idle_agents, main_tasks, relay_tasks) -> dict:
+        """
+        批量指派的候选配对：{(任务行, 智能体列): (代价, 决策)}，不可行的配对不出现。
+        主线任务沿用 _decide_delivery_strategy 的紧急度加权代价，对每个智能体取直接配送与中转中较便宜者
+        (没有任何智能体能完成第二程时不考虑中转)；中转第二程的代价同样除以紧急度权重，使两类任务可比。
+        """
+        goals = list(dict.fromkeys(task.original_goal for task in main_tasks))
+        relay_goals = list(dict.fromkeys(task.goal_pos for task in relay_tasks))
+        positions = {agent.agent_id: agent.position for agent in idle_agents}
+        at_warehouse = {agent.agent_id: self.warehouse_pos for agent in idle_agents}
+        at_relay = {agent.agent_id: self.relay_station_pos for agent in self.agents.values()}
+        to_warehouse = self._plan_for_agents(idle_agents, positions, [self.warehouse_pos]) if main_tasks else {}
+        to_relay = self._plan_for_agents(idle_agents, positions, [self.relay_station_pos]) if relay_tasks else {}
+        from_warehouse = self._plan_for_agents(idle_agents, at_warehouse, goals + [self.relay_station_pos]) if main_tasks else {}
+        # 第二程按所有智能体 (含忙碌的) 估算，与逐个决策一致
+        from_relay = self._plan_for_agents(list(self.agents.values()), at_relay, list(dict.fromkeys(goals + relay_goals)))
+
+        options = {}
+        for row, task in enumerate(main_tasks):
+            urgency_weight = 1 + task.urgency
+            leg2_agents = [agent for agent in self.agents.values() if task.weight <= agent.capabilities["weight_limit"]]
+            leg2_costs = [cost for agent in leg2_agents for path, cost in [from_relay[(agent.agent_id, task.original_goal)]] if path]
+            min_leg2_cost = min(leg2_costs, default=float('inf')) / urgency_weight
+            adjusted_penalty = self.RELAY_WAIT_PENALTY / (urgency_weight / 2)
+            # 有时间窗的任务只保留预计能按时送达的方案
+            time_left = leg1_time_left = self._time_left(task)
+            if time_left != float('inf'):
+                leg1_time_left = time_left - self.RELAY_PROCESSING_TIME - self._min_leg_time(leg2_agents, task.original_goal, from_relay)
+            for col, agent in enumerate(idle_agents):
+                if task.weight > agent.capabilities["weight_limit"]: continue
+                path_to_warehouse, cost_to_warehouse = to_warehouse[(agent.agent_id, self.warehouse_pos)]
+                if not path_to_warehouse: continue
+                path_to_goal, cost_to_goal = from_warehouse[(agent.agent_id, task.original_goal)]
+                path_to_relay, cost_to_relay = from_warehouse[(agent.agent_id, self.relay_station_pos)]
+                direct_cost = (cost_to_warehouse + cost_to_goal) / urgency_weight if path_to_goal else float('inf')
+                if direct_cost != float('inf') and time_left != float('inf') \
+                        and self._travel_time(agent, path_to_warehouse + path_to_goal[1:]) > time_left:
+                    direct_cost = float('inf')
+                relay_cost = float('inf')
+                if path_to_relay and min_leg2_cost != float('inf'):
+                    relay_cost = (cost_to_warehouse + cost_to_relay) / urgency_weight + min_leg2_cost + adjusted_penalty
+                    if leg1_time_left != float('inf') and self._travel_time(agent, path_to_warehouse + path_to_relay[1:]) > leg1_time_left:
+                        relay_cost = float('inf')
+                if direct_cost != float('inf') and direct_cost <= relay_cost:
+                    options[(row, col)] = (direct_cost, {"strategy": "direct", "agent": agent,
+                                                         "path": path_to_warehouse + path_to_goal[1:]})
+                elif relay_cost != float('inf'):
+                    options[(row, col)] = (relay_cost, {"strategy": "relay", "agent": agent,
+                                                        "path": path_to_warehouse + path_to_relay[1:]})
+        for offset, task in enumerate(relay_tasks):
+            row = len(main_tasks) + offset
+            for col, agent in enumerate(idle_agents):
+                if task.weight > agent.capabilities["weight_limit"]: continue
+                path1, cost1 = to_relay[(agent.agent_id, self.relay_station_pos)]
+                path2, cost2 = from_relay[(agent.agent_id, task.goal_pos)]
+                if path1 and path2:
+                    options[(row, col)] = ((cost1 + cost2) / (1 + task.urgency),
+                                           {"strategy": "relay_leg2", "agent": agent, "path": path1 + path2[1:]})
+        return options
+
     def _decide_delivery_strategy(self, task: DeliveryTask) -> Optional[dict]:
         idle_agents = [agent for agent in self.agents.values() if agent.state == "idle"]
         if not idle_agents: return None
@@ -271,42 +977,58 @@ class MultiAgentCoordinationSystem:
         urgency_weight = 1 + task.urgency 
         # --- 修改结束 ---
 
+        # --- 批量规划：每个能力配置只做一次 "各智能体 -> 仓库" 与 "仓库 -> 目标/中转站" 的查询 ---
+        candidates = [agent for agent in idle_agents if task.weight <= agent.capabilities["weight_limit"]]
+        to_warehouse = self._plan_for_agents(candidates, {agent.agent_id: agent.position for agent in candidates},
+                                             [self.warehouse_pos])
+        from_warehouse = self._plan_for_agents(candidates, {agent.agent_id: self.warehouse_pos for agent in candidates},
+                                               [task.original_goal, self.relay_station_pos])
+        # 有时间窗的任务只考虑预计能按时送达的方案
+        time_left = self._time_left(task)
+
         # --- 直接配送策略评估 ---
         best_direct_agent, best_direct_path, min_direct_cost = None, None, float('inf')
-        for agent in idle_agents:
-            if task.weight <= agent.capabilities["weight_limit"]:
-                path_to_warehouse, cost_to_warehouse = self.plan_path_for_agent(agent, agent.position, self.warehouse_pos, return_cost=True)
-                if not path_to_warehouse: continue
-                path_to_goal, cost_to_goal = self.plan_path_for_agent(agent, self.warehouse_pos, task.original_goal, return_cost=True)
-                if not path_to_goal: continue
+        for agent in candidates:
+            path_to_warehouse, cost_to_warehouse = to_warehouse[(agent.agent_id, self.warehouse_pos)]
+            if not path_to_warehouse: continue
+            path_to_goal, cost_to_goal = from_warehouse[(agent.agent_id, task.original_goal)]
+            if not path_to_goal: continue
+            if time_left != float('inf') and self._travel_time(agent, path_to_warehouse + path_to_goal[1:]) > time_left: continue
                 
-                # --- 核心修改 5: 应用紧急度权重 ---
-                total_cost = (cost_to_warehouse + cost_to_goal) / urgency_weight
-                # --- 修改结束 ---
+            # --- 核心修改 5: 应用紧急度权重 ---
+            total_cost = (cost_to_warehouse + cost_to_goal) / urgency_weight
+            # --- 修改结束 ---
 
-                if total_cost < min_direct_cost:
-                    min_direct_cost = total_cost
-                    best_direct_agent = agent
-                    # 注意：返回的路径不应该受权重影响，所以要重新组合
-                    best_direct_path = path_to_warehouse + path_to_goal[1:]
+            if total_cost < min_direct_cost:
+                min_direct_cost = total_cost
+                best_direct_agent = agent
+                # 注意：返回的路径不应该受权重影响，所以要重新组合
+                best_direct_path = path_to_warehouse + path_to_goal[1:]
 
         # --- 中转策略评估 ---
         best_leg1_agent, best_leg1_path, min_leg1_cost = None, None, float('inf')
-        for agent in idle_agents:
-            if task.weight <= agent.capabilities["weight_limit"]:
-                path_to_warehouse, cost_to_warehouse = self.plan_path_for_agent(agent, agent.position, self.warehouse_pos, return_cost=True)
-                if not path_to_warehouse: continue
-                path_to_relay, cost_to_relay = self.plan_path_for_agent(agent, self.warehouse_pos, self.relay_station_pos, return_cost=True)
-                if not path_to_relay: continue
+        leg1_time_left = time_left
+        if time_left != float('inf'):
+            # 第一程的时间上限：扣除中转处理和最快的第二程
+            leg2_agents = [agent for agent in self.agents.values() if task.weight <= agent.capabilities["weight_limit"]]
+            from_relay = self._plan_for_agents(leg2_agents, {agent.agent_id: self.relay_station_pos for agent in leg2_agents},
+                                               [task.original_goal])
+            leg1_time_left = time_left - self.RELAY_PROCESSING_TIME - self._min_leg_time(leg2_agents, task.original_goal, from_relay)
+        for agent in candidates:
+            path_to_warehouse, cost_to_warehouse = to_warehouse[(agent.agent_id, self.warehouse_pos)]
+            if not path_to_warehouse: continue
+            path_to_relay, cost_to_relay = from_warehouse[(agent.agent_id, self.relay_station_pos)]
+            if not path_to_relay: continue
+            if leg1_time_left != float('inf') and self._travel_time(agent, path_to_warehouse + path_to_relay[1:]) > leg1_time_left: continue
                 
-                # --- 核心修改 6: 应用紧急度权重 ---
-                total_cost = (cost_to_warehouse + cost_to_relay) / urgency_weight
-                # --- 修改结束 ---
-
-                if total_cost < min_leg1_cost:
-                    min_leg1_cost = total_cost
-                    best_leg1_agent = agent
-                    best_leg1_path = path_to_warehouse + path_to_relay[1:]
+            # --- 核心修改 6: 应用紧急度权重 ---
+            total_cost = (cost_to_warehouse + cost_to_relay) / urgency_weight
+            # --- 修改结束 ---
+
+            if total_cost < min_leg1_cost:
+                min_leg1_cost = total_cost
+                best_leg1_agent = agent
+                best_leg1_path = path_to_warehouse + path_to_relay[1:]
         
         _, _, min_leg2_cost_raw = self._find_best_option_from_point(self.agents.values(), self.relay_station_pos, task.original_goal, task.weight)
         
@@ -337,12 +1059,12 @@ class MultiAgentCoordinationSystem:
 
     def _find_best_option_from_point(self, agents_to_consider, start, end, weight):
         best_agent, best_path, min_cost = None, None, float('inf')
-        for agent in agents_to_consider:
-            if weight <= agent.capabilities["weight_limit"]:
-                # --- 调用已修改的 plan_path_for_agent ---
-                path, cost = self.plan_path_for_agent(agent, start, end, return_cost=True)
-                if path and cost < min_cost:
-                    # 注意：这里我们不需要路径，只需要成本，所以best_path可以是None
-                    min_cost = cost
+        candidates = [agent for agent in agents_to_consider if weight <= agent.capabilities["weight_limit"]]
+        planned = self._plan_for_agents(candidates, {agent.agent_id: start for agent in candidates}, [end])
+        for agent in candidates:
+            path, cost = planned[(agent.agent_id, end)]
+            if path and cost < min_cost:
+                # 注意：这里我们不需要路径，只需要成本，所以best_path可以是None
+                min_cost = cost
         # 这个函数主要用于估算成本，所以返回 (None, None, min_cost) 是可以接受的
         return None, None, min_cost
\ No newline at end of file
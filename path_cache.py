@@ -0,0 +1,83 @@
+# path_cache.py
+# -*- coding: utf-8 -*-
+"""
+路径缓存模块
+以 (能力配置, 起点格, 终点格) 为键的 LRU 路径/代价缓存。
+每个条目记录其规划时读取过的地图区域，只有当知识地图在该区域内
+真正有格子发生变化时才失效，其余更新不会影响缓存。
+"""
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+class PathCache:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._entries = OrderedDict()  # key -> (path, final_distance, bounds)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(profile, start, goal) -> tuple:
+        return (profile, tuple(map(int, start)), tuple(map(int, goal)))
+
+    def get(self, key):
+        """命中时返回 (path, final_distance)，path 为副本；未命中返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        path, final_distance, _ = entry
+        return (list(path) if path else None), final_distance
+
+    def put(self, key, path, final_distance, bounds):
+        with self._lock:
+            self._entries[key] = (list(path) if path else None, final_distance, bounds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_cells(self, xs, ys, bounds=None):
+        """知识地图变化回调：删除搜索区域内包含任一变化格子的条目；bounds 为变化区域，缺省时由 xs, ys 计算"""
+        xs = np.asarray(xs); ys = np.asarray(ys)
+        if xs.size == 0:
+            return
+        if bounds is None:
+            bounds = (xs.min(), ys.min(), xs.max(), ys.max())
+        change_x0, change_y0, change_x1, change_y1 = bounds
+        with self._lock:
+            stale = []
+            for key, (_, _, (x0, y0, x1, y1)) in self._entries.items():
+                # 先用包围盒快速排除，再逐格精确判断
+                if x1 < change_x0 or x0 > change_x1 or y1 < change_y0 or y0 > change_y1:
+                    continue
+                if np.any((xs >= x0) & (xs <= x1) & (ys >= y0) & (ys <= y1)):
+                    stale.append(key)
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -4,16 +4,92 @@
 路径规划模块
 实现A*算法在不完整的知识地图上进行路径规划 (鲁棒版)
 返回路径和最终点与原始目标的距离
+搜索在按能力配置预编译的代价网格 (cost_grid.py) 上进行，使用 heapq 与扁平整数索引
 """
+import heapq
 import math
-from queue import PriorityQueue
+import threading
+import time
+from collections import deque
+from cost_grid import get_cost_grid
 
-def a_star_planning(agent_capabilities, knowledge_map, start_pos, goal_pos):
+# 规划结果状态
+PLAN_FOUND = 'found'                      # 到达寻路目标 (或非 road_only 回退到的最近点)
+PLAN_UNREACHABLE = 'unreachable'          # 搜索完整结束仍无可用路径
+PLAN_BUDGET_EXCEEDED = 'budget_exceeded'  # 预算耗尽提前停止，path 为目前离目标最近的部分路径
+
+def a_star_planning(agent_capabilities, knowledge_map, start_pos, goal_pos, max_expansions=None, time_limit=None):
     """
     A* 路径规划函数。
     返回一个元组 (path, final_distance)，其中：
     - path: 节点列表，如果无法规划则为 None。
     - final_distance: 路径终点与原始目标点的距离。
+    给定 max_expansions / time_limit (秒) 时为有界模式，超出预算返回目前最好的部分路径。
+    """
+    budget = PlanningBudget(max_expansions, time_limit) if max_expansions or time_limit else None
+    result = plan_path(agent_capabilities, knowledge_map, start_pos, goal_pos, budget)
+    return result.path, result.final_distance
+
+class PlanResult:
+    """
+    一次规划的完整结果。
+    bounds 是本次规划读取过的地图区域 (x_min, y_min, x_max, y_max)，含两端；
+    该区域外的格子发生变化不会影响规划结果，路径缓存据此做精确失效。
+    status 为 PLAN_FOUND / PLAN_UNREACHABLE / PLAN_BUDGET_EXCEEDED，缺省时按 path 是否存在推断。
+    """
+    __slots__ = ('path', 'final_distance', 'bounds', 'expansions', 'status')
+
+    def __init__(self, path, final_distance, bounds, expansions=0, status=None):
+        self.path = path
+        self.final_distance = final_distance
+        self.bounds = bounds
+        self.expansions = expansions
+        self.status = status or (PLAN_FOUND if path else PLAN_UNREACHABLE)
+
+class PlanningBudget:
+    """
+    扩展节点数/时间预算，可在多次规划调用之间共享 (例如协调器每帧一个)。
+    单独创建时即为单次调用的预算；reset() 开始新的一轮。
+    lift() 解除本轮剩余的共享限制 (单次上限仍然有效)，用于多次推迟之后保证决策能够完成。
+    """
+    def __init__(self, max_expansions=None, time_limit=None):
+        self.max_expansions = max_expansions
+        self.time_limit = time_limit
+        self.reset()
+
+    def reset(self):
+        self.used = 0
+        self.calls = 0
+        self.exceeded = False
+        self.lifted = False
+        self.deadline = time.perf_counter() + self.time_limit if self.time_limit else None
+
+    def lift(self):
+        self.lifted = True
+        self.exceeded = False
+
+    def allowance(self, call_limit=None):
+        """本次调用可用的 (最大扩展数, 截止时间)，None 表示不限"""
+        if self.lifted:
+            return call_limit, None
+        limit = call_limit
+        if self.max_expansions is not None:
+            remaining = max(self.max_expansions - self.used, 0)
+            limit = remaining if limit is None else min(limit, remaining)
+        return limit, self.deadline
+
+    def charge(self, expansions, status):
+        self.calls += 1
+        self.used += expansions
+        if status == PLAN_BUDGET_EXCEEDED:
+            self.exceeded = True
+
+def plan_path(agent_capabilities, knowledge_map, start_pos, goal_pos, budget=None, max_expansions=None,
+              landmarks=None) -> PlanResult:
+    """
+    a_star_planning 的完整版本，额外返回搜索区域、扩展节点数与状态。
+    budget (PlanningBudget) 与 max_expansions (单次上限) 限制本次搜索，超出时返回部分路径。
+    landmarks (landmarks.Landmarks) 提供该能力配置的路标下界，用于收紧启发式。
     """
     rules = agent_capabilities["terrain_rules"]
     start_node = tuple(map(int, start_pos))
@@ -22,96 +98,189 @@ def a_star_planning(agent_capabilities, knowledge_map, start_pos, goal_pos):
     original_goal_node = tuple(map(int, goal_pos))
     goal_node = original_goal_node # 先将寻路目标设为原始目标
     # --- 修改结束 ---
+    start_node, goal_node, bounds = snap_endpoints(rules, knowledge_map, start_node, goal_node)
+    if start_node is None:
+        return PlanResult(None, float('inf'), bounds) # 规划失败
 
-    # 为 road_only 智能体特殊处理起点和终点
-    if rules.get("road_only", False):
-        if not knowledge_map.is_road(start_node[0], start_node[1]):
-            nearest_road_start = find_nearest_road(knowledge_map, start_node)
-            if not nearest_road_start:
-                return None, float('inf') # 规划失败
-            start_node = nearest_road_start
-
-        if not knowledge_map.is_road(goal_node[0], goal_node[1]):
-            nearest_road_goal = find_nearest_road(knowledge_map, goal_node)
-            if not nearest_road_goal:
-                return None, float('inf') # 规划失败
-            goal_node = nearest_road_goal # 更新寻路目标为最近的公路点
-
-    open_set = PriorityQueue()
-    open_set.put((0, start_node))
-    came_from = {}
-    g_score = {start_node: 0}
-    f_score = {start_node: heuristic(start_node, goal_node)}
-    
-    directions = [(1, 0, 1.0), (-1, 0, 1.0), (0, 1, 1.0), (0, -1, 1.0),
-                  (1, 1, 1.4), (1, -1, 1.4), (-1, 1, 1.4), (-1, -1, 1.4)]
-    
-    closest_node_to_goal = start_node
-    # 注意：这里的 min_dist_to_goal 依然是和寻路目标 goal_node 比较
-    min_dist_to_goal = heuristic(start_node, goal_node) 
+    grid = get_cost_grid(rules, knowledge_map)
+    limit, deadline = budget.allowance(max_expansions) if budget else (max_expansions, None)
+    heuristic_table = landmarks.heuristic_table(grid, goal_node) if landmarks else None
+    search = grid_a_star(grid, start_node, goal_node, limit, deadline, heuristic_table)
+    if budget:
+        budget.charge(search.expansions, search.status)
+    bounds = merge_bounds(bounds, search.bounds)
 
+    # --- 核心修改 2: 统一处理返回逻辑 ---
+    # 找到精确目标，或对于非road_only回退到最近点；road_only 找不到精确路径则失败
+    # 预算耗尽时任何配置都返回目前离目标最近的部分路径，由调用方根据状态决定是否采用
+    budget_exceeded = search.status == PLAN_BUDGET_EXCEEDED
+    if search.path and (search.path_found or budget_exceeded or not rules.get("road_only", False)):
+        # 计算路径终点与原始目标的距离
+        final_distance = heuristic(search.path[-1], original_goal_node)
+        return PlanResult(search.path, final_distance, bounds, search.expansions, search.status)
+    return PlanResult(None, float('inf'), bounds, search.expansions, search.status)
+    # --- 修改结束 ---
+
+def snap_endpoints(rules, knowledge_map, start_node, goal_node):
+    """
+    为 road_only 智能体把起点和终点吸附到最近的公路点。
+    返回 (start_node, goal_node, bounds)，找不到公路时起终点为 None；
+    bounds 为吸附过程读取过的地图区域。
+    """
+    start_node, start_bounds = snap_to_road(rules, knowledge_map, start_node)
+    if start_node is None:
+        return None, None, start_bounds
+    goal_node, goal_bounds = snap_to_road(rules, knowledge_map, goal_node)
+    bounds = merge_bounds(start_bounds, goal_bounds)
+    if goal_node is None:
+        return None, None, bounds
+    return start_node, goal_node, bounds # 寻路目标已更新为最近的公路点
+
+def snap_to_road(rules, knowledge_map, node):
+    """单个端点的吸附：返回 (吸附后的格子或 None, 读取过的地图区域)；非 road_only 时原样返回"""
+    bounds = _merge_bounds(None, node, 0)
+    if rules.get("road_only", False) and not knowledge_map.is_road(node[0], node[1]):
+        bounds = _merge_bounds(bounds, node, NEAREST_ROAD_SEARCH_REACH)
+        return find_nearest_road(knowledge_map, node), bounds
+    return node, bounds
+
+def merge_bounds(a, b):
+    """合并两个 (x_min, y_min, x_max, y_max) 区域"""
+    if a is None: return b
+    if b is None: return a
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+def _merge_bounds(bounds, node, margin):
+    x, y = node
+    if bounds is None:
+        return (x - margin, y - margin, x + margin, y + margin)
+    return (min(bounds[0], x - margin), min(bounds[1], y - margin),
+            max(bounds[2], x + margin), max(bounds[3], y + margin))
+
+class GridSearchResult:
+    """grid_a_star 的结果：path 在找到目标时通往目标，否则通往离目标最近的已扩展节点"""
+    __slots__ = ('path', 'path_found', 'bounds', 'expansions', 'status')
+
+    def __init__(self, path, path_found, bounds, expansions, status=None):
+        self.path = path
+        self.path_found = path_found
+        self.bounds = bounds
+        self.expansions = expansions
+        self.status = status or (PLAN_FOUND if path_found else PLAN_UNREACHABLE)
+
+# 有截止时间时每扩展这么多个节点检查一次时钟
+DEADLINE_CHECK_INTERVAL = 128
+
+def grid_a_star(grid, start_node, goal_node, max_expansions=None, deadline=None, heuristic_table=None):
+    """
+    在编译好的 CostGrid 上执行 A*，节点为扁平整数索引，返回 GridSearchResult。
+    bounds 为所有被扩展节点及其邻居构成的包围盒；起点不在地图内时 path 为 None。
+    扩展数达到 max_expansions 或 time.perf_counter() 超过 deadline 时提前停止，
+    status 为 PLAN_BUDGET_EXCEEDED，path 通往目前离目标最近的已扩展节点。
+    heuristic_table 为按扁平索引给出的到目标代价下界 (如路标下界)，启发式取它与欧氏距离的较大者。
+    """
+    if not grid.contains(start_node):
+        return GridSearchResult(None, False, None, 0)
+    stride = grid.stride
+    penalty, scale, offsets = grid.penalty, grid.scale, grid.neighbor_offsets
+    start = grid.index(start_node)
+    goal = grid.index(goal_node) if grid.contains(goal_node) else -1
+    gx, gy = goal_node[0] + 1, goal_node[1] + 1  # 填充坐标系下的目标点
+    hypot = math.hypot
+
+    g_score, f_score, parent, stamp, search_id = _acquire_buffers(grid.size)
+    start_h = heuristic(start_node, goal_node)
+    if heuristic_table is not None:
+        start_h = max(start_h, heuristic_table[start])
+    g_score[start], f_score[start], parent[start], stamp[start] = 0.0, start_h, -1, search_id
+    open_heap = [(start_h, start)]
+
+    closest = start
+    # 注意：这里的 min_dist_to_goal 依然是和寻路目标 goal_node 比较
+    min_dist_to_goal = heuristic(start_node, goal_node)
     path_found = False
-    while not open_set.empty():
-        _, current = open_set.get()
-        
-        current_dist_to_goal = heuristic(current, goal_node)
+    budget_exceeded = False
+    expansions = 0
+    expansion_limit = max_expansions if max_expansions is not None else math.inf
+    min_x = max_x = start_node[0] + 1
+    min_y = max_y = start_node[1] + 1
+    while open_heap:
+        f_current, current = heapq.heappop(open_heap)
+        if f_current > f_score[current]:
+            continue  # 过期条目：该节点已以更小的 f 值出队处理过
+        if expansions >= expansion_limit or (
+                deadline is not None and expansions % DEADLINE_CHECK_INTERVAL == 0
+                and expansions and time.perf_counter() > deadline):
+            budget_exceeded = True
+            break
+        expansions += 1
+        cx, cy = divmod(current, stride)
+        if cx < min_x: min_x = cx
+        elif cx > max_x: max_x = cx
+        if cy < min_y: min_y = cy
+        elif cy > max_y: max_y = cy
+        current_dist_to_goal = hypot(cx - gx, cy - gy)
         if current_dist_to_goal < min_dist_to_goal:
             min_dist_to_goal = current_dist_to_goal
-            closest_node_to_goal = current
-
-        if current == goal_node:
+            closest = current
+        if current == goal:
             path_found = True
-            break # 找到精确路径，跳出循环
+            break
 
-        # (循环内部逻辑保持不变)
-        for dx, dy, move_cost in directions:
-            neighbor = (current[0] + dx, current[1] + dy)
-            if not (0 <= neighbor[0] < knowledge_map.width and 0 <= neighbor[1] < knowledge_map.height):
+        g_current = g_score[current]
+        for offset, move_cost in offsets:
+            neighbor = current + offset
+            terrain_penalty = penalty[neighbor]
+            if terrain_penalty < 0:
                 continue
-            terrain = knowledge_map.get_terrain(neighbor[0], neighbor[1])
-            is_passable = True
-            terrain_penalty = 0
-            if rules.get("road_only", False) and not knowledge_map.is_road(neighbor[0], neighbor[1]): is_passable = False
-            if terrain == 'water' and not rules.get("can_cross_water", False): is_passable = False
-            if terrain == 'hilly': terrain_penalty = 2
-            elif terrain == 'steep': terrain_penalty = 5
-            if terrain_penalty > rules.get("climb_height", 0): is_passable = False
-            if not is_passable: continue
-            unknown_penalty = 0
-            if terrain == 'unknown':
-                unknown_penalty = 10 
-                if rules.get("road_only", False): unknown_penalty = 50
-            final_move_cost = move_cost * 0.8 if knowledge_map.is_road(neighbor[0], neighbor[1]) else move_cost
-            tentative_g_score = g_score[current] + final_move_cost + terrain_penalty + unknown_penalty
-            if neighbor not in g_score or tentative_g_score < g_score[neighbor]:
-                came_from[neighbor] = current
+            tentative_g_score = g_current + move_cost * scale[neighbor] + terrain_penalty
+            if stamp[neighbor] != search_id or tentative_g_score < g_score[neighbor]:
+                stamp[neighbor] = search_id
                 g_score[neighbor] = tentative_g_score
-                f_score[neighbor] = tentative_g_score + heuristic(neighbor, goal_node)
-                open_set.put((f_score[neighbor], neighbor))
-    
-    # --- 核心修改 2: 统一处理返回逻辑 ---
-    final_node = None
-    if path_found:
-        final_node = goal_node # 如果找到了精确目标
-    elif not rules.get("road_only", False):
-        final_node = closest_node_to_goal # 对于非road_only, 回退到最近点
-    
-    if final_node:
-        path = reconstruct_path(came_from, final_node)
-        # 计算路径终点与原始目标的距离
-        final_distance = heuristic(path[-1], original_goal_node)
-        return path, final_distance
-    else:
-        # 对于 road_only 且找不到精确路径，或任何其他失败情况
-        return None, float('inf')
-    # --- 修改结束 ---
+                parent[neighbor] = current
+                nx, ny = divmod(neighbor, stride)
+                h = hypot(nx - gx, ny - gy)
+                if heuristic_table is not None and heuristic_table[neighbor] > h:
+                    h = heuristic_table[neighbor]
+                f = tentative_g_score + h
+                f_score[neighbor] = f
+                heapq.heappush(open_heap, (f, neighbor))
+
+    path = []
+    node = goal if path_found else closest
+    while node != -1:
+        path.append(grid.node(node))
+        node = parent[node]
+    path.reverse()
+    # 填充坐标 -> 地图坐标，并向外扩展一格 (被扩展节点的邻居也被读取过)
+    bounds = (min_x - 2, min_y - 2, max_x, max_y)
+    status = PLAN_BUDGET_EXCEEDED if budget_exceeded else None
+    return GridSearchResult(path, path_found, bounds, expansions, status)
+
+# 预分配的搜索缓冲区 (按线程、按网格大小复用)，用 stamp 标记本次搜索写过的格子，
+# 避免每次搜索都重新分配/清零 g-score 与 parent 数组
+_search_buffers = threading.local()
+
+def _acquire_buffers(size):
+    buffers = getattr(_search_buffers, 'by_size', None)
+    if buffers is None:
+        buffers = _search_buffers.by_size = {}
+    entry = buffers.get(size)
+    if entry is None:
+        entry = buffers[size] = [[0.0] * size, [0.0] * size, [-1] * size, [0] * size, 0]
+    entry[4] += 1
+    return entry[0], entry[1], entry[2], entry[3], entry[4]
+
+# find_nearest_road 的 BFS 最远会检查到曼哈顿距离为 search_radius_limit + 1 的格子
+NEAREST_ROAD_SEARCH_RADIUS = 20
+NEAREST_ROAD_SEARCH_REACH = NEAREST_ROAD_SEARCH_RADIUS + 1
 
 def find_nearest_road(knowledge_map, start_node):
-    q = [(start_node, 0)]
+    q = deque([(start_node, 0)])
     visited = {start_node}
-    search_radius_limit = 20 
+    search_radius_limit = NEAREST_ROAD_SEARCH_RADIUS
     while q:
-        (x, y), dist = q.pop(0)
+        (x, y), dist = q.popleft()
         if knowledge_map.is_road(x, y):
             return (x, y)
         if dist > search_radius_limit:
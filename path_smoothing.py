@@ -0,0 +1,99 @@
+# path_smoothing.py
+# -*- coding: utf-8 -*-
+"""
+路径平滑模块 (视线后处理)
+A* 输出的是逐格路径。这里沿路径贪心地把能直线连通的路点合并为一段：
+直线经过的每个格子对该能力配置都必须可通行，且按规划器的代价模型
+(八方向距离 × 最大缩放系数 + 途经格子的平均惩罚 × 步数) 不比被替换的原路径更贵。
+平滑后的路点数通常只剩下拐点，移动更新与渲染的开销随之下降。
+"""
+INF = float('inf')
+DIAGONAL_COST = 1.4
+EPSILON = 1e-9
+
+
+def line_cells(a, b) -> list:
+    """线段 a -> b (格子中心为整数坐标) 经过的所有格子；恰好穿过格点时两侧格子都计入"""
+    x, y = a
+    x1, y1 = b
+    dx, dy = abs(x1 - x), abs(y1 - y)
+    sx = 1 if x1 > x else -1
+    sy = 1 if y1 > y else -1
+    cells = [(x, y)]
+    ix = iy = 0
+    while ix < dx or iy < dy:
+        # 比较下一次穿过竖直边界与水平边界的先后：(0.5 + ix) / dx 与 (0.5 + iy) / dy
+        decision = (1 + 2 * ix) * dy - (1 + 2 * iy) * dx
+        if decision == 0:
+            cells.append((x + sx, y))
+            cells.append((x, y + sy))
+            x += sx; y += sy; ix += 1; iy += 1
+        elif decision < 0:
+            x += sx; ix += 1
+        else:
+            y += sy; iy += 1
+        cells.append((x, y))
+    return cells
+
+
+def trace_cells(points) -> list:
+    """折线依次经过的格子 (路点取最近的格子)"""
+    nodes = [(int(round(p[0])), int(round(p[1]))) for p in points]
+    if not nodes:
+        return []
+    cells = [nodes[0]]
+    for a, b in zip(nodes, nodes[1:]):
+        cells.extend(line_cells(a, b)[1:])
+    return cells
+
+
+def smooth_path(grid, path) -> list:
+    """在 CostGrid 上对逐格路径做视线平滑，首尾路点保持不变"""
+    if not path or len(path) < 3:
+        return list(path) if path else path
+    # 原路径的累计代价，与 A* 的计算方式一致
+    cumulative = [0.0]
+    for a, b in zip(path, path[1:]):
+        index = grid.index(b)
+        move_cost = DIAGONAL_COST if a[0] != b[0] and a[1] != b[1] else 1.0
+        cumulative.append(cumulative[-1] + move_cost * grid.scale[index] + grid.penalty[index])
+
+    smoothed = [path[0]]
+    anchor = 0
+    last = len(path) - 1
+    while anchor < last:
+        reach = anchor + 1
+        candidate = anchor + 2
+        while candidate <= last:
+            if segment_cost(grid, path[anchor], path[candidate]) > cumulative[candidate] - cumulative[anchor] + EPSILON:
+                break
+            reach = candidate
+            candidate += 1
+        smoothed.append(path[reach])
+        anchor = reach
+    return smoothed
+
+
+def segment_cost(grid, a, b) -> float:
+    """直线段 a -> b 的保守代价估计，途经不可通行格子时为 inf"""
+    penalty, scale = grid.penalty, grid.scale
+    penalty_sum = 0.0
+    max_scale = 0.0
+    cells = line_cells(a, b)
+    for cell in cells[1:]:
+        if not grid.contains(cell):
+            return INF
+        index = grid.index(cell)
+        cell_penalty = penalty[index]
+        if cell_penalty < 0:
+            return INF
+        penalty_sum += cell_penalty
+        if scale[index] > max_scale:
+            max_scale = scale[index]
+    dx, dy = abs(b[0] - a[0]), abs(b[1] - a[1])
+    steps = max(dx, dy)
+    octile = steps + (DIAGONAL_COST - 1.0) * min(dx, dy)
+    # 斜线穿过的格子多于等长的逐格路径，惩罚按途经格子的平均值乘逐格路径的步数计
+    if steps == 0:
+        return 0.0
+    return octile * max_scale + penalty_sum / (len(cells) - 1) * steps
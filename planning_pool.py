@@ -0,0 +1,86 @@
+# planning_pool.py
+# -*- coding: utf-8 -*-
+"""
+规划进程池模块
+协调线程内的规划受 GIL 限制无法用线程并行。进程池中的每个工作进程通过
+multiprocessing.shared_memory 零拷贝挂接知识地图的 terrain 数组，
+调度打分时把同一能力配置下互不相关的 (起点, 终点) 规划分发到各进程并收集结果。
+工作进程只读地图；分发期间协调线程阻塞等待，地图不会被并发修改。
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor
+from knowledge_base import SharedKnowledgeMap
+from path_planning import plan_path, PlanResult, PlanningBudget
+from cost_grid import profile_key
+from landmarks import Landmarks
+
+# ---------- 工作进程侧 ----------
+_worker_map = None
+_worker_shm = None        # 持有共享内存对象，避免挂接的缓冲区被回收
+_worker_landmarks = {}
+_worker_landmark_config = (0, 0)
+
+
+def _init_worker(name, width, height, dtype, landmark_count, landmark_refresh_cells):
+    global _worker_map, _worker_shm, _worker_landmark_config
+    _worker_map, _worker_shm = SharedKnowledgeMap.attach_shared(name, width, height, dtype)
+    _worker_landmark_config = (landmark_count, landmark_refresh_cells)
+
+
+def _plan_job(job):
+    """在工作进程中执行一次 plan_path，返回可序列化的结果字段"""
+    capabilities, start, end, version, max_expansions, time_limit = job
+    _worker_map.version = version  # 让代价网格缓存按协调器的地图版本失效
+    landmarks = None
+    count, refresh_cells = _worker_landmark_config
+    if count > 0:
+        key = profile_key(capabilities["terrain_rules"])
+        landmarks = _worker_landmarks.get(key)
+        if landmarks is None:
+            landmarks = _worker_landmarks[key] = Landmarks(
+                capabilities["terrain_rules"], _worker_map, count, refresh_cells)
+    budget = None
+    if time_limit is not None:
+        budget = PlanningBudget(time_limit=time_limit)
+        budget.reset()
+    result = plan_path(capabilities, _worker_map, start, end, budget, max_expansions, landmarks)
+    return result.path, result.final_distance, result.bounds, result.expansions, result.status
+
+
+# ---------- 协调器侧 ----------
+class PlanningPool:
+    def __init__(self, knowledge_map, workers: int, landmark_count=0, landmark_refresh_cells=0):
+        self.knowledge_map = knowledge_map
+        name = knowledge_map.share_terrain()
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker,
+            initargs=(name, knowledge_map.width, knowledge_map.height, knowledge_map.terrain.dtype.str,
+                      landmark_count, landmark_refresh_cells))
+        self.workers = workers
+        self.jobs = 0
+
+    def plan_many(self, capabilities, pairs, budget=None, max_expansions=None) -> dict:
+        """
+        并行规划 pairs 中的每个 (起点, 终点)，返回 {(起点, 终点): PlanResult}。
+        每个任务都拿到调用时预算的剩余额度，结束后统一记账，因此一轮分发可能略微超出帧预算。
+        """
+        pairs = list(pairs)
+        limit, deadline = budget.allowance(max_expansions) if budget else (max_expansions, None)
+        time_limit = max(0.0, deadline - time.perf_counter()) if deadline is not None else None
+        version = self.knowledge_map.version
+        jobs = [(capabilities, start, end, version, limit, time_limit) for start, end in pairs]
+        results = {}
+        # 每个进程分到几批任务，减少进程间往返次数的同时保持负载均衡
+        chunksize = max(1, len(jobs) // (self.workers * 4))
+        for pair, fields in zip(pairs, self.executor.map(_plan_job, jobs, chunksize=chunksize)):
+            result = PlanResult(*fields)
+            if budget:
+                budget.charge(result.expansions, result.status)
+            results[pair] = result
+        self.jobs += len(jobs)
+        return results
+
+    def close(self):
+        """关闭工作进程并把知识地图移回普通内存"""
+        self.executor.shutdown()
+        self.knowledge_map.release_shared_terrain()
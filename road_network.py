@@ -0,0 +1,354 @@
+# road_network.py
+# -*- coding: utf-8 -*-
+"""
+道路网络模块
+把知识地图中的道路格压缩为稀疏图：度数不为 2 的道路格 (路口、端点、设施内部) 作为节点，
+度数为 2 的连续道路格压缩为一条边。road_only 智能体在这张图上做 A*，不再逐格搜索整张网格。
+度数按 "约简邻接" 计算：4 邻域的道路格，加上两侧拐角格都不是道路的斜向道路格。
+按 8 邻域计数时，斜向阶梯状道路 (以及 4 连通的台阶) 上的格子度数为 3~4，几乎每格都会变成节点；
+约简后这些格子度数为 2，整段道路压缩为一条边。默认 100x100 地图完全揭示后约 160 个节点、550 条边，
+其中约 100 个节点是仓库/中转站内部的实心道路格 (度数 4)，它们之间的直连边占了绝大多数；道路本身只剩十来条链。
+相邻的两个节点之间仍按完整的 8 邻域直接相连，设施内部可以斜穿。
+同时维护 "最近道路格" 索引 (有界的曼哈顿距离变换)，替代逐次 BFS。
+知识地图变化时按变化流 (changes_since) 只重建被触及的边与变化格子附近的最近道路索引。
+"""
+import heapq
+import itertools
+import math
+import numpy as np
+from cost_grid import get_cost_grid, MIN_COST_PER_DISTANCE
+from path_planning import PlanResult, NEAREST_ROAD_SEARCH_REACH, heuristic
+
+_NEIGHBORS_8 = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if (dx, dy) != (0, 0)]
+# 与 find_nearest_road 的 BFS 方向顺序一致
+_NEIGHBORS_4 = [(0, 1), (0, -1), (1, 0), (-1, 0)]
+_DIAGONALS = [(dx, dy) for dx, dy in _NEIGHBORS_8 if dx and dy]
+
+
+class RoadNetwork:
+    def __init__(self, terrain_rules: dict, knowledge_map):
+        self.terrain_rules = terrain_rules
+        self.knowledge_map = knowledge_map
+        self.grid = None
+        self.version = None
+        self.road_mask = None     # 填充坐标下的道路掩码，与 grid.penalty_array 同形
+        self.road_cells = set()   # 道路格的扁平索引
+        self.nearest_road = None  # (width, height) 数组，值为最近道路格的扁平索引，-1 表示范围内没有道路
+        self.adjacency = {}       # 节点 -> [(相邻节点, 代价, 边编号, 是否正向)]
+        self.edges = {}           # 边编号 -> (起点节点, 终点节点, 中间格列表)
+        self.chain_position = {}  # 链内格子 -> (边编号, 在中间格列表中的位置)
+        self._edge_ids = itertools.count()
+        self.rebuilds = 0
+        self.incremental_updates = 0
+
+    # ---------- 维护 ----------
+    def refresh(self):
+        """
+        与知识地图当前版本同步。road_only 配置下道路格的代价恒定，只需处理道路掩码的变化：
+        首次使用或变化历史已被挤出时整张重建，否则只修补变化格子附近的边与最近道路索引。
+        """
+        grid = get_cost_grid(self.terrain_rules, self.knowledge_map)
+        if grid is self.grid and grid.version == self.version:
+            return
+        deltas = None
+        if self.grid is not None and grid.size == self.grid.size:
+            deltas = self.knowledge_map.changes_since(self.version)
+        self.grid = grid
+        if deltas is None:
+            self.road_mask = grid.penalty_array >= 0  # road_only 配置下可通行即道路
+            self.road_cells = set(np.flatnonzero(self.road_mask.ravel()).tolist())
+            self._build_graph()
+            self.nearest_road = self._nearest_index(self.road_mask[1:-1, 1:-1], 0, 0)
+            self.rebuilds += 1
+        else:
+            deltas = [delta for delta in deltas if delta.version <= grid.version]
+            if deltas:
+                xs = np.concatenate([delta.xs for delta in deltas]) + 1
+                ys = np.concatenate([delta.ys for delta in deltas]) + 1
+                road = grid.penalty_array[xs, ys] >= 0
+                flipped = road != self.road_mask[xs, ys]
+                if flipped.any():
+                    xs, ys, road = xs[flipped], ys[flipped], road[flipped]
+                    self.road_mask[xs, ys] = road
+                    cells = (xs * grid.stride + ys).tolist()
+                    for cell, is_road in zip(cells, road.tolist()):
+                        if is_road:
+                            self.road_cells.add(cell)
+                        else:
+                            self.road_cells.discard(cell)
+                    self._update_graph(cells)
+                    self._update_nearest_index(xs - 1, ys - 1)
+                    self.incremental_updates += 1
+        self.version = grid.version
+
+    def _chain_neighbors(self, cell):
+        """约简邻接下的相邻道路格：4 邻域道路格，以及两侧拐角格都不是道路的斜向道路格"""
+        road, stride = self.road_cells, self.grid.stride
+        neighbors = [cell + dx * stride + dy for dx, dy in _NEIGHBORS_4 if cell + dx * stride + dy in road]
+        for dx, dy in _DIAGONALS:
+            diagonal = cell + dx * stride + dy
+            if diagonal in road and cell + dx * stride not in road and cell + dy not in road:
+                neighbors.append(diagonal)
+        return neighbors
+
+    def _is_node(self, cell):
+        return cell in self.road_cells and len(self._chain_neighbors(cell)) != 2
+
+    def _build_graph(self):
+        self.adjacency = {cell: [] for cell in self.road_cells if self._is_node(cell)}
+        self.edges = {}
+        self.chain_position = {}
+        for node in sorted(self.adjacency):
+            self._connect(node)
+        self._close_cycles(self.road_cells)
+
+    def _update_graph(self, changed):
+        """
+        道路格集合在 changed 处变化后修补图。格子的约简度数只取决于它的 3x3 邻域，
+        因此只有变化格子及其 8 邻域 (affected) 的节点身份可能改变；删去经过或连接这些格子的边，
+        再从仍是节点的端点与新节点重新追踪，其余的边保持不变。
+        """
+        stride = self.grid.stride
+        affected = set()
+        for cell in changed:
+            affected.add(cell)
+            affected.update(cell + dx * stride + dy for dx, dy in _NEIGHBORS_8)
+        removed = set()
+        for cell in affected:
+            if cell in self.chain_position:
+                removed.add(self.chain_position[cell][0])
+            removed.update(link[2] for link in self.adjacency.get(cell, ()))
+        endpoints, released = set(), set()
+        for edge_id in removed:
+            a, b, cells = self._remove_edge(edge_id)
+            endpoints.update((a, b))
+            released.update(cells)
+        for cell in affected:
+            if self._is_node(cell):
+                self.adjacency.setdefault(cell, [])
+                endpoints.add(cell)
+            else:
+                self.adjacency.pop(cell, None)  # 相连的边都已删去
+        for node in sorted(endpoints):
+            if node in self.adjacency:
+                self._connect(node)
+        self._close_cycles(released | affected)
+
+    def _connect(self, node):
+        """补全节点 node 缺少的边：与相邻节点直接相连，沿约简邻接的链走到下一个节点"""
+        stride = self.grid.stride
+        links = self.adjacency[node]
+        chain_starts = set(self._chain_neighbors(node))
+        for dx, dy in _NEIGHBORS_8:
+            neighbor = node + dx * stride + dy
+            if neighbor in self.adjacency:
+                # 节点之间直接相邻，每对只加一次
+                if not any(other == neighbor and not self.edges[edge_id][2] for other, _, edge_id, _ in links):
+                    self._add_edge(node, neighbor, [])
+            elif neighbor in chain_starts and neighbor not in self.chain_position:
+                cells, end = self._trace(node, neighbor)
+                self._add_edge(node, end, cells)
+
+    def _close_cycles(self, candidates):
+        """只由度数为 2 的格子组成的孤立环没有节点：任取一格作为节点"""
+        for cell in sorted(candidates):
+            if cell in self.road_cells and cell not in self.adjacency and cell not in self.chain_position:
+                self.adjacency[cell] = []
+                self._connect(cell)
+
+    def _trace(self, start, first):
+        """从节点 start 经 first 沿约简度数为 2 的链走到下一个节点"""
+        cells, previous, current = [], start, first
+        while current not in self.adjacency:
+            cells.append(current)
+            following = [cell for cell in self._chain_neighbors(current) if cell != previous]
+            previous, current = current, following[0]
+        return cells, current
+
+    def _add_edge(self, a, b, cells):
+        sequence = [a] + cells + [b]
+        forward = sum(self._enter_cost(u, v) for u, v in zip(sequence, sequence[1:]))
+        backward = sum(self._enter_cost(v, u) for u, v in zip(sequence, sequence[1:]))
+        edge_id = next(self._edge_ids)
+        self.edges[edge_id] = (a, b, cells)
+        for k, cell in enumerate(cells):
+            self.chain_position[cell] = (edge_id, k)
+        self.adjacency[a].append((b, forward, edge_id, True))
+        self.adjacency[b].append((a, backward, edge_id, False))
+
+    def _remove_edge(self, edge_id):
+        a, b, cells = self.edges.pop(edge_id)
+        for cell in cells:
+            del self.chain_position[cell]
+        for node in (a, b):
+            if node in self.adjacency:
+                self.adjacency[node] = [link for link in self.adjacency[node] if link[2] != edge_id]
+        return a, b, cells
+
+    def _nearest_index(self, road, x0, y0):
+        """
+        有界多源扩张：road 为地图窗口 [x0:, y0:] 内的道路掩码，返回窗口内每个格子
+        在曼哈顿距离 NEAREST_ROAD_SEARCH_REACH 内最近的道路格 (扁平索引)
+        """
+        width, height = road.shape
+        stride = self.grid.stride
+        xs, ys = np.indices(road.shape)
+        nearest = np.where(road, (xs + x0 + 1) * stride + ys + y0 + 1, -1)
+        for _ in range(NEAREST_ROAD_SEARCH_REACH):
+            frontier = nearest.copy()
+            for dx, dy in _NEIGHBORS_4:
+                shifted = np.full_like(nearest, -1)
+                shifted[max(dx, 0):width + min(dx, 0), max(dy, 0):height + min(dy, 0)] = \
+                    nearest[max(-dx, 0):width + min(-dx, 0), max(-dy, 0):height + min(-dy, 0)]
+                fill = (frontier == -1) & (shifted != -1)
+                frontier[fill] = shifted[fill]
+            if np.array_equal(frontier, nearest):
+                break
+            nearest = frontier
+        return nearest
+
+    def _update_nearest_index(self, xs, ys):
+        """
+        只重算变化格子 NEAREST_ROAD_SEARCH_REACH 范围内的最近道路索引。
+        范围内格子的候选道路格都在再向外扩 REACH 的窗口里，且扩张到第 k 步只依赖距离 k 以内的格子，
+        因此在扩大的窗口上计算、只取内层结果，与整张计算完全一致。
+        """
+        reach = NEAREST_ROAD_SEARCH_REACH
+        width, height = self.nearest_road.shape
+        x0, y0 = max(int(xs.min()) - reach, 0), max(int(ys.min()) - reach, 0)
+        x1, y1 = min(int(xs.max()) + reach + 1, width), min(int(ys.max()) + reach + 1, height)
+        ex0, ey0 = max(x0 - reach, 0), max(y0 - reach, 0)
+        ex1, ey1 = min(x1 + reach, width), min(y1 + reach, height)
+        nearest = self._nearest_index(self.road_mask[ex0 + 1:ex1 + 1, ey0 + 1:ey1 + 1], ex0, ey0)
+        self.nearest_road[x0:x1, y0:y1] = nearest[x0 - ex0:x1 - ex0, y0 - ey0:y1 - ey0]
+
+    # ---------- 查询 ----------
+    def snap(self, node):
+        """返回最近的道路格 (地图坐标)，范围内没有道路时返回 None"""
+        x, y = node
+        if not (0 <= x < self.grid.width and 0 <= y < self.grid.height):
+            return None
+        index = int(self.nearest_road[x, y])
+        return self.grid.node(index) if index != -1 else None
+
+    def _attach(self, cell, outgoing):
+        """
+        把任意道路格接入图：节点直接返回自身；链内格子返回通往两端节点的临时边。
+        outgoing=True 表示从该格出发 (起点)，否则表示到达该格 (终点)。
+        返回 [(节点, 代价, 格子序列)]：
+        起点的格子序列为 cell 之后到节点 (含节点)；终点的格子序列为节点之后到 cell (含 cell)。
+        """
+        if cell in self.adjacency:
+            return [(cell, 0.0, [])]
+        edge_id, k = self.chain_position[cell]
+        a, b, cells = self.edges[edge_id]
+        towards_a = [cells[i] for i in range(k - 1, -1, -1)] + [a]
+        towards_b = cells[k + 1:] + [b]
+        links = []
+        for sequence in (towards_a, towards_b):
+            path = [cell] + sequence
+            if not outgoing:
+                path.reverse()
+            cost = sum(self._enter_cost(u, v) for u, v in zip(path, path[1:]))
+            links.append((sequence[-1], cost, path[1:]))
+        return links
+
+    def _enter_cost(self, frm, to):
+        grid = self.grid
+        dx, dy = divmod(to - frm + grid.stride + 1, grid.stride)
+        move_cost = 1.4 if (dx - 1) and (dy - 1) else 1.0
+        return move_cost * grid.scale[to] + grid.penalty[to]
+
+    def _edge_cells(self, edge_id, forward):
+        a, b, cells = self.edges[edge_id]
+        return cells + [b] if forward else cells[::-1] + [a]
+
+    def plan(self, start_node, goal_node):
+        """在道路图上做 A*，返回 (格子路径, 扩展节点数)；不可达时路径为 None"""
+        self.refresh()
+        grid = self.grid
+        start, goal = grid.index(start_node), grid.index(goal_node)
+        if start == goal:
+            return [start_node], 0
+        if start not in self.adjacency and start not in self.chain_position:
+            return None, 0
+        if goal not in self.adjacency and goal not in self.chain_position:
+            return None, 0
+
+        # 起终点在同一条链上：直接沿链走 (仍与图上路线比较)
+        direct = None
+        if start in self.chain_position and goal in self.chain_position:
+            edge_s, k_s = self.chain_position[start]
+            edge_g, k_g = self.chain_position[goal]
+            if edge_s == edge_g:
+                cells = self.edges[edge_s][2]
+                sequence = cells[k_s:k_g + 1] if k_s <= k_g else cells[k_g:k_s + 1][::-1]
+                direct = (sum(self._enter_cost(u, v) for u, v in zip(sequence, sequence[1:])), sequence[1:])
+
+        start_links = self._attach(start, outgoing=True)
+        goal_links = {node: (cost, cells) for node, cost, cells in self._attach(goal, outgoing=False)}
+        stride = grid.stride
+        gx, gy = divmod(goal, stride)
+        g_score, parent, open_heap = {}, {}, []
+        for node, cost, cells in start_links:
+            if cost < g_score.get(node, math.inf):
+                g_score[node] = cost
+                parent[node] = (None, cells)
+                nx, ny = divmod(node, stride)
+                heapq.heappush(open_heap, (cost + MIN_COST_PER_DISTANCE * math.hypot(nx - gx, ny - gy), node))
+
+        best_cost, best_end = (direct[0], None) if direct else (math.inf, None)
+        closed = set()
+        expansions = 0
+        while open_heap:
+            f, current = heapq.heappop(open_heap)
+            if f >= best_cost:
+                break
+            if current in closed:
+                continue
+            closed.add(current)
+            expansions += 1
+            if current in goal_links:
+                total = g_score[current] + goal_links[current][0]
+                if total < best_cost:
+                    best_cost, best_end = total, current
+            for neighbor, cost, edge_id, forward in self.adjacency[current]:
+                tentative = g_score[current] + cost
+                if tentative < g_score.get(neighbor, math.inf):
+                    g_score[neighbor] = tentative
+                    parent[neighbor] = (current, (edge_id, forward))
+                    nx, ny = divmod(neighbor, stride)
+                    heapq.heappush(open_heap, (tentative + MIN_COST_PER_DISTANCE * math.hypot(nx - gx, ny - gy), neighbor))
+
+        if best_cost == math.inf:
+            return None, expansions
+        if best_end is None:
+            cells = [start] + direct[1]
+        else:
+            pieces = [goal_links[best_end][1]]
+            node = best_end
+            while True:
+                previous, link = parent[node]
+                if previous is None:
+                    pieces.append(link)
+                    break
+                pieces.append(self._edge_cells(*link))
+                node = previous
+            cells = [start]
+            for piece in reversed(pieces):
+                cells.extend(piece)
+        return [grid.node(cell) for cell in cells], expansions
+
+
+def plan_path_on_roads(agent_capabilities, network: RoadNetwork, start_pos, goal_pos) -> PlanResult:
+    """road_only 智能体的规划：吸附到最近道路格后在道路图上搜索，返回结构与 plan_path 相同"""
+    network.refresh()
+    start_node = tuple(map(int, start_pos))
+    original_goal_node = tuple(map(int, goal_pos))
+    snapped_start, snapped_goal = network.snap(start_node), network.snap(original_goal_node)
+    if snapped_start is None or snapped_goal is None:
+        return PlanResult(None, float('inf'), None)
+    path, expansions = network.plan(snapped_start, snapped_goal)
+    if not path:
+        return PlanResult(None, float('inf'), None, expansions)
+    return PlanResult(path, heuristic(path[-1], original_goal_node), None, expansions)
@@ -0,0 +1,30 @@
+# sim_clock.py
+# -*- coding: utf-8 -*-
+"""
+仿真时钟模块
+仿真时间只随逻辑帧推进 (每帧固定 tick_interval 秒)，与墙钟和主机负载无关。
+可视化模式下世界引擎按墙钟节拍调用 advance()，无界面 (headless) 模式下以 CPU 允许的最快速度推进，
+两种模式下相同的帧序列得到相同的仿真时间戳。
+事件驱动模式 (EventEngine) 不按帧推进，而是用 advance_to() 直接跳到下一个事件的时刻。
+"""
+
+
+class SimClock:
+    def __init__(self, tick_interval: float, start: float = 0.0):
+        self.tick_interval = tick_interval
+        self.ticks = 0
+        self._start = start
+
+    def now(self) -> float:
+        """当前仿真时间 (秒)"""
+        return self._start + self.ticks * self.tick_interval
+
+    def advance(self, ticks: int = 1) -> float:
+        """推进若干帧，返回推进后的仿真时间"""
+        self.ticks += ticks
+        return self.now()
+
+    def advance_to(self, time: float) -> float:
+        """事件驱动模式：直接跳到仿真时刻 time (不计帧数)"""
+        self._start = time - self.ticks * self.tick_interval
+        return time
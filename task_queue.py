@@ -0,0 +1,170 @@
+# task_queue.py
+# -*- coding: utf-8 -*-
+"""
+带索引的任务优先队列模块
+取代 queue.PriorityQueue：二叉堆 + task_id -> 堆下标 的索引，
+插入、修改优先级、按 task_id 删除均为 O(log n)，查看队首为 O(1)，取前 k 个为 O(k log k)，不必排序整个队列。
+每次修改递增 version，读者 (可视化等) 可先比较版本号，只在队列变化时才读取；snapshot() 的结果按版本缓存。
+优先级为任意可比较的值 (越小越优先)，相同优先级按入队先后。
+"""
+import heapq
+import itertools
+import threading
+from collections import namedtuple
+
+# 某一版本队列的只读视图：tasks 为堆序 (非严格优先级序) 的任务元组
+QueueSnapshot = namedtuple('QueueSnapshot', ['version', 'tasks'])
+
+
+class IndexedTaskQueue:
+    def __init__(self):
+        self._heap = []                    # (优先级, 入队序号, 任务)，序号唯一，比较不会落到任务对象上
+        self._index = {}                   # task_id -> 堆下标
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self.version = 0
+        self._snapshot = QueueSnapshot(0, ())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._heap)
+
+    def __contains__(self, task_id):
+        with self._lock:
+            return task_id in self._index
+
+    def empty(self) -> bool:
+        with self._lock:
+            return not self._heap
+
+    # ---------- 修改 ----------
+    def push(self, task, priority):
+        """加入任务；task_id 是索引键，同一 task_id 已在队列中时抛出 ValueError (修改优先级请用 update())"""
+        with self._lock:
+            if task.task_id in self._index:
+                raise ValueError(f"任务 {task.task_id} 已在队列中")
+            self._heap.append((priority, next(self._sequence), task))
+            self._sift_up(len(self._heap) - 1)
+            self.version += 1
+
+    def update(self, task_id, priority) -> bool:
+        """修改任务的优先级 (保留原入队顺序)，任务不在队列中时返回 False"""
+        with self._lock:
+            position = self._index.get(task_id)
+            if position is None:
+                return False
+            self._reprioritize(position, priority)
+            self.version += 1
+            return True
+
+    def remove(self, task_id):
+        """按 task_id 删除任务并返回之，不在队列中时返回 None"""
+        with self._lock:
+            position = self._index.get(task_id)
+            if position is None:
+                return None
+            task = self._remove_at(position)
+            self.version += 1
+            return task
+
+    def pop(self):
+        """取出优先级最高的任务，队列为空时返回 None"""
+        with self._lock:
+            if not self._heap:
+                return None
+            task = self._remove_at(0)
+            self.version += 1
+            return task
+
+    # ---------- 读取 ----------
+    def peek(self):
+        """优先级最高的任务 (不取出)，队列为空时返回 None"""
+        with self._lock:
+            heap = self._heap
+            return heap[0][2] if heap else None
+
+    def get(self, task_id):
+        """按 task_id 查找队列中的任务 (不取出)，不在队列中时返回 None"""
+        with self._lock:
+            position = self._index.get(task_id)
+            return None if position is None else self._heap[position][2]
+
+    def priority(self, task_id):
+        """任务当前的优先级，不在队列中时返回 None"""
+        with self._lock:
+            position = self._index.get(task_id)
+            return None if position is None else self._heap[position][0]
+
+    def smallest(self, count: int) -> list:
+        """按优先级顺序返回前 count 个任务 (不取出)；沿堆做最优优先遍历，代价 O(count log count)"""
+        with self._lock:
+            heap = self._heap
+            result = []
+            frontier = [(heap[0], 0)] if heap and count > 0 else []
+            while frontier and len(result) < count:
+                entry, position = heapq.heappop(frontier)
+                result.append(entry[2])
+                for child in (2 * position + 1, 2 * position + 2):
+                    if child < len(heap):
+                        heapq.heappush(frontier, (heap[child], child))
+            return result
+
+    def snapshot(self) -> QueueSnapshot:
+        """当前版本的只读视图；队列未变化时直接返回缓存，不复制"""
+        with self._lock:
+            if self._snapshot.version != self.version:
+                self._snapshot = QueueSnapshot(self.version, tuple(entry[2] for entry in self._heap))
+            return self._snapshot
+
+    # ---------- 堆操作 (调用方持有锁) ----------
+    def _reprioritize(self, position, priority):
+        old_priority, sequence, task = self._heap[position]
+        self._heap[position] = (priority, sequence, task)
+        if priority < old_priority:
+            self._sift_up(position)
+        else:
+            self._sift_down(position)
+
+    def _remove_at(self, position):
+        heap = self._heap
+        task = heap[position][2]
+        del self._index[task.task_id]
+        last = heap.pop()
+        if position < len(heap):
+            heap[position] = last
+            self._index[last[2].task_id] = position
+            # 被换上来的末尾元素可能需要上浮或下沉
+            self._sift_up(position)
+            self._sift_down(self._index[last[2].task_id])
+        return task
+
+    def _sift_up(self, position):
+        heap, index = self._heap, self._index
+        entry = heap[position]
+        while position > 0:
+            parent = (position - 1) >> 1
+            if not entry < heap[parent]:
+                break
+            heap[position] = heap[parent]
+            index[heap[position][2].task_id] = position
+            position = parent
+        heap[position] = entry
+        index[entry[2].task_id] = position
+
+    def _sift_down(self, position):
+        heap, index = self._heap, self._index
+        size = len(heap)
+        entry = heap[position]
+        while True:
+            child = 2 * position + 1
+            if child >= size:
+                break
+            if child + 1 < size and heap[child + 1] < heap[child]:
+                child += 1
+            if not heap[child] < entry:
+                break
+            heap[position] = heap[child]
+            index[heap[position][2].task_id] = position
+            position = child
+        heap[position] = entry
+        index[entry[2].task_id] = position
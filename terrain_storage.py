@@ -0,0 +1,23 @@
+# terrain_storage.py
+# -*- coding: utf-8 -*-
+"""
+地形数组存储模块
+真实地图与知识地图的地形统一用 uint8 存储 (ID 表见 config.py)。
+超大地图可以改由内存映射的临时文件承载，物理内存只保留正在访问的页。
+"""
+import tempfile
+import numpy as np
+from config import TERRAIN_DTYPE
+
+
+def allocate_terrain(width, height, fill, memmap_dir=None) -> np.ndarray:
+    """
+    分配 (width, height) 的地形数组并填充为 fill。
+    memmap_dir 不为 None 时使用该目录下的匿名临时文件做内存映射 (文件随数组释放而删除)。
+    """
+    if memmap_dir is None:
+        return np.full((width, height), fill, dtype=TERRAIN_DTYPE)
+    backing = tempfile.TemporaryFile(dir=memmap_dir)
+    terrain = np.memmap(backing, dtype=TERRAIN_DTYPE, mode='w+', shape=(width, height))
+    terrain[:] = fill
+    return terrain
@@ -0,0 +1,55 @@
+# tests/conftest.py
+# -*- coding: utf-8 -*-
+"""测试公共设置：项目模块平铺在仓库根目录，把根目录加入导入路径；并提供构造小地图与参考最短路的工具"""
+import heapq
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import TERRAIN_TYPES  # noqa: E402
+from knowledge_base import SharedKnowledgeMap  # noqa: E402
+
+
+@pytest.fixture
+def make_knowledge_map():
+    """按地形 ID 数组 (或尺寸 + 默认地形) 构造一张已完全揭示的 SharedKnowledgeMap"""
+    def make(terrain=None, width=None, height=None, fill='normal'):
+        if terrain is None:
+            terrain = np.full((width, height), TERRAIN_TYPES[fill], dtype=np.uint8)
+        knowledge_map = SharedKnowledgeMap(*terrain.shape)
+        knowledge_map.apply_fragment((0, 0), np.asarray(terrain, dtype=np.uint8))
+        return knowledge_map
+    return make
+
+
+def grid_path_cost(grid, path):
+    """按 CostGrid 的进入代价规则累加一条逐格路径的代价"""
+    cost = 0.0
+    for a, b in zip(path, path[1:]):
+        index = grid.index(b)
+        move = 1.4 if a[0] != b[0] and a[1] != b[1] else 1.0
+        cost += move * grid.scale[index] + grid.penalty[index]
+    return cost
+
+
+def grid_dijkstra(grid, start_node):
+    """参考实现：从 start_node 出发的朴素 Dijkstra，返回 {扁平索引: 最短代价}"""
+    start = grid.index(start_node)
+    dist = {start: 0.0}
+    heap = [(0.0, start)]
+    while heap:
+        d, cell = heapq.heappop(heap)
+        if d > dist[cell]:
+            continue
+        for offset, move in grid.neighbor_offsets:
+            n = cell + offset
+            if grid.penalty[n] < 0:
+                continue
+            nd = d + move * grid.scale[n] + grid.penalty[n]
+            if nd < dist.get(n, float('inf')):
+                dist[n] = nd
+                heapq.heappush(heap, (nd, n))
+    return dist
@@ -0,0 +1,89 @@
+# tests/test_assignment.py
+# -*- coding: utf-8 -*-
+"""最小代价指派：与小规模穷举结果对照，覆盖矩形矩阵、不可行配对与整行/整列不可行"""
+import itertools
+import numpy as np
+import pytest
+from assignment import solve_assignment, INF
+
+
+def brute_force(cost):
+    """穷举所有一对一配对：先使可行配对数最多，再使总代价最小，返回 (配对数, 总代价)"""
+    cost = np.asarray(cost, dtype=float)
+    rows, cols = cost.shape
+    if rows > cols:
+        return brute_force(cost.T)
+    best = (0, 0.0)
+    for columns in itertools.permutations(range(cols), rows):
+        values = [cost[i, j] for i, j in enumerate(columns) if np.isfinite(cost[i, j])]
+        candidate = (len(values), sum(values))
+        if candidate[0] > best[0] or (candidate[0] == best[0] and candidate[1] < best[1]):
+            best = candidate
+    return best
+
+
+def _check(cost, pairs):
+    cost = np.asarray(cost, dtype=float)
+    rows = [i for i, _ in pairs]
+    cols = [j for _, j in pairs]
+    assert len(set(rows)) == len(rows) and len(set(cols)) == len(cols)
+    assert pairs == sorted(pairs)
+    assert all(np.isfinite(cost[i, j]) for i, j in pairs)
+    count, total = brute_force(cost)
+    assert len(pairs) == count
+    assert sum(cost[i, j] for i, j in pairs) == pytest.approx(total)
+
+
+def test_square():
+    cost = [[4, 1, 3], [2, 0, 5], [3, 2, 2]]
+    pairs = solve_assignment(cost)
+    assert pairs == [(0, 1), (1, 0), (2, 2)]
+    _check(cost, pairs)
+
+
+@pytest.mark.parametrize('shape', [(2, 5), (5, 2), (1, 4), (4, 1), (3, 6), (6, 3)])
+def test_rectangular(shape):
+    rng = np.random.default_rng(sum(shape))
+    cost = rng.uniform(0, 100, size=shape)
+    pairs = solve_assignment(cost)
+    assert len(pairs) == min(shape)
+    _check(cost, pairs)
+
+
+def test_all_infeasible_row_is_left_out():
+    cost = [[1, 2, 3], [INF, INF, INF], [3, 1, 2]]
+    pairs = solve_assignment(cost)
+    assert [i for i, _ in pairs] == [0, 2]
+    _check(cost, pairs)
+
+
+def test_all_infeasible_column_is_left_out():
+    cost = [[1, INF, 3], [2, INF, 1]]
+    pairs = solve_assignment(cost)
+    assert [j for _, j in pairs] in ([0, 2], [2, 0])
+    _check(cost, pairs)
+
+
+def test_all_infeasible_matrix():
+    assert solve_assignment([[INF, INF], [INF, INF]]) == []
+
+
+def test_empty_inputs():
+    assert solve_assignment([]) == []
+    assert solve_assignment(np.zeros((0, 3))) == []
+    assert solve_assignment([1, 2, 3]) == []
+
+
+def test_feasible_count_beats_cost():
+    # 贪心取 (0, 0) 会让第 1 行无处可去；最优解必须让出这一列
+    cost = [[1, 50], [2, INF]]
+    assert solve_assignment(cost) == [(0, 1), (1, 0)]
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    rows, cols = rng.integers(1, 6, size=2)
+    cost = rng.integers(-5, 30, size=(rows, cols)).astype(float)  # 含负代价与大量并列
+    cost[rng.random((rows, cols)) < rng.uniform(0, 0.6)] = INF
+    _check(cost, solve_assignment(cost))
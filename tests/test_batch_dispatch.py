@@ -0,0 +1,77 @@
+# tests/test_batch_dispatch.py
+# -*- coding: utf-8 -*-
+"""批量指派的时间窗处理：求解前复查截止时刻，余量小的任务在智能体不够时先被分配"""
+import pytest
+from config import PLANNING_CONFIG, SCHEDULING_CONFIG
+from delivery_task import DeliveryTask
+from map_system import Map
+from multi_agent_coordination import MultiAgentCoordinationSystem
+
+
+@pytest.fixture(scope='module')
+def real_map():
+    return Map(seed=11, cache_dir=None)
+
+
+@pytest.fixture
+def coord(real_map, monkeypatch):
+    monkeypatch.setitem(PLANNING_CONFIG, 'dispatch_mode', 'batch')
+    coord = MultiAgentCoordinationSystem(real_map)
+    # 只留一个机器狗空闲，两个任务争同一个智能体
+    for agent in coord.agents.values():
+        if agent.agent_id != 'robot_dog_1':
+            agent.state = 'delivering'
+    return coord
+
+
+def _tasks():
+    # NEAR 离仓库更近 (代价更低) 但没有时间窗；FAR 更远，需在 10 秒内送达
+    near = DeliveryTask.from_config({'id': 'NEAR', 'goal_pos': [20, 25], 'weight': 25, 'urgency': 3})
+    far = DeliveryTask.from_config({'id': 'FAR', 'goal_pos': [40, 15], 'weight': 25, 'urgency': 3, 'time_window': [0, 10]})
+    return near, far
+
+
+@pytest.mark.parametrize('ordering', ['slack', 'edf'])
+def test_tight_window_is_served_first(coord, monkeypatch, ordering):
+    monkeypatch.setitem(SCHEDULING_CONFIG, 'task_ordering', ordering)
+    near, far = _tasks()
+    coord.add_task(near)
+    coord.add_task(far)
+    coord.dispatch()
+    assert coord.agents['robot_dog_1'].current_task is far
+    assert list(coord.main_task_queue.snapshot().tasks) == [near]
+
+
+def test_urgency_ordering_uses_cost_only(coord, monkeypatch):
+    monkeypatch.setitem(SCHEDULING_CONFIG, 'task_ordering', 'urgency')
+    near, far = _tasks()
+    coord.add_task(near)
+    coord.add_task(far)
+    coord.dispatch()
+    assert coord.agents['robot_dog_1'].current_task is near
+
+
+def test_deadline_rechecked_before_solving(coord, monkeypatch):
+    monkeypatch.setitem(SCHEDULING_CONFIG, 'infeasible_policy', 'reject')
+    near, far = _tasks()
+    coord.add_task(near)
+    coord.add_task(far)
+    assert len(coord.main_task_queue) == 2
+    # 入队时可行；到 9.9s 时从仓库出发已赶不上截止时刻，复查时间窗的间隔还没到也要在求解前拒绝
+    coord._eta_refreshed_at = coord.clock.advance_to(9.9)
+    coord.dispatch()
+    assert [entry[:2] for entry in coord.rejected_tasks] == [('FAR', 'deadline_infeasible')]
+    assert coord.agents['robot_dog_1'].current_task is near
+    assert coord.main_task_queue.empty()
+
+
+def test_infeasible_task_escalated_in_batch(coord, monkeypatch):
+    monkeypatch.setitem(SCHEDULING_CONFIG, 'infeasible_policy', 'escalate')
+    near, far = _tasks()
+    coord.add_task(near)
+    coord.add_task(far)
+    coord._eta_refreshed_at = coord.clock.advance_to(9.9)
+    coord.dispatch()
+    assert far.escalated
+    assert coord.agents['robot_dog_1'].current_task is far
+    assert not coord.rejected_tasks
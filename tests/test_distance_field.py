@@ -0,0 +1,80 @@
+# tests/test_distance_field.py
+# -*- coding: utf-8 -*-
+"""代价场：知识地图分批揭示 (进入代价有升有降) 后，增量修复的结果与整张重算一致"""
+import numpy as np
+import pytest
+from config import TERRAIN_TYPES
+from distance_field import DistanceField, INF
+from knowledge_base import SharedKnowledgeMap
+from conftest import grid_path_cost
+
+GROUND = {"climb_height": 2, "can_cross_water": False}
+ROAD_ONLY = {"road_only": True, "climb_height": 0, "can_cross_water": False}
+# 未知格对地面智能体的进入代价是 10：揭示为普通/丘陵/道路会降低代价，揭示为水域/陡坡则变为不可通行
+REVEALED = np.array([TERRAIN_TYPES[name] for name in ('normal', 'normal', 'hilly', 'road', 'road', 'water', 'steep')],
+                    dtype=np.uint8)
+
+
+def _assert_matches_full_rebuild(field, rules, knowledge_map):
+    reference = DistanceField(rules, knowledge_map, field.root)
+    reference.refresh()
+    assert field.grid is reference.grid
+    incremental, full = np.array(field.dist), np.array(reference.dist)
+    assert np.array_equal(incremental == INF, full == INF)
+    finite = full != INF
+    assert np.allclose(incremental[finite], full[finite])
+    # 下一跳链给出的路径代价与距离值一致
+    for x in range(0, knowledge_map.width, 3):
+        for y in range(0, knowledge_map.height, 3):
+            path = field.path_from((x, y))
+            if path is None:
+                assert field.cost_from((x, y)) == INF
+            else:
+                assert path[-1] == field.root
+                assert grid_path_cost(field.grid, path) == pytest.approx(field.cost_from((x, y)))
+
+
+@pytest.mark.parametrize('rules', [GROUND, ROAD_ONLY], ids=['ground', 'road_only'])
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_incremental_repair_equals_full_recompute(rules, seed):
+    rng = np.random.default_rng(seed)
+    width, height = 36, 28
+    truth = REVEALED[rng.integers(0, len(REVEALED), size=(width, height))]
+    root = (width // 2, height // 2)
+    truth[root] = TERRAIN_TYPES['road']
+    knowledge_map = SharedKnowledgeMap(width, height)
+    # 初始只知道根附近的一块
+    knowledge_map.apply_fragment((root[0] - 4, root[1] - 4), truth[root[0] - 4:root[0] + 5, root[1] - 4:root[1] + 5])
+    field = DistanceField(rules, knowledge_map, root)
+    field.refresh()
+    for _ in range(12):
+        # 每批揭示一个随机矩形中的随机一部分格子
+        x0, y0 = rng.integers(0, width - 4), rng.integers(0, height - 4)
+        w, h = rng.integers(3, 12), rng.integers(3, 12)
+        x1, y1 = min(x0 + w, width), min(y0 + h, height)
+        mask = rng.random((x1 - x0, y1 - y0)) < 0.7
+        knowledge_map.apply_fragment((x0, y0), truth[x0:x1, y0:y1], mask)
+        field.refresh()
+        _assert_matches_full_rebuild(field, rules, knowledge_map)
+    assert field.full_rebuilds == 1
+    assert field.incremental_updates > 0
+
+
+def test_blocked_corridor_is_rerouted():
+    # 一条未知走廊是唯一的捷径；揭示为水域后，经过它的整棵子树都要改走绕行路线
+    width, height = 30, 40
+    truth = np.full((width, height), TERRAIN_TYPES['normal'], dtype=np.uint8)
+    truth[15, :] = TERRAIN_TYPES['water']
+    truth[15, 0] = TERRAIN_TYPES['normal']
+    knowledge_map = SharedKnowledgeMap(width, height)
+    known = np.ones((width, height), dtype=bool)
+    known[15, 18:22] = False
+    knowledge_map.apply_fragment((0, 0), truth, known)
+    field = DistanceField(GROUND, knowledge_map, (2, 20))
+    before = field.cost_from((28, 20))
+    knowledge_map.apply_fragment((15, 18), truth[15:16, 18:22])
+    after = field.cost_from((28, 20))
+    assert after > before
+    assert (15, 0) in field.path_from((28, 20))
+    assert field.incremental_updates == 1
+    _assert_matches_full_rebuild(field, GROUND, knowledge_map)
@@ -0,0 +1,70 @@
+# tests/test_event_engine.py
+# -*- coding: utf-8 -*-
+"""离散事件引擎：只在能揭示新地形时排定 sense 事件，路径被修复后按新路径重新排定 move 事件"""
+import collections
+import os
+import pytest
+from event_engine import EventEngine, MOVING_STATES
+from main import load_tasks_from_yaml
+from map_system import Map
+from multi_agent_coordination import MultiAgentCoordinationSystem
+
+TASKS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tasks.yaml')
+
+
+class CheckedEngine(EventEngine):
+    """统计各类事件的排定次数，并在每次修复/分配之后检查已排定的事件都对应智能体当前的路径"""
+    def __init__(self, coordination_system):
+        super().__init__(coordination_system)
+        self.scheduled = collections.Counter()
+        self.rescheduled_after_repair = 0
+
+    def schedule(self, time, kind, data=None):
+        self.scheduled[kind] += 1
+        super().schedule(time, kind, data)
+
+    def _reschedule_changed_paths(self, time):
+        before = dict(self._move_tokens)
+        super()._reschedule_changed_paths(time)
+        self.rescheduled_after_repair += sum(1 for agent_id, token in self._move_tokens.items()
+                                             if before.get(agent_id, token) != token)
+        for agent_id, path in self._move_paths.items():
+            agent = self.coord.agents[agent_id]
+            assert agent.state in MOVING_STATES and agent.vehicle.path is path
+
+
+@pytest.fixture(scope='module')
+def tasks():
+    return load_tasks_from_yaml(TASKS_FILE)
+
+
+def _coordinator(tasks, reveal_all=False):
+    real_map = Map(seed=11, cache_dir=None)
+    coord = MultiAgentCoordinationSystem(real_map)
+    if reveal_all:
+        coord.knowledge_map.apply_fragment((0, 0), real_map.terrain)
+    for task in tasks:
+        coord.add_task(task)
+    return coord
+
+
+def test_repairs_reschedule_moves(tasks):
+    coord = _coordinator(tasks)
+    engine = CheckedEngine(coord)
+    summary = engine.run()
+    assert summary['stop_reason'] == 'completed'
+    assert summary['completed_tasks'] == len(tasks)
+    assert coord.path_repairs > 0
+    assert engine.rescheduled_after_repair > 0
+    assert engine.scheduled['sense'] > 0
+    assert not engine._move_tokens  # 结束时没有残留的移动
+
+
+def test_known_map_needs_no_sensing(tasks):
+    coord = _coordinator(tasks, reveal_all=True)
+    engine = CheckedEngine(coord)
+    summary = engine.run()
+    assert summary['stop_reason'] == 'completed'
+    assert summary['completed_tasks'] == len(tasks)
+    assert engine.scheduled['sense'] == 0
+    assert engine.scheduled['replan'] == 0
@@ -0,0 +1,51 @@
+# tests/test_headless.py
+# -*- coding: utf-8 -*-
+"""无界面回归：固定种子的小地图上跑完整任务集，检查完成数与停止原因 (逐帧与离散事件两种引擎)"""
+import os
+import pytest
+from main import load_tasks_from_yaml
+from map_system import Map
+from multi_agent_coordination import MultiAgentCoordinationSystem
+from delivery_task import DeliveryTask
+
+TASKS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tasks.yaml')
+SEED = 11
+
+
+@pytest.fixture(scope='module')
+def tasks():
+    return load_tasks_from_yaml(TASKS_FILE)
+
+
+def _coordinator(tasks):
+    coord = MultiAgentCoordinationSystem(Map(seed=SEED, cache_dir=None))
+    for task in tasks:
+        coord.add_task(task)
+    return coord
+
+
+@pytest.mark.parametrize('engine', ['tick', 'event'])
+def test_seeded_run_completes_all_tasks(tasks, engine):
+    coord = _coordinator(tasks)
+    summary = coord.run_headless(None, engine)
+    assert summary['stop_reason'] == 'completed'
+    assert summary['completed_tasks'] == len(tasks)  # 中转任务的第一程不计入完成数
+    assert summary['pending_tasks'] == 0
+    assert not coord.is_running
+
+
+@pytest.mark.parametrize('engine', ['tick', 'event'])
+def test_max_time_stops_early(tasks, engine):
+    summary = _coordinator(tasks).run_headless(5.0, engine)
+    assert summary['stop_reason'] == 'max_time'
+    assert summary['sim_time'] <= 5.0 + 1e-9
+    assert summary['completed_tasks'] < len(tasks)
+
+
+@pytest.mark.parametrize('engine', ['tick', 'event'])
+def test_unassignable_task_stalls(engine):
+    task = DeliveryTask.from_config({'id': 'TOO_HEAVY', 'goal_pos': [30, 30], 'weight': 1000.0, 'urgency': 1})
+    summary = _coordinator([task]).run_headless(None, engine)
+    assert summary['stop_reason'] == 'stalled'
+    assert summary['completed_tasks'] == 0
+    assert summary['pending_tasks'] == 1
@@ -0,0 +1,108 @@
+# tests/test_incremental_planner.py
+# -*- coding: utf-8 -*-
+"""D* Lite：地图揭示改变边代价 (起点同时前移) 后，修复出的路径代价与重新搜索一致；预算耗尽后可继续"""
+import numpy as np
+import pytest
+from config import TERRAIN_TYPES
+from cost_grid import get_cost_grid
+from incremental_planner import IncrementalPlanner
+from knowledge_base import SharedKnowledgeMap
+from path_planning import plan_path, PLAN_FOUND, PLAN_UNREACHABLE, PLAN_BUDGET_EXCEEDED
+from conftest import grid_path_cost, grid_dijkstra
+
+GROUND = {"climb_height": 2, "can_cross_water": False}
+WITHOUT_ROADS = ('normal', 'normal', 'hilly', 'water', 'steep')
+WITH_ROADS = WITHOUT_ROADS + ('road', 'road')
+
+
+def _setup(seed, names, width=32, height=26):
+    rng = np.random.default_rng(seed)
+    truth = np.array([TERRAIN_TYPES[n] for n in names], dtype=np.uint8)[rng.integers(0, len(names), (width, height))]
+    start, goal = (0, 0), (width - 1, height - 1)
+    truth[start] = truth[goal] = TERRAIN_TYPES['normal']
+    knowledge_map = SharedKnowledgeMap(width, height)
+    planner = IncrementalPlanner(GROUND, knowledge_map, goal)
+    knowledge_map.add_change_listener(lambda xs, ys, bounds: planner.notify(xs, ys))
+    return rng, truth, knowledge_map, planner, start, goal
+
+
+def _optimal_cost(knowledge_map, start, goal):
+    grid = get_cost_grid(GROUND, knowledge_map)
+    # 反向边代价由被进入的格子决定，从起点正向求即可
+    return grid_dijkstra(grid, start).get(grid.index(goal), float('inf'))
+
+
+def _reveal_batches(rng, truth, knowledge_map, planner, start, goal, check):
+    """分批揭示地图；每批之后起点沿当前路径前进几步再修复，并交给 check 比较结果"""
+    width, height = truth.shape
+    path, status = planner.plan(start)
+    assert status == PLAN_FOUND
+    for _ in range(15):
+        x0, y0 = rng.integers(0, width - 3), rng.integers(0, height - 3)
+        x1, y1 = min(x0 + rng.integers(3, 10), width), min(y0 + rng.integers(3, 10), height)
+        knowledge_map.apply_fragment((x0, y0), truth[x0:x1, y0:y1])
+        if path and len(path) > 3:
+            start = path[int(rng.integers(0, 3))]
+        path, status = planner.plan(start)
+        check(path, status, start)
+        if status != PLAN_FOUND:
+            break
+    assert planner.repairs > 0
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_repaired_cost_equals_fresh_a_star(seed):
+    # 没有道路时 A* 的欧氏启发式可采纳，重新运行的 A* 给出精确最优代价
+    rng, truth, knowledge_map, planner, start, goal = _setup(seed, WITHOUT_ROADS)
+
+    def check(path, status, start):
+        fresh = plan_path({"terrain_rules": GROUND}, knowledge_map, start, goal)
+        grid = get_cost_grid(GROUND, knowledge_map)
+        if fresh.status != PLAN_FOUND:
+            assert status == PLAN_UNREACHABLE and path is None
+            return
+        assert status == PLAN_FOUND
+        assert path[0] == start and path[-1] == goal
+        assert grid_path_cost(grid, path) == pytest.approx(grid_path_cost(grid, fresh.path))
+        assert grid_path_cost(grid, path) == pytest.approx(_optimal_cost(knowledge_map, start, goal))
+
+    _reveal_batches(rng, truth, knowledge_map, planner, start, goal, check)
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_repaired_cost_is_optimal_with_roads(seed):
+    rng, truth, knowledge_map, planner, start, goal = _setup(seed, WITH_ROADS)
+
+    def check(path, status, start):
+        optimal = _optimal_cost(knowledge_map, start, goal)
+        if optimal == float('inf'):
+            assert status == PLAN_UNREACHABLE and path is None
+            return
+        assert status == PLAN_FOUND
+        assert grid_path_cost(get_cost_grid(GROUND, knowledge_map), path) == pytest.approx(optimal)
+
+    _reveal_batches(rng, truth, knowledge_map, planner, start, goal, check)
+
+
+def test_budget_exceeded_resumes_to_same_result():
+    rng, truth, knowledge_map, planner, start, goal = _setup(7, WITHOUT_ROADS, width=40, height=40)
+    knowledge_map.apply_fragment((0, 0), truth[:20, :20])
+    reference = IncrementalPlanner(GROUND, knowledge_map, goal)
+    expected, _ = reference.plan(start)
+    calls = 0
+    while True:
+        path, status = planner.plan(start, max_expansions=50)
+        calls += 1
+        if status != PLAN_BUDGET_EXCEEDED:
+            break
+        assert path is None
+    assert calls > 1
+    assert status == PLAN_FOUND
+    grid = get_cost_grid(GROUND, knowledge_map)
+    assert grid_path_cost(grid, path) == pytest.approx(grid_path_cost(grid, expected))
+    assert planner.expansions >= reference.expansions
+
+
+def test_start_outside_map_is_unreachable():
+    _, _, _, planner, _, _ = _setup(0, WITHOUT_ROADS, width=10, height=10)
+    assert planner.plan((-1, 4)) == (None, PLAN_UNREACHABLE)
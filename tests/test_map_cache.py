@@ -0,0 +1,91 @@
+# tests/test_map_cache.py
+# -*- coding: utf-8 -*-
+"""地图磁盘缓存：保存/读取往返、写时复制，以及截断和损坏文件的处理"""
+import struct
+import numpy as np
+import pytest
+from map_cache import MAGIC, FORMAT_VERSION, save_map, load_map, cache_path
+from map_system import Map, GENERATOR_VERSION
+from config import MAP_CONFIG
+
+
+@pytest.fixture
+def terrain():
+    return np.random.default_rng(0).integers(0, 6, size=(37, 23), dtype=np.uint8)
+
+
+@pytest.fixture
+def saved(tmp_path, terrain):
+    path = str(tmp_path / "map.bin")
+    save_map(path, terrain, {"seed": 7, "buildings": [[1, 2, 3, 4]]})
+    return path
+
+
+def test_round_trip(saved, terrain):
+    loaded, metadata = load_map(saved)
+    assert loaded.shape == terrain.shape
+    assert np.array_equal(loaded, terrain)
+    assert metadata["width"] == 37 and metadata["height"] == 23
+    assert metadata["seed"] == 7 and metadata["buildings"] == [[1, 2, 3, 4]]
+
+
+def test_loaded_terrain_is_writable_copy_on_write(saved, terrain):
+    loaded, _ = load_map(saved)
+    loaded[0, 0] = 200
+    loaded[5:10, 5:10] = 0
+    assert loaded[0, 0] == 200
+    reloaded, _ = load_map(saved)
+    assert np.array_equal(reloaded, terrain)  # 写入不落盘
+
+
+def test_save_rejects_out_of_range_ids(tmp_path):
+    with pytest.raises(ValueError):
+        save_map(str(tmp_path / "bad.bin"), np.full((4, 4), 300), {})
+    assert not list(tmp_path.iterdir())
+
+
+def test_missing_file(tmp_path):
+    assert load_map(str(tmp_path / "missing.bin")) is None
+
+
+@pytest.mark.parametrize("keep", [0, 3, 8, 20, -1])
+def test_truncated_file(saved, keep):
+    with open(saved, 'rb') as f:
+        data = f.read()
+    with open(saved, 'wb') as f:
+        f.write(data[:keep] if keep >= 0 else data[:-1])
+    assert load_map(saved) is None
+
+
+def test_corrupt_magic(saved):
+    with open(saved, 'r+b') as f:
+        f.write(b'XXXX')
+    assert load_map(saved) is None
+
+
+def test_unknown_format_version(saved):
+    with open(saved, 'r+b') as f:
+        f.write(struct.pack('<4sI', MAGIC, FORMAT_VERSION + 1))
+    assert load_map(saved) is None
+
+
+@pytest.mark.parametrize("header", [b'{not json', b'\xff\xfe', b'[]', b'{"width": 4}', b'{"width": "a", "height": 2}'])
+def test_corrupt_header(tmp_path, header):
+    path = tmp_path / "corrupt.bin"
+    path.write_bytes(struct.pack('<4sII', MAGIC, FORMAT_VERSION, len(header)) + header + b'\0' * 256)
+    assert load_map(str(path)) is None
+
+
+def test_cache_path_depends_on_generator_version(tmp_path):
+    a = cache_path(str(tmp_path), 40, 40, 1, MAP_CONFIG, GENERATOR_VERSION)
+    b = cache_path(str(tmp_path), 40, 40, 1, MAP_CONFIG, GENERATOR_VERSION + 1)
+    assert a != b
+
+
+def test_map_reloads_from_cache(tmp_path):
+    generated = Map(width=40, height=40, seed=3, cache_dir=str(tmp_path))
+    cached = Map(width=40, height=40, seed=3, cache_dir=str(tmp_path))
+    assert np.array_equal(np.asarray(cached.terrain), np.asarray(generated.terrain))
+    assert cached.buildings == generated.buildings
+    assert cached.warehouse == generated.warehouse
+    cached.terrain[0, 0] = 0  # 从缓存加载的地形可以直接修改
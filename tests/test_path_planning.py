@@ -0,0 +1,170 @@
+# tests/test_path_planning.py
+# -*- coding: utf-8 -*-
+"""A* 规划：三种结果状态、单次与共享预算的耗尽、不可达目标，以及不同尺寸地图之间的搜索缓冲区复用"""
+import threading
+import time
+import numpy as np
+import pytest
+from config import TERRAIN_TYPES
+from cost_grid import get_cost_grid, MIN_COST_PER_DISTANCE
+from path_planning import (plan_path, grid_a_star, a_star_planning, PlanningBudget, DEADLINE_CHECK_INTERVAL,
+                           PLAN_FOUND, PLAN_UNREACHABLE, PLAN_BUDGET_EXCEEDED)
+from conftest import grid_path_cost, grid_dijkstra
+
+GROUND = {"terrain_rules": {"climb_height": 2, "can_cross_water": False}}
+ROAD_ONLY = {"terrain_rules": {"road_only": True, "climb_height": 0, "can_cross_water": False}}
+
+
+def _mixed_terrain(width, height, seed=0, names=('normal', 'hilly', 'road')):
+    """随机的普通/丘陵/道路混合地形 (地面智能体全部可通行，但代价各不相同)"""
+    rng = np.random.default_rng(seed)
+    choices = np.array([TERRAIN_TYPES[name] for name in names], dtype=np.uint8)
+    return choices[rng.integers(0, len(choices), size=(width, height))]
+
+
+def _assert_near_optimal(grid, path, start, goal):
+    """
+    路径逐格相连且代价不低于最优值。启发式取欧氏距离，在道路 (代价系数 0.8) 上会高估，
+    因此最优性只在 1 / MIN_COST_PER_DISTANCE 倍以内有保证 (加权 A* 的界)。
+    """
+    assert path[0] == start and path[-1] == goal
+    assert all(max(abs(a[0] - b[0]), abs(a[1] - b[1])) == 1 for a, b in zip(path, path[1:]))
+    assert all(grid.is_passable(node) for node in path)
+    optimal = grid_dijkstra(grid, start)[grid.index(goal)]
+    cost = grid_path_cost(grid, path)
+    assert optimal - 1e-9 <= cost <= optimal / MIN_COST_PER_DISTANCE + 1e-9
+
+
+def _walled(width, height, gap=None):
+    """x = width // 2 处一道水墙，gap 给出时在该 y 处留一个缺口"""
+    terrain = np.full((width, height), TERRAIN_TYPES['normal'], dtype=np.uint8)
+    terrain[width // 2, :] = TERRAIN_TYPES['water']
+    if gap is not None:
+        terrain[width // 2, gap] = TERRAIN_TYPES['normal']
+    return terrain
+
+
+def test_found_path_is_optimal(make_knowledge_map):
+    # 不含道路时欧氏启发式可采纳，A* 给出精确最优路径
+    knowledge_map = make_knowledge_map(_mixed_terrain(30, 25, names=('normal', 'hilly')))
+    result = plan_path(GROUND, knowledge_map, (0, 0), (29, 24))
+    assert result.status == PLAN_FOUND
+    assert result.path[0] == (0, 0) and result.path[-1] == (29, 24)
+    assert result.final_distance == 0
+    grid = get_cost_grid(GROUND["terrain_rules"], knowledge_map)
+    optimal = grid_dijkstra(grid, (0, 0))[grid.index((29, 24))]
+    assert grid_path_cost(grid, result.path) == pytest.approx(optimal)
+
+
+def test_unreachable_goal_falls_back_to_closest_point(make_knowledge_map):
+    knowledge_map = make_knowledge_map(_walled(20, 15))
+    result = plan_path(GROUND, knowledge_map, (2, 7), (17, 7))
+    assert result.status == PLAN_UNREACHABLE
+    # 非 road_only 回退到离目标最近的可达点 (水墙前一列)
+    assert result.path[-1] == (9, 7)
+    assert result.final_distance == pytest.approx(8.0)
+    # 搜索完整地结束：可达的半张地图全部被扩展 (斜向代价 1.4 略小于欧氏距离，少数节点会被重新扩展)
+    assert result.expansions >= 10 * 15
+
+
+def test_unreachable_road_only_returns_no_path(make_knowledge_map):
+    terrain = np.full((20, 15), TERRAIN_TYPES['normal'], dtype=np.uint8)
+    terrain[:8, 5] = TERRAIN_TYPES['road']
+    terrain[12:, 5] = TERRAIN_TYPES['road']
+    knowledge_map = make_knowledge_map(terrain)
+    result = plan_path(ROAD_ONLY, knowledge_map, (0, 5), (19, 5))
+    assert result.path is None
+    assert result.status == PLAN_UNREACHABLE
+    assert result.final_distance == float('inf')
+    assert a_star_planning(ROAD_ONLY, knowledge_map, (0, 5), (19, 5)) == (None, float('inf'))
+
+
+def test_gap_makes_goal_reachable(make_knowledge_map):
+    knowledge_map = make_knowledge_map(_walled(20, 15, gap=0))
+    result = plan_path(GROUND, knowledge_map, (2, 7), (17, 7))
+    assert result.status == PLAN_FOUND
+    assert (10, 0) in result.path
+
+
+def test_per_call_expansion_limit(make_knowledge_map):
+    knowledge_map = make_knowledge_map(width=40, height=40)
+    result = plan_path(GROUND, knowledge_map, (0, 0), (39, 39), max_expansions=10)
+    assert result.status == PLAN_BUDGET_EXCEEDED
+    assert result.expansions == 10
+    # 部分路径从起点出发，朝目标推进
+    assert result.path[0] == (0, 0)
+    assert 0 < result.final_distance < np.hypot(39, 39)
+    path, distance = a_star_planning(GROUND, knowledge_map, (0, 0), (39, 39), max_expansions=10)
+    assert path == result.path and distance == result.final_distance
+
+
+def test_shared_budget_is_exhausted_across_calls(make_knowledge_map):
+    knowledge_map = make_knowledge_map(width=40, height=40)
+    budget = PlanningBudget(max_expansions=25)
+    first = plan_path(GROUND, knowledge_map, (0, 0), (39, 39), budget)
+    assert first.status == PLAN_BUDGET_EXCEEDED and first.expansions == 25
+    assert budget.exceeded and budget.used == 25 and budget.calls == 1
+    # 本轮已无剩余额度：下一次调用不扩展任何节点
+    second = plan_path(GROUND, knowledge_map, (5, 5), (6, 6), budget)
+    assert second.status == PLAN_BUDGET_EXCEEDED and second.expansions == 0
+    assert budget.allowance() == (0, None)
+    # 解除共享限制后单次上限仍然有效
+    budget.lift()
+    assert not budget.exceeded
+    assert plan_path(GROUND, knowledge_map, (0, 0), (39, 39), budget).status == PLAN_FOUND
+    assert plan_path(GROUND, knowledge_map, (0, 0), (39, 39), budget, max_expansions=5).expansions == 5
+    budget.reset()
+    assert budget.used == 0 and budget.allowance(10) == (10, None)
+
+
+def test_small_search_fits_in_budget(make_knowledge_map):
+    knowledge_map = make_knowledge_map(width=40, height=40)
+    budget = PlanningBudget(max_expansions=1000)
+    result = plan_path(GROUND, knowledge_map, (0, 0), (3, 0), budget)
+    assert result.status == PLAN_FOUND
+    assert not budget.exceeded and budget.used == result.expansions
+
+
+def test_deadline_stops_search(make_knowledge_map):
+    # 目标不可达时搜索要扩展整个连通区域，远超一个时钟检查间隔
+    knowledge_map = make_knowledge_map(_walled(60, 60))
+    grid = get_cost_grid(GROUND["terrain_rules"], knowledge_map)
+    search = grid_a_star(grid, (0, 0), (59, 59), deadline=time.perf_counter() - 1.0)
+    assert search.status == PLAN_BUDGET_EXCEEDED
+    assert search.expansions == DEADLINE_CHECK_INTERVAL
+    budget = PlanningBudget(time_limit=1e-9)
+    time.sleep(0.001)
+    result = plan_path(GROUND, knowledge_map, (0, 0), (59, 59), budget)
+    assert result.status == PLAN_BUDGET_EXCEEDED and result.expansions == DEADLINE_CHECK_INTERVAL
+    assert budget.exceeded
+
+
+def test_start_outside_map(make_knowledge_map):
+    grid = get_cost_grid(GROUND["terrain_rules"], make_knowledge_map(width=10, height=10))
+    search = grid_a_star(grid, (-1, 3), (5, 5))
+    assert search.path is None and search.status == PLAN_UNREACHABLE
+
+
+def _plan_in_fresh_thread(knowledge_map, start, goal):
+    """在新线程中规划：该线程的搜索缓冲区是全新分配的，作为复用缓冲区时的参照"""
+    out = {}
+    thread = threading.Thread(target=lambda: out.update(result=plan_path(GROUND, knowledge_map, start, goal)))
+    thread.start()
+    thread.join()
+    return out['result']
+
+
+def test_buffers_reused_across_map_sizes(make_knowledge_map):
+    # 20x20 与 9x42 填充后的格子数相同 (22*22 == 11*44)，共用同一组缓冲区但行宽不同
+    square = make_knowledge_map(_mixed_terrain(20, 20, seed=1))
+    tall = make_knowledge_map(_mixed_terrain(9, 42, seed=2))
+    other = make_knowledge_map(_mixed_terrain(35, 12, seed=3))
+    queries = [(square, (0, 0), (19, 19)), (tall, (0, 0), (8, 41)), (other, (34, 0), (0, 11)),
+               (square, (19, 0), (0, 19)), (tall, (8, 41), (0, 0)), (square, (0, 0), (19, 19))]
+    for knowledge_map, start, goal in queries:
+        result = plan_path(GROUND, knowledge_map, start, goal)
+        reference = _plan_in_fresh_thread(knowledge_map, start, goal)
+        assert result.status == PLAN_FOUND
+        assert result.path == reference.path
+        assert result.expansions == reference.expansions
+        _assert_near_optimal(get_cost_grid(GROUND["terrain_rules"], knowledge_map), result.path, start, goal)
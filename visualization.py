@@ -26,6 +26,14 @@ class DeliveryVisualizer:
         
         self.info_panel_text = None
         self.map_image_artist = None
+        # 知识地图图像 (height, width, 3)，按变化流增量着色；_image_version 为已绘制到的地图版本
+        self.map_image = None
+        self._image_version = None
+        self._queue_version = None   # 已绘制的主线任务队列版本，队列未变化时不重设任务标记
+        # 地形 ID -> 归一化颜色 的查找表，uint8 地形可直接索引
+        self._color_lut = np.zeros((256, 3), dtype=np.float32)
+        for terrain_id, color_tuple in self.knowledge_map.color_map.items():
+            self._color_lut[terrain_id] = color_tuple
         
     def _init_animation(self):
         """
@@ -74,15 +82,8 @@ class DeliveryVisualizer:
     def _update_frame(self, frame):
         """动画的每一帧更新函数，只更新数据，不创建或删除 Artists"""
         
-        # 1. 更新知识地图 (已修复和优化)
-        # 使用 float32 类型以匹配归一化的颜色值，更高效
-        image_data = np.zeros((self.knowledge_map.height, self.knowledge_map.width, 3), dtype=np.float32)
-        for terrain_id, color_tuple in self.knowledge_map.color_map.items():
-            # 关键修复：将 (width, height) 的掩码转置为 (height, width)
-            mask = (self.knowledge_map.terrain == terrain_id).T
-            # 直接使用归一化的颜色元组，无需再次转换
-            image_data[mask] = color_tuple
-        self.map_image_artist.set_data(image_data)
+        # 1. 更新知识地图：只为上一帧以来变化的格子着色
+        self._refresh_map_image()
 
         # 2. 更新智能体
         state_info = {"idle": ('green', 'o'), "delivering": ('orange', '>'), "returning": ('cyan', '<')}
@@ -106,15 +107,16 @@ class DeliveryVisualizer:
                 artists['path'].set_visible(False); artists['target'].set_visible(False)
         
         # 3. 更新任务标记 (使用池)
-        with self.coord_system.main_task_queue.mutex:
-            tasks_to_show_tuples = list(self.coord_system.main_task_queue.queue)
-            # 我们只需要第三个元素，也就是 DeliveryTask 对象
-            tasks_to_show = [task_tuple[2] for task_tuple in tasks_to_show_tuples]
-        for i, artist in enumerate(self.pending_task_pool):
-            if i < len(tasks_to_show):
-                artist.set_offsets(tasks_to_show[i].original_goal); artist.set_color(tasks_to_show[i].color); artist.set_visible(True)
-            else:
-                artist.set_visible(False)
+        # 只显示优先级最高的若干个任务，无需复制整个队列
+        task_queue = self.coord_system.main_task_queue
+        if task_queue.version != self._queue_version:
+            self._queue_version = task_queue.version
+            tasks_to_show = task_queue.smallest(len(self.pending_task_pool))
+            for i, artist in enumerate(self.pending_task_pool):
+                if i < len(tasks_to_show):
+                    artist.set_offsets(tasks_to_show[i].original_goal); artist.set_color(tasks_to_show[i].color); artist.set_visible(True)
+                else:
+                    artist.set_visible(False)
         tasks_to_show_r = self.coord_system.relay_task_pool
         for i, (scatter, text) in enumerate(self.relay_task_pool_artists):
             if i < len(tasks_to_show_r):
@@ -126,7 +128,7 @@ class DeliveryVisualizer:
 
         # 4. 更新信息面板
         states = [agent.state for agent in self.coord_system.agents.values()]
-        info_text = (f"系统状态\n" f"总智能体: {len(self.coord_system.agents)} (空闲: {states.count('idle')})\n" f"配送中: {states.count('delivering')}\n" f"返回中: {states.count('returning')}\n" f"主线待处理: {self.coord_system.main_task_queue.qsize()}\n" f"中转站待接力: {len(self.coord_system.relay_task_pool)}\n" f"已完成任务: {self.coord_system.get_completed_task_count()}")
+        info_text = (f"系统状态 (仿真时间 {self.coord_system.clock.now():.1f}s)\n" f"总智能体: {len(self.coord_system.agents)} (空闲: {states.count('idle')})\n" f"配送中: {states.count('delivering')}\n" f"返回中: {states.count('returning')}\n" f"主线待处理: {len(self.coord_system.main_task_queue)}\n" f"中转站待接力: {len(self.coord_system.relay_task_pool)}\n" f"已完成任务: {self.coord_system.get_completed_task_count()}\n" f"已探索: {self.knowledge_map.known_cells / (self.knowledge_map.width * self.knowledge_map.height):.1%}")
         self.info_panel_text.set_text(info_text)
         
         # 返回所有动态 Artists
@@ -137,6 +139,23 @@ class DeliveryVisualizer:
             
         return all_artists
 
+    def _refresh_map_image(self):
+        """从变化流取增量更新地图图像；首次绘制或落后超出变化流历史时整张重绘"""
+        deltas = None if self.map_image is None else self.knowledge_map.changes_since(self._image_version)
+        if deltas is None:
+            # 在不可变快照上重绘，之后从快照版本开始接收变化流，不会漏掉或读到半写入的格子
+            snapshot = self.knowledge_map.snapshot()
+            self._image_version = snapshot.version
+            # 将 (width, height) 的地形转置为 (height, width) 的图像
+            self.map_image = self._color_lut[snapshot.terrain.T]
+        elif deltas:
+            for delta in deltas:
+                self.map_image[delta.ys, delta.xs] = self._color_lut[delta.values]
+            self._image_version = deltas[-1].version
+        else:
+            return
+        self.map_image_artist.set_data(self.map_image)
+
     def start_animation(self):
         """启动高性能动画"""
         # 静态背景和图例在动画开始前就绘制好